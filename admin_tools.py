@@ -9,6 +9,11 @@ Available commands:
 - promote-user: Grant admin privileges to a user
 - list-users: List all users in the system
 - system-stats: Display system statistics
+- metadata-cache: Show metadata cache statistics or purge entries
+- rebuild-facets: Recount the category/publisher/language filter index
+- rebuild-streaks: Recompute the stored reading streaks from the reading logs
+- rebuild-activity: Rebuild the community activity feed from books and reading logs
+- backup: Take an online database backup, rotating old ones (or list them)
 """
 
 import os
@@ -212,17 +217,22 @@ def list_users(args):
             print("📭 No users found in the database")
             return True
         
+        from app.streaks import compute_streaks, NO_STREAK
+        streaks = compute_streaks()
+        
         print(f"👥 Found {len(users)} user(s):")
-        print("-" * 80)
-        print(f"{'Username':<20} {'Email':<30} {'Admin':<8} {'Active':<8} {'Created'}")
-        print("-" * 80)
+        print("-" * 96)
+        print(f"{'Username':<20} {'Email':<30} {'Admin':<8} {'Active':<8} {'Streak':<16} {'Created'}")
+        print("-" * 96)
         
         for user in users:
             admin_status = "Yes" if user.is_admin else "No"
             active_status = "Yes" if user.is_active else "No"
             created_date = user.created_at.strftime('%Y-%m-%d') if user.created_at else "Unknown"
+            streak = streaks.get(user.id, NO_STREAK)
+            streak_text = f"{streak.current} (best {streak.longest})"
             
-            print(f"{user.username:<20} {user.email:<30} {admin_status:<8} {active_status:<8} {created_date}")
+            print(f"{user.username:<20} {user.email:<30} {admin_status:<8} {active_status:<8} {streak_text:<16} {created_date}")
         
         return True
 
@@ -250,6 +260,12 @@ def system_stats(args):
         print(f"   Reading Logs: {total_logs}")
         print()
         
+        if args.snapshot:
+            from app.system_stats import take_snapshot
+            snapshot = take_snapshot()
+            print(f"📸 Stats snapshot recorded at {snapshot['taken_at']} UTC")
+            print()
+        
         # Database file info
         db_path = "/app/data/books.db"
         if os.path.exists(db_path):
@@ -261,6 +277,106 @@ def system_stats(args):
         
         return True
 
+def metadata_cache(args):
+    """Show metadata cache statistics, optionally purging entries"""
+    app = create_app()
+    
+    with app.app_context():
+        from app.metadata_cache import get_cache_stats, purge
+        
+        if args.purge or args.purge_all:
+            deleted = purge(expired_only=not args.purge_all)
+            print(f"🧹 Removed {deleted} metadata cache entries")
+        
+        stats = get_cache_stats()
+        print("🗃️  Metadata Cache")
+        print("=" * 40)
+        print(f"   Entries: {stats['entries']}")
+        print(f"   Not found (negative): {stats['negative_entries']}")
+        
+        return True
+
+def rebuild_facets(args):
+    """Recount the facet index from the book table (e.g. after editing the database by hand)"""
+    app = create_app()
+    
+    with app.app_context():
+        from app.facets import rebuild_facets as rebuild
+        
+        user_id = None
+        if args.username:
+            user = User.query.filter_by(username=args.username).first()
+            if not user:
+                print(f"❌ User '{args.username}' not found")
+                return False
+            user_id = user.id
+        
+        entries = rebuild(user_id)
+        print(f"✅ Facet index rebuilt ({entries} entries)")
+        return True
+
+def rebuild_streaks(args):
+    """Recompute stored reading streaks from the reading logs (e.g. after editing the database by hand)"""
+    app = create_app()
+    
+    with app.app_context():
+        from app.streaks import rebuild_streaks as rebuild
+        
+        user_id = None
+        if args.username:
+            user = User.query.filter_by(username=args.username).first()
+            if not user:
+                print(f"❌ User '{args.username}' not found")
+                return False
+            user_id = user.id
+        
+        users = rebuild(user_id)
+        print(f"✅ Reading streaks rebuilt ({users} users)")
+        return True
+
+def rebuild_activity(args):
+    """Rebuild the community activity feed from books and reading logs (e.g. after editing the database by hand)"""
+    app = create_app()
+    
+    with app.app_context():
+        from app.activity import rebuild_activity_feed
+        
+        events = rebuild_activity_feed()
+        print(f"✅ Activity feed rebuilt ({events} events)")
+        return True
+
+def backup(args):
+    """Take an online backup of the database (safe while the app is running) and rotate old ones"""
+    app = create_app()
+    
+    with app.app_context():
+        from app.backups import create_backup, database_path, list_backups
+        
+        db_path = database_path()
+        if db_path is None:
+            print("❌ Backups are only supported for SQLite databases")
+            return False
+        backup_dir = args.dir or app.config.get('BACKUP_DIR') or os.path.join(os.path.dirname(db_path), 'backups')
+        
+        if args.list:
+            backups = list_backups(backup_dir, os.path.basename(db_path))
+            print(f"🗄️  Backups in {backup_dir}")
+            print("=" * 40)
+            for path in backups:
+                print(f"   {os.path.basename(path)}  ({round(os.path.getsize(path) / 1024 / 1024, 2)} MB)")
+            if not backups:
+                print("   (none)")
+            return True
+        
+        try:
+            backup_path = create_backup(db_path, backup_dir, compression=args.compress, keep=args.keep)
+        except ValueError as e:
+            print(f"❌ {e}")
+            return False
+        size_mb = round(os.path.getsize(backup_path) / 1024 / 1024, 2)
+        print(f"✅ Backup created: {backup_path} ({size_mb} MB)")
+        return True
+
 def main():
     parser = argparse.ArgumentParser(
         description="MyBibliotheca Admin Tools",
@@ -273,6 +389,12 @@ Examples:
   python3 admin_tools.py promote-user --username johndoe
   python3 admin_tools.py list-users
   python3 admin_tools.py system-stats
+  python3 admin_tools.py system-stats --snapshot
+  python3 admin_tools.py metadata-cache --purge
+  python3 admin_tools.py rebuild-facets
+  python3 admin_tools.py rebuild-streaks --username johndoe
+  python3 admin_tools.py rebuild-activity
+  python3 admin_tools.py backup --compress gzip --keep 14
         """
     )
     
@@ -298,6 +420,30 @@ Examples:
     
     # System stats
     stats_parser = subparsers.add_parser('system-stats', help='Display system statistics')
+    stats_parser.add_argument('--snapshot', action='store_true', help='Also record a dashboard stats snapshot')
+    
+    # Metadata cache
+    cache_parser = subparsers.add_parser('metadata-cache', help='Show or purge the metadata cache')
+    cache_parser.add_argument('--purge', action='store_true', help='Remove expired entries')
+    cache_parser.add_argument('--purge-all', action='store_true', help='Remove every entry')
+    
+    # Facet index
+    facets_parser = subparsers.add_parser('rebuild-facets', help='Recount the library filter facets')
+    facets_parser.add_argument('--username', help='Only rebuild this user\'s facets')
+    
+    # Reading streaks
+    streaks_parser = subparsers.add_parser('rebuild-streaks', help='Recompute stored reading streaks')
+    streaks_parser.add_argument('--username', help='Only rebuild this user\'s streak')
+    
+    # Community activity feed
+    activity_parser = subparsers.add_parser('rebuild-activity', help='Rebuild the community activity feed')
+    
+    # Database backups
+    backup_parser = subparsers.add_parser('backup', help='Take an online database backup')
+    backup_parser.add_argument('--compress', choices=['none', 'gzip', 'zstd'], help='Compression (default: BACKUP_COMPRESSION)')
+    backup_parser.add_argument('--keep', type=int, help='Newest backups to keep (default: BACKUP_KEEP, 0 keeps all)')
+    backup_parser.add_argument('--dir', help='Backup directory (default: BACKUP_DIR or backups/ next to the database)')
+    backup_parser.add_argument('--list', action='store_true', help='List existing backups instead')
     
     args = parser.parse_args()
     
@@ -313,6 +459,11 @@ Examples:
             'promote-user': promote_user,
             'list-users': list_users,
             'system-stats': system_stats,
+            'metadata-cache': metadata_cache,
+            'rebuild-facets': rebuild_facets,
+            'rebuild-streaks': rebuild_streaks,
+            'rebuild-activity': rebuild_activity,
+            'backup': backup,
         }
         
         command_func = command_map.get(args.command)
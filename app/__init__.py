@@ -1,11 +1,13 @@
-import os
-import shutil
-from datetime import datetime
 from flask import Flask, session
 from flask_login import LoginManager
 from flask_wtf.csrf import CSRFProtect
-from sqlalchemy import inspect, text
 from .models import db, User
+from . import facets  # registers the session events that maintain the facet index
+from . import streaks  # registers the session events that maintain reading streaks
+from . import activity  # registers the session events that append to the community feed
+from .database import init_database
+from .migrations import run_migrations
+from .setup_state import is_setup_complete, mark_setup_complete
 from config import Config
 
 login_manager = LoginManager()
@@ -15,151 +17,13 @@ csrf = CSRFProtect()
 def load_user(user_id):
     return User.query.get(int(user_id))
 
-def backup_database(db_path):
-    """Create a backup of the database before migration"""
-    if not os.path.exists(db_path):
-        return None
-    
-    # Create backups directory if it doesn't exist
-    db_dir = os.path.dirname(db_path)
-    backup_dir = os.path.join(db_dir, 'backups')
-    os.makedirs(backup_dir, exist_ok=True)
-    
-    # Create backup filename with timestamp
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    db_filename = os.path.basename(db_path)
-    backup_path = os.path.join(backup_dir, f"{db_filename}.backup_{timestamp}")
-    
-    try:
-        shutil.copy2(db_path, backup_path)
-        print(f"✅ Database backup created: {backup_path}")
-        return backup_path
-    except Exception as e:
-        print(f"⚠️  Failed to create database backup: {e}")
-        return None
-
-def check_if_migrations_needed(inspector):
-    """Check if any migrations are needed before creating backup"""
-    existing_tables = inspector.get_table_names()
-    
-    # Check if this is a fresh database
-    if not existing_tables:
-        return False, "fresh_database"
-    
-    migrations_needed = []
-    
-    # Check for missing user table
-    if 'user' not in existing_tables:
-        migrations_needed.append("user_table")
-    
-    # Check for missing columns in existing tables
-    if 'book' in existing_tables:
-        columns = [column['name'] for column in inspector.get_columns('book')]
-        book_fields = ['user_id', 'description', 'published_date', 'page_count', 'categories', 
-                      'publisher', 'language', 'average_rating', 'rating_count', 'created_at']
-        missing_book_fields = [field for field in book_fields if field not in columns]
-        if missing_book_fields:
-            migrations_needed.append(f"book_columns: {missing_book_fields}")
-    
-    if 'user' in existing_tables:
-        columns = [column['name'] for column in inspector.get_columns('user')]
-        user_fields = ['failed_login_attempts', 'locked_until', 'last_login', 
-                      'share_current_reading', 'share_reading_activity', 'share_library',
-                      'reading_streak_offset']  # Add the streak offset field
-        missing_user_fields = [field for field in user_fields if field not in columns]
-        if missing_user_fields:
-            migrations_needed.append(f"user_security_privacy: {missing_user_fields}")
-    
-    if 'reading_log' in existing_tables:
-        columns = [column['name'] for column in inspector.get_columns('reading_log')]
-        if 'user_id' not in columns or 'created_at' not in columns:
-            migrations_needed.append("reading_log_fields")
-    
-    return len(migrations_needed) > 0, migrations_needed
-
-def run_security_privacy_migration(inspector, db_engine):
-    """Add security and privacy fields to user table"""
-    if 'user' not in inspector.get_table_names():
-        return  # User table doesn't exist yet
-    
-    try:
-        columns = [column['name'] for column in inspector.get_columns('user')]
-        
-        # Security and privacy fields to add
-        security_privacy_fields = [
-            ('failed_login_attempts', 'INTEGER DEFAULT 0'),
-            ('locked_until', 'DATETIME'),
-            ('last_login', 'DATETIME'),
-            ('share_current_reading', 'BOOLEAN DEFAULT 1'),
-            ('share_reading_activity', 'BOOLEAN DEFAULT 1'),
-            ('share_library', 'BOOLEAN DEFAULT 1')
-        ]
-        
-        missing_fields = [field for field, _ in security_privacy_fields if field not in columns]
-        
-        if missing_fields:
-            print(f"🔄 Adding security/privacy fields: {missing_fields}")
-            with db_engine.connect() as conn:
-                for field_name, field_def in security_privacy_fields:
-                    if field_name not in columns:
-                        conn.execute(text(f"ALTER TABLE user ADD COLUMN {field_name} {field_def}"))
-                        print(f"✅ Added {field_name} to user table")
-                conn.commit()
-            print("✅ Security/privacy migration completed.")
-        else:
-            print("✅ Security/privacy fields already present.")
-            
-    except Exception as e:
-        print(f"⚠️  Security/privacy migration failed: {e}")
-
-def add_streak_offset_column(inspector, engine):
-    """Add reading_streak_offset column to users table"""
-    try:
-        columns = [column['name'] for column in inspector.get_columns('user')]
-        if 'reading_streak_offset' not in columns:
-            print("🔄 Adding reading_streak_offset column to user table...")
-            with engine.connect() as conn:
-                conn.execute(text("ALTER TABLE user ADD COLUMN reading_streak_offset INTEGER DEFAULT 0"))
-                conn.commit()
-            print("✅ reading_streak_offset column added successfully")
-        else:
-            print("✅ reading_streak_offset column already exists")
-    except Exception as e:
-        print(f"⚠️  Error adding reading_streak_offset column: {e}")
-
-def assign_existing_books_to_admin():
-    """Assign existing books without user_id to the admin user"""
-    try:
-        # Import Book model here to avoid circular imports
-        from .models import Book
-        
-        # Find the admin user
-        admin_user = User.query.filter_by(is_admin=True).first()
-        if not admin_user:
-            print("⚠️  No admin user found, cannot assign books")
-            return
-        
-        # Find books without user_id
-        orphaned_books = Book.query.filter_by(user_id=None).all()
-        if not orphaned_books:
-            print("✅ No orphaned books found")
-            return
-            
-        # Assign orphaned books to admin
-        for book in orphaned_books:
-            book.user_id = admin_user.id
-            
-        db.session.commit()
-        print(f"✅ Assigned {len(orphaned_books)} orphaned books to admin user: {admin_user.username}")
-        
-    except Exception as e:
-        print(f"⚠️  Failed to assign orphaned books to admin: {e}")
-        db.session.rollback()
-
-def create_app():
+def create_app(test_config=None):
     app = Flask(__name__)
     app.config.from_object(Config)
     app.config['SECRET_KEY'] = 'your-secret-key'
+    if test_config:
+        # Applied before any extension binds to the database, so migrations run against it too
+        app.config.update(test_config)
 
     # Initialize debug utilities
     from .debug_utils import setup_debug_logging, print_debug_banner, debug_middleware
@@ -170,6 +34,7 @@ def create_app():
 
     # Initialize extensions
     db.init_app(app)
+    init_database(app)
     csrf.init_app(app)
     login_manager.init_app(app)
     login_manager.login_view = 'auth.login'
@@ -177,160 +42,13 @@ def create_app():
     login_manager.login_message_category = 'info'
     csrf.init_app(app)
 
-    # DATABASE MIGRATION SECTION
+    # DATABASE MIGRATION SECTION (one version read when the schema is current)
     with app.app_context():
-        db_path = app.config.get('SQLALCHEMY_DATABASE_URI', '').replace('sqlite:///', '')
-        
-        # Create inspector for checking database schema
-        inspector = inspect(db.engine)
-        
-        # Check if migrations are needed BEFORE running any queries
-        migrations_needed, migration_list = check_if_migrations_needed(inspector)
-        
-        if migrations_needed:
-            print("🔄 Creating database backup before migration...")
-            backup_path = backup_database(db_path)
-            if backup_path:
-                print(f"📁 Backup saved to: {backup_path}")
-        else:
-            print("✅ Database schema is up-to-date, no migrations needed")
-        
-        existing_tables = inspector.get_table_names()
-        
-        if not existing_tables:
-            print("📚 Creating fresh database schema...")
-            db.create_all()
-            print("✅ Database schema created. Setup required on first visit.")
-        else:
-            print("📚 Database already exists...")
-            print("✅ Tables present, checking for migrations...")
-            
-            # Check for user table (new in v2)
-            if 'user' not in existing_tables:
-                print("🔄 Adding user authentication tables...")
-                db.create_all()
-                print("✅ User tables created. Setup required on first visit.")
-            else:
-                # CRITICAL: Add streak offset column FIRST before any User queries
-                add_streak_offset_column(inspector, db.engine)
-                
-                # Refresh inspector after adding column
-                inspector = inspect(db.engine)
-            
-            # Run security/privacy field migration
-            run_security_privacy_migration(inspector, db.engine)
-            
-            # Only assign orphaned books AFTER user table exists and columns are added
-            if 'user' in inspector.get_table_names():
-                try:
-                    # Now it's safe to query User model
-                    admin_users = User.query.filter_by(is_admin=True).count()
-                    if admin_users > 0:
-                        print("📚 Checking for orphaned books...")
-                        assign_existing_books_to_admin()
-                except Exception as e:
-                    print(f"⚠️  Error checking for admin users: {e}")
-            
-            # Check for new columns in book table
-            if 'book' in existing_tables:
-                try:
-                    columns = [column['name'] for column in inspector.get_columns('book')]
-                    
-                    # Check for user_id column (critical for v2)
-                    if 'user_id' not in columns:
-                        print("🔄 Adding user_id to book table...")
-                        with db.engine.connect() as conn:
-                            trans = conn.begin()
-                            try:
-                                conn.execute(text("ALTER TABLE book ADD COLUMN user_id INTEGER"))
-                                trans.commit()
-                                print("✅ user_id column added to book table.")
-                            except Exception as e:
-                                trans.rollback()
-                                raise e
-                        
-                        # Assign books to admin after adding user_id column (only if admin exists)
-                        try:
-                            if User.query.filter_by(is_admin=True).count() > 0:
-                                assign_existing_books_to_admin()
-                        except Exception as e:
-                            print(f"⚠️  Error assigning books to admin: {e}")
-                    
-                    # Check for other missing columns
-                    new_columns = ['description', 'published_date', 'page_count', 'categories', 
-                                 'publisher', 'language', 'average_rating', 'rating_count', 'created_at']
-                    missing_columns = [col for col in new_columns if col not in columns]
-                    
-                    if missing_columns:
-                        print(f"🔄 Adding missing book columns: {missing_columns}")
-                        with db.engine.connect() as conn:
-                            trans = conn.begin()
-                            try:
-                                for col_name in missing_columns:
-                                    if col_name in ['page_count', 'rating_count']:
-                                        conn.execute(text(f"ALTER TABLE book ADD COLUMN {col_name} INTEGER"))
-                                    elif col_name == 'average_rating':
-                                        conn.execute(text(f"ALTER TABLE book ADD COLUMN {col_name} REAL"))
-                                    elif col_name in ['categories', 'publisher']:
-                                        conn.execute(text(f"ALTER TABLE book ADD COLUMN {col_name} VARCHAR(500)"))
-                                    elif col_name == 'language':
-                                        conn.execute(text(f"ALTER TABLE book ADD COLUMN {col_name} VARCHAR(10)"))
-                                    elif col_name == 'published_date':
-                                        conn.execute(text(f"ALTER TABLE book ADD COLUMN {col_name} VARCHAR(50)"))
-                                    elif col_name == 'created_at':
-                                        conn.execute(text(f"ALTER TABLE book ADD COLUMN {col_name} DATETIME"))
-                                    else:  # description
-                                        conn.execute(text(f"ALTER TABLE book ADD COLUMN {col_name} TEXT"))
-                                trans.commit()
-                                print("✅ Book schema migration completed.")
-                            except Exception as e:
-                                trans.rollback()
-                                raise e
-                        
-                except Exception as e:
-                    print(f"⚠️  Book schema migration failed: {e}")
-            
-            # Check for reading_log table updates
-            if 'reading_log' in existing_tables:
-                try:
-                    columns = [column['name'] for column in inspector.get_columns('reading_log')]
-                    missing_reading_log_columns = []
-                    
-                    if 'user_id' not in columns:
-                        missing_reading_log_columns.append('user_id')
-                    if 'created_at' not in columns:
-                        missing_reading_log_columns.append('created_at')
-                    
-                    if missing_reading_log_columns:
-                        print(f"🔄 Adding missing reading_log columns: {missing_reading_log_columns}")
-                        with db.engine.connect() as conn:
-                            if 'user_id' in missing_reading_log_columns:
-                                conn.execute(text("ALTER TABLE reading_log ADD COLUMN user_id INTEGER"))
-                            if 'created_at' in missing_reading_log_columns:
-                                conn.execute(text("ALTER TABLE reading_log ADD COLUMN created_at DATETIME"))
-                            conn.commit()
-                        print("✅ reading_log table updated.")
-                        
-                        # Assign reading logs to admin user if needed
-                        if 'user_id' in missing_reading_log_columns:
-                            try:
-                                admin_user = User.query.filter_by(is_admin=True).first()
-                                if admin_user:
-                                    from .models import ReadingLog
-                                    unassigned_logs = ReadingLog.query.filter_by(user_id=None).all()
-                                    if unassigned_logs:
-                                        print(f"🔄 Assigning {len(unassigned_logs)} reading logs to admin user...")
-                                        for log in unassigned_logs:
-                                            log.user_id = admin_user.id
-                                        db.session.commit()
-                                        print("✅ Reading logs assigned to admin user.")
-                            except Exception as e:
-                                print(f"⚠️  Reading log migration failed: {e}")
-                        
-                except Exception as e:
-                    print(f"⚠️  Reading log migration failed: {e}")
-        
-        print("🎉 Database migration completed successfully!")
+        run_migrations()
+
+        # Full-text search index over books (SQLite FTS5, falls back to LIKE elsewhere)
+        from .search import init_search_index
+        init_search_index(app)
 
     # Add middleware to check for setup and forced password changes
     @app.before_request
@@ -342,13 +60,21 @@ def create_app():
         # Run debug middleware if enabled
         debug_middleware()
         
-        # Check if setup is needed (no users exist)
-        if User.query.count() == 0:
-            # Skip for setup route and static files
-            if request.endpoint in ['auth.setup', 'static'] or (request.endpoint and request.endpoint.startswith('static')):
-                return
-            # Redirect to setup page
-            return redirect(url_for('auth.setup'))
+        # Static files never need setup or password checks (and cost no queries)
+        if request.endpoint and request.endpoint.startswith('static'):
+            return
+        
+        # Check if setup is needed (no users exist). A logged-in user proves setup is
+        # done; otherwise the cached answer is used, querying only until it is True.
+        if not app.extensions.get('setup_complete'):
+            if current_user.is_authenticated:
+                mark_setup_complete()
+            elif not is_setup_complete():
+                # Skip for setup route
+                if request.endpoint == 'auth.setup':
+                    return
+                # Redirect to setup page
+                return redirect(url_for('auth.setup'))
         
         # Skip if user is not authenticated
         if not current_user.is_authenticated:
@@ -379,4 +105,20 @@ def create_app():
     app.register_blueprint(auth, url_prefix='/auth')
     app.register_blueprint(admin, url_prefix='/admin')
 
+    # Serve covers from the local store
+    from .covers import init_cover_store
+    init_cover_store(app)
+
+    # Short-lived cache for pages every viewer sees alike
+    from .page_cache import init_page_cache
+    init_page_cache(app)
+
+    # Admin dashboard counters, refreshed in the background
+    from .system_stats import init_system_stats
+    init_system_stats(app)
+
+    # Resume background tasks interrupted by a restart
+    from .tasks import init_task_engine
+    init_task_engine(app)
+
     return app
@@ -0,0 +1,194 @@
+"""
+Community activity feed for MyBibliotheca
+Appends an activity_event row whenever a book is started or finished or reading
+is logged, in the same transaction as the ORM change, with visibility taken from
+the owner's sharing settings at write time. Changing those settings flips the
+owner's existing events in place, so the community pages never rescan books.
+"""
+
+from collections import namedtuple
+from datetime import date, datetime, timezone
+from sqlalchemy import and_, case, event, false, func, inspect, literal, or_, select, true
+from sqlalchemy.orm import Session, joinedload
+from .models import db, ActivityEvent, Book, ReadingLog, User
+from .library import encode_cursor, decode_cursor
+
+# Event kind -> the user setting that decides whether it is shared
+KIND_SETTINGS = {
+    'started': 'share_current_reading',
+    'finished': 'share_reading_activity',
+    'logged': 'share_reading_activity',
+}
+BOOK_DATE_KINDS = (('start_date', 'started'), ('finish_date', 'finished'))
+SHARING_COLUMNS = ('is_active', 'share_current_reading', 'share_reading_activity')
+
+FEED_KEY_TYPES = (date.fromisoformat, int)  # event_date, id
+
+def _utcnow():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+def _changed(obj, column):
+    return inspect(obj).attrs[column].history.has_changes()
+
+def _sharing(connection, user_ids):
+    """{user_id: {kind: visible}} read from the user table"""
+    table = User.__table__
+    rows = connection.execute(
+        select(table.c.id, *(table.c[column] for column in SHARING_COLUMNS)).where(table.c.id.in_(list(user_ids)))
+    )
+    return {
+        row.id: {kind: bool(row.is_active) and bool(row._mapping[setting]) for kind, setting in KIND_SETTINGS.items()}
+        for row in rows
+    }
+
+def _retract(connection, **match):
+    """Delete the events matching column=value conditions"""
+    table = ActivityEvent.__table__
+    connection.execute(table.delete().where(*(table.c[column] == value for column, value in match.items())))
+
+@event.listens_for(Session, 'before_flush')
+def _collect_activity(session, flush_context, instances):
+    pending = session.info.setdefault('activity_changes', {'append': [], 'users': set()})
+    connection = None
+
+    # Retractions run now, before the rows they point at are deleted
+    for obj in session.deleted:
+        if isinstance(obj, (Book, ReadingLog, User)):
+            connection = connection or session.connection()
+        if isinstance(obj, Book) and obj.id is not None:
+            _retract(connection, book_id=obj.id)
+        elif isinstance(obj, ReadingLog) and obj.book_id is not None:
+            _retract(connection, book_id=obj.book_id, kind='logged', event_date=obj.date)
+        elif isinstance(obj, User) and obj.id is not None:
+            _retract(connection, user_id=obj.id)
+
+    for obj in session.new:
+        if isinstance(obj, Book):
+            for column, kind in BOOK_DATE_KINDS:
+                if getattr(obj, column) is not None:
+                    pending['append'].append((obj, kind, column))
+        elif isinstance(obj, ReadingLog):
+            pending['append'].append((obj, 'logged', 'date'))
+
+    for obj in session.dirty:
+        if isinstance(obj, Book) and obj.id is not None:
+            # A new owner takes over the book's events, under their own sharing settings
+            reassigned = _changed(obj, 'user_id')
+            for column, kind in BOOK_DATE_KINDS:
+                if reassigned or _changed(obj, column):
+                    # A re-dated or cleared date replaces the book's earlier event
+                    connection = connection or session.connection()
+                    _retract(connection, book_id=obj.id, kind=kind)
+                    if getattr(obj, column) is not None:
+                        pending['append'].append((obj, kind, column))
+        elif isinstance(obj, User) and obj.id is not None:
+            if any(_changed(obj, column) for column in SHARING_COLUMNS):
+                pending['users'].add(obj.id)
+
+@event.listens_for(Session, 'after_flush')
+def _write_activity(session, flush_context):
+    pending = session.info.pop('activity_changes', None)
+    if not pending or not (pending['append'] or pending['users']):
+        return
+    connection = session.connection()
+    table = ActivityEvent.__table__
+
+    if pending['append']:
+        sharing = _sharing(connection, {obj.user_id for obj, _, _ in pending['append']})
+        now = _utcnow()
+        connection.execute(table.insert(), [{
+            'user_id': obj.user_id,
+            'book_id': obj.book_id if isinstance(obj, ReadingLog) else obj.id,
+            'kind': kind,
+            'event_date': getattr(obj, column),
+            'created_at': (getattr(obj, 'created_at', None) or now) if kind == 'logged' else now,
+            'visible': sharing.get(obj.user_id, {}).get(kind, False),
+        } for obj, kind, column in pending['append']])
+
+    # Sharing settings changed: flip the user's existing events instead of rebuilding
+    for user_id, visibility in (_sharing(connection, pending['users']) if pending['users'] else {}).items():
+        for kind, visible in visibility.items():
+            connection.execute(table.update()
+                               .where(table.c.user_id == user_id, table.c.kind == kind, table.c.visible != visible)
+                               .values(visible=visible))
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _discard_activity(session, previous_transaction):
+    session.info.pop('activity_changes', None)
+
+def _visible_expr(setting):
+    return case((and_(User.is_active == True, getattr(User, setting) == True), true()), else_=false())
+
+def rebuild_activity_feed():
+    """Rebuild every event from books and reading logs (after bulk SQL changes); returns rows written"""
+    table = ActivityEvent.__table__
+    connection = db.session.connection()
+    connection.execute(table.delete())
+    now = _utcnow()
+    selects = [
+        select(Book.user_id, Book.id, literal(kind), getattr(Book, column), func.coalesce(Book.created_at, now),
+               _visible_expr(KIND_SETTINGS[kind]))
+        .join(User, User.id == Book.user_id).where(getattr(Book, column).isnot(None))
+        for column, kind in BOOK_DATE_KINDS
+    ]
+    selects.append(
+        select(ReadingLog.user_id, ReadingLog.book_id, literal('logged'), ReadingLog.date,
+               func.coalesce(ReadingLog.created_at, now), _visible_expr(KIND_SETTINGS['logged']))
+        .join(User, User.id == ReadingLog.user_id)
+    )
+    columns = ['user_id', 'book_id', 'kind', 'event_date', 'created_at', 'visible']
+    for stmt in selects:
+        connection.execute(table.insert().from_select(columns, stmt))
+    db.session.commit()
+    return db.session.query(func.count(ActivityEvent.id)).scalar()
+
+def ensure_activity_feed_built():
+    """Backfill the feed for databases created before it existed"""
+    if db.session.query(ActivityEvent.id).first() is not None:
+        return
+    has_activity = (db.session.query(Book.id).filter(or_(Book.start_date.isnot(None), Book.finish_date.isnot(None))).first()
+                    or db.session.query(ReadingLog.id).first())
+    if has_activity is not None:
+        print("🔄 Building community activity feed...")
+        print(f"✅ Activity feed built ({rebuild_activity_feed()} events)")
+
+def feed_query(kind, since=None):
+    """Visible events of one kind, optionally from a date on; 'started' keeps only unfinished books"""
+    query = ActivityEvent.query.filter(ActivityEvent.kind == kind, ActivityEvent.visible == True)
+    if since is not None:
+        query = query.filter(ActivityEvent.event_date >= since)
+    if kind == 'started':
+        query = query.join(Book, Book.id == ActivityEvent.book_id).filter(Book.finish_date.is_(None))
+    return query
+
+FeedPage = namedtuple('FeedPage', 'events next_cursor')
+
+def feed_page(kind, since=None, after=None, page_size=20):
+    """One page of a feed, newest first; `after` is the next_cursor of the previous page"""
+    query = feed_query(kind, since).options(joinedload(ActivityEvent.book), joinedload(ActivityEvent.user))
+    cursor = decode_cursor(after, FEED_KEY_TYPES)
+    if cursor is not None:
+        day, event_id = cursor
+        query = query.filter(or_(ActivityEvent.event_date < day,
+                                 and_(ActivityEvent.event_date == day, ActivityEvent.id < event_id)))
+    events = query.order_by(ActivityEvent.event_date.desc(), ActivityEvent.id.desc()).limit(page_size + 1).all()
+    if len(events) <= page_size:
+        return FeedPage(events, None)
+    events = events[:page_size]
+    return FeedPage(events, encode_cursor([events[-1].event_date.isoformat(), events[-1].id]))
+
+def feed_counts(month_start, logs_since):
+    """(finished since month_start, logged since logs_since, currently reading) in one query"""
+    kind, day = ActivityEvent.kind, ActivityEvent.event_date
+    row = (db.session.query(
+               func.count(case((and_(kind == 'finished', day >= month_start), 1))),
+               func.count(case((and_(kind == 'logged', day >= logs_since), 1))),
+               func.count(case((and_(kind == 'started', Book.finish_date.is_(None)), 1))))
+           .select_from(ActivityEvent)
+           .join(Book, Book.id == ActivityEvent.book_id)
+           .filter(ActivityEvent.visible == True,
+                   or_(and_(kind == 'finished', day >= month_start),
+                       and_(kind == 'logged', day >= logs_since),
+                       kind == 'started'))
+           .one())
+    return tuple(row)
@@ -7,9 +7,9 @@ from functools import wraps
 from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify, abort
 from flask_login import login_required, current_user
 from .models import User, Book, ReadingLog, db
+from .streaks import compute_streaks, NO_STREAK
 from .forms import UserProfileForm, AdminPasswordResetForm
 from datetime import datetime, timedelta, timezone
-from sqlalchemy import func
 
 admin = Blueprint('admin', __name__, url_prefix='/admin')
 
@@ -102,9 +102,14 @@ def users():
         page=page, per_page=20, error_out=False
     )
     
+    # Streaks for the whole page in one query
+    streaks = compute_streaks(user.id for user in users.items)
+    
     return render_template('admin/users.html',
                          title='User Management',
                          users=users,
+                         streaks=streaks,
+                         no_streak=NO_STREAK,
                          search=search)
 
 @admin.route('/users/<int:user_id>')
@@ -134,6 +139,7 @@ def user_detail(user_id):
     # Get recent activity
     recent_books = Book.query.filter_by(user_id=user.id).order_by(Book.created_at.desc()).limit(5).all()
     recent_logs = ReadingLog.query.filter_by(user_id=user.id).order_by(ReadingLog.created_at.desc()).limit(10).all()
+    streak = compute_streaks([user.id]).get(user.id, NO_STREAK)
     
     return render_template('admin/user_detail.html',
                          title=f'User: {user.username}',
@@ -142,6 +148,7 @@ def user_detail(user_id):
                          reading_count=reading_count,
                          books_this_year=books_this_year,
                          logs_this_month=logs_this_month,
+                         streak=streak,
                          recent_books=recent_books,
                          recent_logs=recent_logs)
 
@@ -232,6 +239,28 @@ def api_stats():
     stats = get_system_stats()
     return jsonify(stats)
 
+@admin.route('/api/stats/history')
+@login_required
+@admin_required
+def api_stats_history():
+    """Snapshot time series for charting, e.g. ?hours=168&series=total_books,total_users"""
+    from .system_stats import snapshot_history, SERIES
+    hours = min(max(request.args.get('hours', 24, type=int), 1), 24 * 366)
+    requested = [name for name in request.args.get('series', '').split(',') if name]
+    unknown = [name for name in requested if name not in SERIES]
+    if unknown:
+        return jsonify({'error': f"Unknown series: {', '.join(unknown)}"}), 400
+    return jsonify(snapshot_history(hours, tuple(requested) or SERIES))
+
+@admin.route('/api/http_stats')
+@login_required
+@admin_required
+def api_http_stats():
+    """Per-host latency, error and retry counters for outbound provider calls"""
+    from .http_client import get_http_stats
+    from .throttle import get_limiter_stats
+    return jsonify({'hosts': get_http_stats(), 'providers': get_limiter_stats()})
+
 @admin.route('/users/<int:user_id>/reset_password', methods=['GET', 'POST'])
 @login_required
 @admin_required
@@ -277,58 +306,34 @@ def unlock_user_account(user_id):
     return redirect(url_for('admin.user_detail', user_id=user.id))
 
 def get_system_stats():
-    """Get system statistics for admin dashboard"""
-    total_users = User.query.count()
-    active_users = User.query.filter_by(is_active=True).count()
-    admin_users = User.query.filter_by(is_admin=True).count()
-    total_books = Book.query.count()
-    
-    # Users registered in last 30 days
-    thirty_days_ago = datetime.now(timezone.utc) - timedelta(days=30)
-    new_users_30d = User.query.filter(User.created_at >= thirty_days_ago).count()
-    
-    # Books added in last 30 days
-    new_books_30d = Book.query.filter(Book.created_at >= thirty_days_ago).count()
-    
-    # Most active users (by book count)
-    top_users = db.session.query(
-        User.username,
-        func.count(Book.id).label('book_count')
-    ).join(Book).group_by(User.id).order_by(func.count(Book.id).desc()).limit(5).all()
-    
-    # System health info (with fallback if psutil not available)
-    system_info = {}
-    try:
-        import psutil
-        disk_usage = psutil.disk_usage('/')
-        memory = psutil.virtual_memory()
-        
-        system_info = {
-            'disk_free_gb': round(disk_usage.free / (1024**3), 2),
-            'disk_total_gb': round(disk_usage.total / (1024**3), 2),
-            'disk_percent': round((disk_usage.used / disk_usage.total) * 100, 1),
-            'memory_percent': memory.percent,
-            'memory_available_gb': round(memory.available / (1024**3), 2)
-        }
-    except ImportError:
-        # Fallback if psutil is not available
-        system_info = {
-            'disk_free_gb': 'N/A',
-            'disk_total_gb': 'N/A', 
-            'disk_percent': 'N/A',
-            'memory_percent': 'N/A',
-            'memory_available_gb': 'N/A'
-        }
+    """Get system statistics for admin dashboard (latest snapshot plus live cache counters)"""
+    from .system_stats import latest_snapshot
+    from .metadata_cache import get_cache_stats
+    from .throttle import get_limiter_stats
+    from .http_client import get_http_stats
+    from .page_cache import get_page_cache_stats
+    snapshot = latest_snapshot()
+    
+    # Shared metadata cache effectiveness; entry counts come with the snapshot
+    metadata_cache_stats = get_cache_stats(include_entries=False)
+    metadata_cache_stats['entries'] = snapshot['metadata_entries']
+    metadata_cache_stats['negative_entries'] = snapshot['metadata_negative_entries']
     
     return {
-        'total_users': total_users,
-        'active_users': active_users,
-        'admin_users': admin_users,
-        'total_books': total_books,
-        'new_users_30d': new_users_30d,
-        'new_books_30d': new_books_30d,
-        'top_users': [{'username': user[0], 'book_count': user[1]} for user in top_users],
-        'system': system_info
+        'total_users': snapshot['total_users'],
+        'active_users': snapshot['active_users'],
+        'admin_users': snapshot['admin_users'],
+        'total_books': snapshot['total_books'],
+        'reading_logs': snapshot['reading_logs'],
+        'new_users_30d': snapshot['new_users_30d'],
+        'new_books_30d': snapshot['new_books_30d'],
+        'top_users': snapshot['top_users'],
+        'system': snapshot['system'],
+        'snapshot_taken_at': snapshot['taken_at'],
+        'metadata_cache': metadata_cache_stats,
+        'page_cache': get_page_cache_stats(),
+        'metadata_providers': get_limiter_stats(),
+        'http_hosts': get_http_stats()
     }
 
 def is_admin(user):
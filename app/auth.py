@@ -8,6 +8,7 @@ from flask_wtf import FlaskForm
 from .forms import (LoginForm, RegistrationForm, UserProfileForm, ChangePasswordForm,
                    PrivacySettingsForm, ForcedPasswordChangeForm, SetupForm, ReadingStreakForm)
 from .debug_utils import debug_route, debug_auth, debug_csrf, debug_session
+from .setup_state import is_setup_complete, mark_setup_complete
 from datetime import datetime, timezone
 
 auth = Blueprint('auth', __name__)
@@ -19,7 +20,7 @@ def setup():
     debug_auth("Setup route accessed")
     
     # Check if any users already exist
-    if User.query.count() > 0:
+    if is_setup_complete():
         debug_auth("Users already exist, redirecting to login")
         flash('Setup has already been completed.', 'info')
         return redirect(url_for('auth.login'))
@@ -42,6 +43,7 @@ def setup():
             
             db.session.add(admin_user)
             db.session.commit()
+            mark_setup_complete()
             
             debug_auth(f"First admin user created: {admin_user.username}")
             
@@ -314,19 +316,10 @@ def privacy_settings():
 @login_required
 def my_activity():
     from .models import Book, ReadingLog
-    from sqlalchemy import func
+    from .user_stats import get_user_stats
     
-    # Get user's reading statistics
-    total_books = Book.query.filter_by(user_id=current_user.id).count()
-    
-    # Get reading logs count
-    reading_logs = ReadingLog.query.filter_by(user_id=current_user.id).count()
-    
-    # Get books added this year
-    current_year = datetime.now(timezone.utc).year
-    books_this_year = Book.query.filter_by(user_id=current_user.id).filter(
-        func.strftime('%Y', Book.created_at) == str(current_year)
-    ).count()
+    # Get user's reading statistics (one cached aggregate query)
+    stats = get_user_stats(current_user.id)
     
     # Get recent books (last 10)
     recent_books = Book.query.filter_by(user_id=current_user.id).order_by(
@@ -340,9 +333,9 @@ def my_activity():
     
     return render_template('auth/my_activity.html', 
                          title='My Activity',
-                         total_books=total_books,
-                         reading_logs=reading_logs,
-                         books_this_year=books_this_year,
+                         total_books=stats['total_books'],
+                         reading_logs=stats['reading_logs'],
+                         books_this_year=stats['added_this_year'],
                          recent_books=recent_books,
                          recent_logs=recent_logs)
 
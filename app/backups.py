@@ -0,0 +1,202 @@
+"""
+Database backups for MyBibliotheca
+Copies the live SQLite database with the online backup API, a few pages at a
+time so writers are never blocked for long, optionally compresses the copy
+(gzip, or zstd when the zstandard package is installed) and rotates old
+backups. Also builds per-user exports for download.
+"""
+
+import gzip
+import os
+import re
+import shutil
+import sqlite3
+import tempfile
+import time
+import zlib
+from datetime import datetime
+from flask import current_app, has_app_context
+from sqlalchemy import create_engine
+from .models import db
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+BACKUP_EXTENSIONS = {'none': '', 'gzip': '.gz', 'zstd': '.zst'}
+EXPORT_TABLES = ('user', 'book', 'reading_log')
+CHUNK_SIZE = 1024 * 1024
+
+def _config(name, default):
+    return current_app.config.get(name, default) if has_app_context() else default
+
+def database_path(engine=None):
+    """The SQLite file behind the engine, or None for other databases and in-memory SQLite"""
+    engine = engine or db.engine
+    if engine.dialect.name == 'sqlite' and engine.url.database not in (None, '', ':memory:'):
+        return engine.url.database
+    return None
+
+def available_compressions():
+    return [method for method in BACKUP_EXTENSIONS if method != 'zstd' or zstandard is not None]
+
+def _check_compression(compression):
+    if compression not in BACKUP_EXTENSIONS:
+        raise ValueError(f"Unknown compression '{compression}' (choose from {', '.join(BACKUP_EXTENSIONS)})")
+    if compression == 'zstd' and zstandard is None:
+        raise ValueError("zstd compression needs the zstandard package (pip install zstandard)")
+
+def online_backup(source_path, dest_path, pages=None, pause=None):
+    """
+    Consistent copy of source_path into dest_path through the SQLite backup API,
+    `pages` pages per step with `pause` seconds between steps for writers
+    """
+    pages = pages or _config('BACKUP_PAGES_PER_STEP', 1024)
+    pause = _config('BACKUP_STEP_PAUSE', 0.0) if pause is None else pause
+    progress = (lambda status, remaining, total: time.sleep(pause)) if pause else None
+    source = sqlite3.connect(source_path)
+    try:
+        target = sqlite3.connect(dest_path)
+        try:
+            source.backup(target, pages=pages, progress=progress)
+        finally:
+            target.close()
+    finally:
+        source.close()
+    return dest_path
+
+def _open_compressed(path, compression):
+    if compression == 'gzip':
+        return gzip.open(path, 'wb')
+    if compression == 'zstd':
+        return zstandard.ZstdCompressor().stream_writer(open(path, 'wb'))
+    return open(path, 'wb')
+
+def rotate_backups(backup_dir, db_filename, keep=None):
+    """Delete all but the newest `keep` backups of db_filename; returns the deleted paths"""
+    keep = _config('BACKUP_KEEP', 10) if keep is None else keep
+    if keep <= 0 or not os.path.isdir(backup_dir):
+        return []
+    backups = list_backups(backup_dir, db_filename)
+    deleted = []
+    for path in backups[keep:]:
+        try:
+            os.remove(path)
+            deleted.append(path)
+        except OSError as e:
+            print(f"⚠️  Could not remove old backup {path}: {e}")
+    return deleted
+
+def list_backups(backup_dir, db_filename):
+    """Backups of db_filename in backup_dir, newest first"""
+    pattern = re.compile(re.escape(db_filename) + r'\.backup_\d{8}_\d{6}(\.gz|\.zst)?$')
+    if not os.path.isdir(backup_dir):
+        return []
+    names = sorted((name for name in os.listdir(backup_dir) if pattern.match(name)), reverse=True)
+    return [os.path.join(backup_dir, name) for name in names]
+
+def create_backup(db_path, backup_dir=None, compression=None, keep=None):
+    """
+    Back up db_path to backups/<name>.backup_<timestamp>[.gz|.zst] next to it (or
+    in backup_dir), then rotate; returns the backup path
+    """
+    compression = compression or _config('BACKUP_COMPRESSION', 'none')
+    _check_compression(compression)
+    backup_dir = backup_dir or _config('BACKUP_DIR', '') or os.path.join(os.path.dirname(db_path), 'backups')
+    os.makedirs(backup_dir, exist_ok=True)
+
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    db_filename = os.path.basename(db_path)
+    backup_path = os.path.join(backup_dir, f"{db_filename}.backup_{timestamp}{BACKUP_EXTENSIONS[compression]}")
+    partial_path = f"{backup_path}.partial"
+    snapshot_path = partial_path if compression == 'none' else f"{partial_path}.db"
+    try:
+        online_backup(db_path, snapshot_path)
+        if compression != 'none':
+            with open(snapshot_path, 'rb') as source, _open_compressed(partial_path, compression) as target:
+                shutil.copyfileobj(source, target, CHUNK_SIZE)
+            os.remove(snapshot_path)
+        os.replace(partial_path, backup_path)
+    except BaseException:
+        for path in (partial_path, snapshot_path):
+            if os.path.exists(path):
+                os.remove(path)
+        raise
+    rotate_backups(backup_dir, db_filename, keep)
+    return backup_path
+
+def export_user_data(user_id, dest_path, source_path=None):
+    """
+    A standalone SQLite database holding one user's account (without the password
+    hash), books and reading logs, all read in a single transaction
+    """
+    source_path = source_path or database_path()
+    tables = [db.metadata.tables[name] for name in EXPORT_TABLES]
+    engine = create_engine(f'sqlite:///{dest_path}')
+    try:
+        db.metadata.create_all(engine, tables=tables)
+    finally:
+        engine.dispose()
+
+    conn = sqlite3.connect(dest_path, isolation_level=None)
+    try:
+        conn.execute('ATTACH DATABASE ? AS live', (source_path,))
+        conn.execute('BEGIN')
+        for table in tables:
+            columns = ', '.join(f'"{column.name}"' for column in table.columns)
+            owner = 'id' if table.name == 'user' else 'user_id'
+            conn.execute(f'INSERT INTO main."{table.name}" ({columns}) '
+                         f'SELECT {columns} FROM live."{table.name}" WHERE "{owner}" = ?', (user_id,))
+        conn.execute("UPDATE main.user SET password_hash = '!'")
+        conn.execute('COMMIT')
+        conn.execute('DETACH DATABASE live')
+    finally:
+        conn.close()
+    return dest_path
+
+def _compressor(compression):
+    if compression == 'gzip':
+        return zlib.compressobj(wbits=zlib.MAX_WBITS | 16)
+    if compression == 'zstd':
+        return zstandard.ZstdCompressor().compressobj()
+    return None
+
+def stream_file(path, compression='none', delete=False):
+    """Yield the file in chunks, compressing on the fly; optionally delete it afterwards"""
+    _check_compression(compression)
+    compressor = _compressor(compression)
+    try:
+        with open(path, 'rb') as handle:
+            while True:
+                chunk = handle.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                chunk = compressor.compress(chunk) if compressor else chunk
+                if chunk:
+                    yield chunk
+        if compressor:
+            yield compressor.flush()
+    finally:
+        if delete:
+            os.remove(path)
+
+def snapshot_for_download(user):
+    """
+    Temporary file to stream for /download_db: a full online backup for admins,
+    the user's own data for everyone else
+    """
+    source_path = database_path()
+    fd, path = tempfile.mkstemp(suffix='.db', prefix='download_', dir=os.path.dirname(source_path))
+    os.close(fd)
+    try:
+        if user.is_admin:
+            online_backup(source_path, path)
+        else:
+            os.remove(path)
+            export_user_data(user.id, path, source_path)
+    except BaseException:
+        if os.path.exists(path):
+            os.remove(path)
+        raise
+    return path
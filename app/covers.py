@@ -0,0 +1,317 @@
+"""
+Local cover store for MyBibliotheca
+Downloads each cover once, keeps it content-addressed under COVER_STORE (by the
+sha256 of the image bytes) alongside JPEG thumbnails in a few sizes, and serves
+them from our own origin with long-lived cache headers. Cover URLs are user
+supplied, so downloads only go to public http(s) hosts, and covers requested
+before they are stored are fetched by background threads, never in the request.
+"""
+
+import glob
+import hashlib
+import ipaddress
+import os
+import socket
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from io import BytesIO
+from urllib.parse import urljoin, urlsplit
+from flask import current_app, url_for
+from sqlalchemy.exc import IntegrityError
+from .models import db, CoverImage
+from .http_client import http_get
+from .throttle import provider_slot
+
+# Thumbnail bounding boxes (width, height); the aspect ratio is kept
+COVER_SIZES = {
+    'small': (100, 150),
+    'medium': (200, 300),
+    'large': (400, 600),
+}
+DEFAULT_SIZE = 'medium'
+
+_EXTENSIONS = {'JPEG': 'jpg', 'PNG': 'png', 'GIF': 'gif', 'WEBP': 'webp'}
+MAX_REDIRECTS = 5
+
+def _utcnow():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+def source_key(url):
+    return hashlib.sha256(url.encode('utf-8')).hexdigest()
+
+def _path(digest, suffix):
+    return os.path.join(current_app.config['COVER_STORE'], digest[:2], f'{digest}{suffix}')
+
+def thumbnail_path(digest, size):
+    return _path(digest, f'-{size}.jpg')
+
+def _original_path(digest):
+    matches = [path for path in glob.glob(_path(digest, '.*')) if not path.endswith('.tmp')]
+    return matches[0] if matches else None
+
+def _write_atomic(path, data):
+    """Write via a temp file + rename so concurrent workers never see a partial image"""
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+def _save_thumbnail(image, digest, size):
+    from PIL import Image
+    thumb = image.copy()
+    thumb.thumbnail(COVER_SIZES[size], Image.LANCZOS)
+    if thumb.mode != 'RGB':
+        # JPEG has no alpha: flatten transparent covers onto white
+        thumb = thumb.convert('RGBA')
+        background = Image.new('RGB', thumb.size, (255, 255, 255))
+        background.paste(thumb, mask=thumb.getchannel('A'))
+        thumb = background
+    buf = BytesIO()
+    thumb.save(buf, format='JPEG', quality=current_app.config.get('COVER_JPEG_QUALITY', 85), optimize=True, progressive=True)
+    _write_atomic(thumbnail_path(digest, size), buf.getvalue())
+
+def store_image(data):
+    """Validate image bytes, then store the original and every thumbnail; returns (digest, width, height)"""
+    from PIL import Image
+    image = Image.open(BytesIO(data))
+    image.load()  # raises on truncated or non-image data
+    digest = hashlib.sha256(data).hexdigest()
+    if _original_path(digest) is None:
+        _write_atomic(_path(digest, '.' + _EXTENSIONS.get(image.format, 'img')), data)
+    for size in COVER_SIZES:
+        if not os.path.exists(thumbnail_path(digest, size)):
+            _save_thumbnail(image, digest, size)
+    return digest, image.width, image.height
+
+def ensure_thumbnail(digest, size):
+    """Path of a stored thumbnail, regenerated from the original if missing; None if the image is gone"""
+    path = thumbnail_path(digest, size)
+    if os.path.exists(path):
+        return path
+    original = _original_path(digest)
+    if original is None:
+        return None
+    from PIL import Image
+    with Image.open(original) as image:
+        image.load()
+        _save_thumbnail(image, digest, size)
+    return path
+
+def is_http_url(url):
+    """True for absolute http(s) URLs, the only kind a cover may come from"""
+    parts = urlsplit(url)
+    return parts.scheme in ('http', 'https') and bool(parts.hostname)
+
+def check_cover_url(url):
+    """
+    Raise ValueError unless url is http(s) and its host resolves only to public
+    addresses (COVER_ALLOW_PRIVATE_HOSTS lifts the address check, e.g. for a LAN image host)
+    """
+    if not is_http_url(url):
+        raise ValueError("only http and https cover URLs are allowed")
+    if current_app.config.get('COVER_ALLOW_PRIVATE_HOSTS'):
+        return
+    parts = urlsplit(url)
+    try:
+        infos = socket.getaddrinfo(parts.hostname, parts.port or 80, proto=socket.IPPROTO_TCP)
+    except (socket.gaierror, UnicodeError, ValueError) as e:
+        raise ValueError(f"cannot resolve {parts.hostname}: {e}")
+    for info in infos:
+        address = ipaddress.ip_address(info[4][0].split('%')[0])
+        if address.version == 6 and address.ipv4_mapped:
+            address = address.ipv4_mapped
+        if not address.is_global or address.is_multicast:
+            raise ValueError(f"{parts.hostname} resolves to non-public address {address}")
+
+def _open_checked(url):
+    """GET url, following redirects by hand so every hop goes through check_cover_url()"""
+    for _ in range(MAX_REDIRECTS + 1):
+        check_cover_url(url)
+        response = http_get(url, stream=True, allow_redirects=False)
+        if not response.is_redirect:
+            return response
+        response.close()
+        url = urljoin(url, response.headers['Location'])
+    raise ValueError(f"more than {MAX_REDIRECTS} redirects")
+
+def _download(url):
+    max_bytes = current_app.config.get('COVER_MAX_BYTES', 5 * 1024 * 1024)
+    with provider_slot('covers'):
+        return _read_limited(_open_checked(url), max_bytes)
+
+def _read_limited(response, max_bytes):
+    try:
+        response.raise_for_status()
+        data = bytearray()
+        for chunk in response.iter_content(64 * 1024):
+            data.extend(chunk)
+            if len(data) > max_bytes:
+                raise ValueError(f"cover larger than {max_bytes} bytes")
+        return bytes(data)
+    finally:
+        response.close()
+
+def fetch_cover(url, force=False):
+    """
+    The CoverImage for a source URL, downloading it on first use. A failed download
+    is remembered (digest None) and retried after COVER_RETRY_AFTER seconds.
+    """
+    key = source_key(url)
+    record = CoverImage.query.filter_by(source_key=key).first()
+    if record is not None and not force:
+        retry_after = timedelta(seconds=current_app.config.get('COVER_RETRY_AFTER', 86400))
+        if record.digest or record.fetched_at > _utcnow() - retry_after:
+            return record
+
+    digest, width, height = _download_and_store(url) or (None, None, None)
+
+    if record is None:
+        record = CoverImage(source_key=key, source_url=url)
+        db.session.add(record)
+    record.digest, record.width, record.height = digest, width, height
+    record.fetched_at = _utcnow()
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # Another worker stored the same source first; its files are identical
+        db.session.rollback()
+        record = CoverImage.query.filter_by(source_key=key).first()
+    return record
+
+def _download_and_store(url):
+    """(digest, width, height) for a URL, or None; safe to run on worker threads (no database access)"""
+    try:
+        return store_image(_download(url))
+    except Exception as e:
+        current_app.logger.warning(f"Cover download failed for {url}: {e}")
+        return None
+
+def fetch_covers(urls, max_workers=None):
+    """
+    {url: CoverImage} for many sources: one query for what is already stored, then
+    the missing covers downloaded concurrently (COVER_FETCH_CONCURRENCY at a time)
+    """
+    from .throttle import map_concurrently
+    urls = list(dict.fromkeys(url for url in urls if url))
+    if not urls:
+        return {}
+    keys = {source_key(url): url for url in urls}
+    records = {keys[record.source_key]: record
+               for record in CoverImage.query.filter(CoverImage.source_key.in_(list(keys)))}
+    retry_before = _utcnow() - timedelta(seconds=current_app.config.get('COVER_RETRY_AFTER', 86400))
+    missing = [url for url in urls
+               if url not in records or (not records[url].digest and records[url].fetched_at <= retry_before)]
+    if not missing:
+        return records
+
+    if max_workers is None:
+        max_workers = current_app.config.get('COVER_FETCH_CONCURRENCY', 8)
+    results = map_concurrently(_download_and_store, missing, max_workers)
+    now = _utcnow()
+    for url, result in zip(missing, results):
+        record = records.get(url)
+        if record is None:
+            record = records[url] = CoverImage(source_key=source_key(url), source_url=url)
+            db.session.add(record)
+        record.digest, record.width, record.height = result or (None, None, None)
+        record.fetched_at = now
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # Another worker stored some of them first; theirs point at identical files
+        db.session.rollback()
+        records = {keys[record.source_key]: record
+                   for record in CoverImage.query.filter(CoverImage.source_key.in_(list(keys)))}
+    return records
+
+def _open_thumbnail(record, size):
+    from PIL import Image
+    path = ensure_thumbnail(record.digest, size) if record is not None and record.digest else None
+    if path is None:
+        return None
+    with Image.open(path) as image:
+        image.load()
+        return image.copy()
+
+def load_cover(url, size=DEFAULT_SIZE):
+    """A cover as a PIL image from the local store (downloading it once), or None"""
+    if not url:
+        return None
+    return _open_thumbnail(fetch_cover(url), size)
+
+def load_covers(urls, size=DEFAULT_SIZE):
+    """Covers for many URLs as PIL images (None where unavailable), in order"""
+    urls = list(urls)
+    records = fetch_covers(urls)
+    return [_open_thumbnail(records.get(url), size) if url else None for url in urls]
+
+class CoverFetcher:
+    """This process's background downloads for covers requested before they were stored"""
+
+    def __init__(self, app):
+        self.app = app
+        self.pending = set()
+        self.lock = threading.Lock()
+        # Threads are only started on the first submit, i.e. after a pre-fork
+        self.executor = ThreadPoolExecutor(max_workers=max(1, app.config.get('COVER_FETCH_WORKERS', 2)),
+                                           thread_name_prefix='cover-fetch')
+
+    def schedule(self, url):
+        """Queue a download unless one for url is already queued; returns True if queued"""
+        with self.lock:
+            if url in self.pending:
+                return False
+            self.pending.add(url)
+        self.executor.submit(self._run, url)
+        return True
+
+    def _run(self, url):
+        try:
+            with self.app.app_context():
+                fetch_cover(url)
+        except Exception as e:
+            self.app.logger.warning(f"Background cover download failed for {url}: {e}")
+        finally:
+            with self.lock:
+                self.pending.discard(url)
+
+def _runs_inline(app):
+    return app.config.get('TESTING') or app.config.get('COVER_FETCH_WORKERS', 2) <= 0
+
+def request_cover(url):
+    """
+    The stored CoverImage for url, or None while it has no image. Covers never
+    downloaded (or due a retry) are queued for a background download.
+    """
+    record = CoverImage.query.filter_by(source_key=source_key(url)).first()
+    retry_before = _utcnow() - timedelta(seconds=current_app.config.get('COVER_RETRY_AFTER', 86400))
+    if record is None or (not record.digest and record.fetched_at <= retry_before):
+        app = current_app._get_current_object()
+        if _runs_inline(app):
+            record = fetch_cover(url)
+        else:
+            app.extensions['cover_fetcher'].schedule(url)
+    return record if record is not None and record.digest else None
+
+def cover_src(book, size=DEFAULT_SIZE):
+    """
+    URL of a book's cover on our own server, or None if it has none. The source
+    key in the query string changes with the cover URL, so responses can be cached forever.
+    """
+    if not book.cover_url:
+        return None
+    return url_for('main.book_cover', uid=book.uid, size=size, v=source_key(book.cover_url)[:12])
+
+def init_cover_store(app):
+    os.makedirs(app.config['COVER_STORE'], exist_ok=True)
+    app.extensions['cover_fetcher'] = CoverFetcher(app)
+    app.add_template_global(cover_src)
@@ -0,0 +1,88 @@
+"""
+SQLite engine configuration for MyBibliotheca
+Every new connection gets WAL journaling (readers no longer wait for writers),
+a busy timeout instead of immediate "database is locked" errors, and tuned
+synchronous, mmap and cache pragmas. A background checkpointer per database
+file keeps the WAL from growing while readers are active.
+"""
+
+import sqlite3
+import threading
+import time
+from sqlalchemy import event
+from .models import db
+
+# Database files with a running checkpointer in this process
+_checkpointers = set()
+_checkpointers_lock = threading.Lock()
+
+def sqlite_pragmas(config):
+    """(pragma, value) pairs for each connection, in order; busy_timeout first so the rest can wait"""
+    pragmas = [('busy_timeout', int(config.get('SQLITE_BUSY_TIMEOUT', 5000)))]
+    if config.get('SQLITE_WAL', True):
+        pragmas.append(('journal_mode', 'WAL'))
+    pragmas += [
+        ('synchronous', config.get('SQLITE_SYNCHRONOUS', 'NORMAL')),
+        ('mmap_size', int(config.get('SQLITE_MMAP_SIZE', 0))),
+        # Negative cache_size is in KiB rather than pages
+        ('cache_size', -int(config.get('SQLITE_CACHE_SIZE_KB', 2000))),
+    ]
+    return pragmas
+
+def configure_engine(engine, config):
+    """Apply sqlite_pragmas() to every connection the engine opens (no-op for other databases)"""
+    if engine.dialect.name != 'sqlite':
+        return False
+    pragmas = sqlite_pragmas(config)
+
+    @event.listens_for(engine, 'connect')
+    def _apply_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas:
+                cursor.execute(f'PRAGMA {name}={value}')
+        finally:
+            cursor.close()
+
+    return True
+
+def checkpoint(path, mode='PASSIVE', timeout=1.0):
+    """Run a WAL checkpoint; returns (busy, wal_pages, checkpointed_pages)"""
+    conn = sqlite3.connect(path, timeout=timeout)
+    try:
+        return tuple(conn.execute(f'PRAGMA wal_checkpoint({mode})').fetchone())
+    finally:
+        conn.close()
+
+def _checkpoint_loop(path, interval, logger):
+    while True:
+        time.sleep(interval)
+        try:
+            busy, wal_pages, checkpointed = checkpoint(path)
+            if busy or (wal_pages > 0 and checkpointed < wal_pages):
+                logger.info(f"WAL checkpoint incomplete for {path}: {checkpointed}/{wal_pages} pages")
+        except sqlite3.Error as e:
+            logger.warning(f"WAL checkpoint failed for {path}: {e}")
+
+def start_checkpointer(path, interval, logger):
+    """One daemon thread per database file per process, checkpointing every `interval` seconds"""
+    if interval <= 0:
+        return False
+    with _checkpointers_lock:
+        if path in _checkpointers:
+            return False
+        _checkpointers.add(path)
+    threading.Thread(target=_checkpoint_loop, args=(path, interval, logger),
+                     name='sqlite-checkpoint', daemon=True).start()
+    return True
+
+def init_database(app):
+    """Configure the app's engine; call right after db.init_app(app)"""
+    from .backups import database_path
+    with app.app_context():
+        engine = db.engine
+        if not configure_engine(engine, app.config):
+            return
+        path = database_path(engine)
+    if path and app.config.get('SQLITE_WAL', True):
+        start_checkpointer(path, app.config.get('SQLITE_CHECKPOINT_INTERVAL', 300), app.logger)
@@ -0,0 +1,136 @@
+"""
+Facet index for MyBibliotheca
+Keeps per-user counts of categories, publishers and languages in the book_facet
+table, updated in the same transaction as every ORM insert, update and delete of a Book
+"""
+
+from collections import Counter
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from .models import db, Book, BookFacet
+
+FACETS = ('category', 'publisher', 'language')
+FACET_COLUMNS = ('user_id', 'categories', 'publisher', 'language')
+
+def book_facet_keys(user_id, categories, publisher, language):
+    """The (user_id, facet, value) keys a book with these column values counts towards"""
+    if user_id is None:
+        return set()
+    keys = {(user_id, 'category', cat.strip()[:255]) for cat in (categories or '').split(',') if cat.strip()}
+    if publisher and publisher.strip():
+        keys.add((user_id, 'publisher', publisher[:255]))
+    if language and language.strip():
+        keys.add((user_id, 'language', language[:255]))
+    return keys
+
+def _column_values(book):
+    """(old, new) values of the facet columns of a flushed Book"""
+    old, new = [], []
+    state = inspect(book)
+    for column in FACET_COLUMNS:
+        history = state.attrs[column].history
+        if history.has_changes():
+            old.append(history.deleted[0] if history.deleted else None)
+            new.append(history.added[0] if history.added else None)
+        else:
+            value = getattr(book, column)
+            old.append(value)
+            new.append(value)
+    return old, new
+
+def _upsert(connection, user_id, facet, value, delta):
+    table = BookFacet.__table__
+    dialect = connection.dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        if dialect == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert
+        stmt = insert(table).values(user_id=user_id, facet=facet, value=value, count=delta)
+        connection.execute(stmt.on_conflict_do_update(
+            index_elements=['user_id', 'facet', 'value'],
+            set_={'count': table.c.count + stmt.excluded.count}
+        ))
+        return
+
+    where = (table.c.user_id == user_id) & (table.c.facet == facet) & (table.c.value == value)
+    updated = connection.execute(table.update().where(where).values(count=table.c.count + delta))
+    if not updated.rowcount:
+        connection.execute(table.insert().values(user_id=user_id, facet=facet, value=value, count=delta))
+
+def _apply(connection, deltas):
+    table = BookFacet.__table__
+    users = set()
+    for (user_id, facet, value), delta in deltas.items():
+        if delta:
+            _upsert(connection, user_id, facet, value, delta)
+            users.add(user_id)
+    if users:
+        connection.execute(table.delete().where(table.c.user_id.in_(users), table.c.count <= 0))
+
+@event.listens_for(Session, 'before_flush')
+def _collect_facet_changes(session, flush_context, instances):
+    deltas = session.info.setdefault('facet_deltas', Counter())
+    for book in session.new:
+        if isinstance(book, Book):
+            deltas.update(book_facet_keys(book.user_id, book.categories, book.publisher, book.language))
+    for book in session.dirty:
+        if isinstance(book, Book) and session.is_modified(book):
+            old, new = _column_values(book)
+            deltas.subtract(book_facet_keys(*old))
+            deltas.update(book_facet_keys(*new))
+    for book in session.deleted:
+        if isinstance(book, Book):
+            old, _ = _column_values(book)
+            deltas.subtract(book_facet_keys(*old))
+
+@event.listens_for(Session, 'after_flush')
+def _write_facet_changes(session, flush_context):
+    deltas = session.info.pop('facet_deltas', None)
+    if deltas:
+        _apply(session.connection(), deltas)
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _discard_facet_changes(session, previous_transaction):
+    session.info.pop('facet_deltas', None)
+
+# Load the previous value when a facet column is assigned, so the old facet can be decremented
+for _column in FACET_COLUMNS:
+    event.listen(getattr(Book, _column), 'set', lambda target, value, oldvalue, initiator: None,
+                 active_history=True)
+
+def get_facets(user_id):
+    """Sorted {'category': [(value, count)], 'publisher': [...], 'language': [...]} in one query"""
+    facets = {facet: [] for facet in FACETS}
+    rows = (db.session.query(BookFacet.facet, BookFacet.value, BookFacet.count)
+            .filter(BookFacet.user_id == user_id, BookFacet.count > 0)
+            .order_by(BookFacet.facet, BookFacet.value))
+    for facet, value, count in rows:
+        facets.setdefault(facet, []).append((value, count))
+    return facets
+
+def rebuild_facets(user_id=None):
+    """Recount facets from the book table (after bulk SQL changes); returns rows written"""
+    deltas = Counter()
+    query = db.session.query(Book.user_id, Book.categories, Book.publisher, Book.language)
+    if user_id is not None:
+        query = query.filter(Book.user_id == user_id)
+    for row in query.yield_per(1000):
+        deltas.update(book_facet_keys(*row))
+
+    delete = BookFacet.query
+    if user_id is not None:
+        delete = delete.filter(BookFacet.user_id == user_id)
+    delete.delete(synchronize_session=False)
+    db.session.bulk_insert_mappings(BookFacet, [
+        {'user_id': uid, 'facet': facet, 'value': value, 'count': count}
+        for (uid, facet, value), count in deltas.items() if count > 0
+    ])
+    db.session.commit()
+    return len(deltas)
+
+def ensure_facets_built():
+    """Backfill the facet index for databases created before it existed"""
+    if db.session.query(BookFacet.id).first() is None and db.session.query(Book.id).first() is not None:
+        print("🔄 Building facet index for categories, publishers and languages...")
+        print(f"✅ Facet index built ({rebuild_facets()} entries)")
@@ -0,0 +1,103 @@
+"""
+Shared HTTP client for MyBibliotheca
+One pooled requests.Session per process with keep-alive, retry/backoff and default
+timeouts for every outbound provider call, plus per-host latency and error metrics
+"""
+
+import os
+import threading
+import time
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from flask import current_app
+
+# Transient statuses worth retrying (rate limited or upstream trouble)
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+_session_lock = threading.Lock()
+
+# Per-process counters, exposed through get_http_stats()
+_metrics_lock = threading.Lock()
+_metrics = {}
+
+def _build_session(config):
+    retry = Retry(
+        total=config.get('HTTP_MAX_RETRIES', 2),
+        backoff_factor=config.get('HTTP_RETRY_BACKOFF', 0.5),
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=frozenset(['GET', 'HEAD']),
+        respect_retry_after_header=True,
+        raise_on_status=False  # hand the final response to raise_for_status() in the caller
+    )
+    adapter = HTTPAdapter(
+        pool_connections=config.get('HTTP_POOL_CONNECTIONS', 10),
+        pool_maxsize=config.get('HTTP_POOL_MAXSIZE', 10),
+        max_retries=retry
+    )
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.headers['User-Agent'] = config.get('HTTP_USER_AGENT', 'MyBibliotheca')
+    return session
+
+def get_session():
+    """The pooled session for this process (rebuilt after a fork so workers never share sockets)"""
+    app = current_app._get_current_object()
+    pid = os.getpid()
+    entry = app.extensions.get('http_client')
+    if entry is None or entry[0] != pid:
+        with _session_lock:
+            entry = app.extensions.get('http_client')
+            if entry is None or entry[0] != pid:
+                entry = app.extensions['http_client'] = (pid, _build_session(app.config))
+    return entry[1]
+
+def _record(host, elapsed, response=None, error=None):
+    with _metrics_lock:
+        stats = _metrics.setdefault(host, {
+            'requests': 0,
+            'errors': 0,
+            'retries': 0,
+            'total_ms': 0.0,
+            'max_ms': 0.0,
+            'last_error': None
+        })
+        stats['requests'] += 1
+        stats['total_ms'] += elapsed * 1000
+        stats['max_ms'] = max(stats['max_ms'], elapsed * 1000)
+        retries = getattr(getattr(response, 'raw', None), 'retries', None)
+        if retries is not None:
+            stats['retries'] += len(retries.history)
+        if error is not None or (response is not None and response.status_code >= 400):
+            stats['errors'] += 1
+            stats['last_error'] = str(error) if error is not None else f"HTTP {response.status_code}"
+
+def http_get(url, params=None, timeout=None, **kwargs):
+    """
+    GET through the shared session; raises requests exceptions like requests.get.
+    timeout defaults to (HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT).
+    """
+    if timeout is None:
+        timeout = (current_app.config.get('HTTP_CONNECT_TIMEOUT', 5), current_app.config.get('HTTP_READ_TIMEOUT', 10))
+    host = urlsplit(url).netloc
+    start = time.perf_counter()
+    try:
+        response = get_session().get(url, params=params, timeout=timeout, **kwargs)
+    except requests.exceptions.RequestException as e:
+        _record(host, time.perf_counter() - start, error=e)
+        raise
+    _record(host, time.perf_counter() - start, response=response)
+    return response
+
+def get_http_stats():
+    """Per-host request, error, retry and latency counters for this process"""
+    with _metrics_lock:
+        snapshot = {host: dict(stats) for host, stats in _metrics.items()}
+    for stats in snapshot.values():
+        stats['avg_ms'] = round(stats['total_ms'] / stats['requests'], 1) if stats['requests'] else None
+        stats['error_rate'] = round(stats['errors'] / stats['requests'], 3) if stats['requests'] else None
+        stats['total_ms'] = round(stats['total_ms'], 1)
+        stats['max_ms'] = round(stats['max_ms'], 1)
+    return dict(sorted(snapshot.items()))
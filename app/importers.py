@@ -0,0 +1,187 @@
+"""
+CSV importers for MyBibliotheca
+Bulk ISBN and Goodreads imports, executed as background tasks by app.tasks.
+Uploads are decoded incrementally and parsed row by row, and rows reach the
+metadata resolver in fixed-size batches, so memory stays flat however large
+the export is.
+"""
+
+import codecs
+import csv
+import os
+import secrets
+from datetime import datetime, date
+from itertools import islice
+from flask import current_app
+from .models import db, Book
+from .tasks import task_handler
+from .metadata_resolver import resolve_many, FIELDS, OPENLIBRARY_FIRST
+
+def save_upload(file):
+    """Store an uploaded CSV under UPLOAD_FOLDER so a worker can process it later"""
+    upload_dir = current_app.config['UPLOAD_FOLDER']
+    os.makedirs(upload_dir, exist_ok=True)
+    path = os.path.join(upload_dir, f"{secrets.token_hex(16)}.csv")
+    file.save(path)
+    return path
+
+# Goodreads exports carry title and author; every other metadata field is looked up
+GOODREADS_FIELDS = tuple(name for name in FIELDS if name not in ('title', 'author'))
+
+# Codec error handler for bytes that are not valid UTF-8 (see _decode_legacy_bytes)
+DECODE_ERRORS = 'mybibliotheca-csv'
+
+def _legacy_char(byte):
+    try:
+        return bytes([byte]).decode('cp1252')
+    except UnicodeDecodeError:  # The five bytes cp1252 leaves undefined
+        return chr(byte)
+
+def _decode_legacy_bytes(error):
+    """Read stray non-UTF-8 bytes (spreadsheet edits of an export) as Windows-1252"""
+    if not isinstance(error, UnicodeDecodeError):
+        raise error
+    return ''.join(_legacy_char(byte) for byte in error.object[error.start:error.end]), error.end
+
+codecs.register_error(DECODE_ERRORS, _decode_legacy_bytes)
+
+def _sniff_encoding(path):
+    """utf-16 for files starting with a UTF-16 BOM, otherwise UTF-8 with an optional BOM"""
+    with open(path, 'rb') as f:
+        head = f.read(2)
+    if head in (codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE):
+        return 'utf-16'
+    return 'utf-8-sig'
+
+def open_csv(path):
+    """Text stream over an uploaded CSV, decoded incrementally as it is read"""
+    return open(path, encoding=_sniff_encoding(path), errors=DECODE_ERRORS, newline='')
+
+def batched(items, size):
+    """Lists of up to `size` consecutive items, pulled lazily from any iterable"""
+    iterator = iter(items)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+def clean_isbn(val):
+    """Goodreads CSV sometimes has ISBN/ISBN13 as ='978...'"""
+    if not val:
+        return ""
+    val = val.strip()
+    if val.startswith('="') and val.endswith('"'):
+        val = val[2:-1]
+    return val.strip()
+
+def read_bulk_import_isbns(path):
+    """ISBNs from the first column of a bulk import CSV, skipping blank rows (lazily)"""
+    with open_csv(path) as f:
+        for row in csv.reader(f):
+            if not row:  # Skip empty rows
+                continue
+            isbn = row[0].strip()
+            if not isbn: # Skip rows with empty ISBN
+                continue
+            yield isbn
+
+def read_goodreads_rows(path):
+    """Importable (title, author, isbn, finish_date, want_to_read) rows from a Goodreads export (lazily)"""
+    with open_csv(path) as f:
+        for row in csv.DictReader(f):
+            title = row.get('Title')
+            author = row.get('Author')
+            isbn = clean_isbn(row.get('ISBN13')) or clean_isbn(row.get('ISBN'))
+            date_read = row.get('Date Read')
+            want_to_read = 'to-read' in (row.get('Bookshelves') or '')
+            finish_date = None
+            if date_read:
+                try:
+                    finish_date = datetime.strptime(date_read, "%Y/%m/%d").date()
+                except Exception:
+                    pass
+            # Skip books with missing or blank ISBN
+            if not title or not author or not isbn or isbn == "":
+                continue
+            yield title, author, isbn, finish_date, want_to_read
+
+def _import_isbn(user_id, isbn, metadata, default_status):
+    """Create one bulk-imported book; returns an error string or None on success"""
+    # Check if book already exists
+    if Book.get_user_book_by_isbn(user_id, isbn):
+        return f"{isbn} (already exists)"
+
+    if not metadata.found:
+        return f"{isbn} (data not found)"
+
+    if not metadata.title or not metadata.author:
+        return f"{isbn} (missing title/author)"
+
+    db.session.add(Book(
+        title=metadata.title,
+        author=metadata.author,
+        isbn=isbn,
+        user_id=user_id,
+        want_to_read=default_status == 'want_to_read',
+        library_only=default_status == 'library_only',
+        start_date=date.today() if default_status == 'reading' else None,
+        **metadata.book_fields()
+    ))
+    return None
+
+@task_handler('bulk_import')
+def run_bulk_import(task, progress):
+    """Import a one-ISBN-per-row CSV, resuming after the last checkpoint"""
+    payload = task.payload_data
+    default_status = payload.get('default_status', 'library_only')
+    # One counting pass for the progress total, then a second pass that imports
+    progress.set_total(sum(1 for _ in read_bulk_import_isbns(payload['path'])))
+    isbns = islice(read_bulk_import_isbns(payload['path']), progress.start_index, None)
+
+    batch_size = max(1, current_app.config.get('OPENLIBRARY_BATCH_SIZE', 50))
+    for chunk in batched(isbns, batch_size):
+        # OpenLibrary is batched; Google Books fills whatever it leaves out (ratings, most descriptions)
+        with progress.keepalive():
+            resolved = resolve_many(chunk, fields=FIELDS, precedence=OPENLIBRARY_FIRST)
+        for isbn in chunk:
+            progress.set_current(isbn)
+            error = _import_isbn(task.user_id, isbn, resolved[isbn], default_status)
+            progress.item_done(success=error is None, error=error)
+
+    message = f'Successfully imported {task.success_count} books.'
+    if task.error_count:
+        message += f' Failed to import {task.error_count} books.'
+    return {'message': message}
+
+@task_handler('goodreads_import')
+def run_goodreads_import(task, progress):
+    """Import a Goodreads library export, resuming after the last checkpoint"""
+    payload = task.payload_data
+    default_cover = payload.get('default_cover')
+    progress.set_total(sum(1 for _ in read_goodreads_rows(payload['path'])))
+    rows = islice(read_goodreads_rows(payload['path']), progress.start_index, None)
+
+    batch_size = max(1, current_app.config.get('OPENLIBRARY_BATCH_SIZE', 50))
+    for chunk in batched(rows, batch_size):
+        # Title and author come from the export; Google Books fills the fields OpenLibrary lacks
+        with progress.keepalive():
+            resolved = resolve_many([isbn for _, _, isbn, _, _ in chunk], fields=GOODREADS_FIELDS, precedence=OPENLIBRARY_FIRST)
+        for title, author, isbn, finish_date, want_to_read in chunk:
+            progress.set_current(title)
+            if Book.get_user_book_by_isbn(task.user_id, isbn):
+                progress.item_done(success=False, error=f"{isbn} (already exists)")
+                continue
+
+            book_fields = resolved[isbn].book_fields()
+            book_fields['cover_url'] = book_fields['cover_url'] or default_cover
+
+            db.session.add(Book(
+                title=title,
+                author=author,
+                isbn=isbn,
+                user_id=task.user_id,
+                finish_date=finish_date,
+                want_to_read=want_to_read,
+                **book_fields
+            ))
+            progress.item_done()
+
+    return {'message': f'Imported {task.success_count} books from Goodreads.'}
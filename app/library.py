@@ -0,0 +1,200 @@
+"""
+Library listing queries for MyBibliotheca
+Keyset pagination with the reading-status (or search relevance) ordering done
+in SQL, plus the aggregate counts and filter options shown above the bookshelf
+"""
+
+import base64
+import json
+from datetime import date
+from sqlalchemy import and_, or_, case, func, literal, true, false
+from .models import db, Book, User
+from .facets import get_facets
+from .search import highlight
+
+def status_priority():
+    """
+    SQL expression ranking books for the shelf:
+    1 currently reading, 2 want to read, 3 finished, 4 library only
+    """
+    want_to_read = func.coalesce(Book.want_to_read, false())
+    library_only = func.coalesce(Book.library_only, false())
+    return case(
+        (and_(Book.finish_date.is_(None), want_to_read == false(), library_only == false()), 1),
+        (want_to_read == true(), 2),
+        (Book.finish_date.isnot(None), 3),
+        else_=4
+    )
+
+def encode_cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip('=')
+
+# Cursor value types for each ordering
+SHELF_KEY_TYPES = (int, str, int)    # status priority, lower(title), id
+RANKED_KEY_TYPES = (float, int)      # bm25 rank, id
+PUBLIC_KEY_TYPES = (str, str, int)   # 'finished' or 'unfinished', ISO finish date ('' if none), id
+
+def decode_cursor(cursor, types=SHELF_KEY_TYPES):
+    """Decode a page cursor into a tuple of `types`; None if it is missing or malformed"""
+    if not cursor:
+        return None
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        if not isinstance(values, list) or len(values) != len(types):
+            return None
+        if any(isinstance(value, (list, dict, bool)) or value is None for value in values):
+            return None
+        return tuple(kind(value) for kind, value in zip(types, values))
+    except (ValueError, TypeError):
+        return None
+
+class LibraryPage:
+    """One page of books plus cursors for the neighbouring pages"""
+
+    def __init__(self, books, next_cursor=None, prev_cursor=None, snippets=None):
+        self.books = books
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+        self.snippets = snippets or {}  # book id -> highlighted search snippet
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+def _after(keys, cursor):
+    """Rows sorting strictly after cursor for ascending keys (row-value comparison)"""
+    (key, *rest_keys), (value, *rest_values) = keys, cursor
+    if not rest_keys:
+        return key > value
+    return or_(key > value, and_(key == value, _after(rest_keys, rest_values)))
+
+def _before(keys, cursor):
+    (key, *rest_keys), (value, *rest_values) = keys, cursor
+    if not rest_keys:
+        return key < value
+    return or_(key < value, and_(key == value, _before(rest_keys, rest_values)))
+
+def paginate_books(criteria, page_size, after=None, before=None, search=None):
+    """
+    Fetch one page of books matching criteria, ordered by status priority, title
+    (case-insensitive) and id. With a ranked search (see search.BookSearch) the
+    order is relevance, then id, and the page carries highlighted snippets.
+    `after`/`before` are cursors from a previous page.
+    """
+    if search is not None and search.ranked:
+        keys = (search.rank, Book.id)
+        types = RANKED_KEY_TYPES
+        query = search.apply(db.session.query(Book, search.snippet, *keys))
+    else:
+        keys = (status_priority(), func.lower(Book.title), Book.id)
+        types = SHELF_KEY_TYPES
+        query = db.session.query(Book, literal(None), *keys)
+        if search is not None:
+            query = search.apply(query)
+    query = query.filter(*criteria)
+
+    after_key = decode_cursor(after, types)
+    before_key = decode_cursor(before, types) if after_key is None else None
+    if before_key is not None:
+        # Walk backwards from the cursor, then restore shelf order
+        rows = query.filter(_before(keys, before_key)).order_by(*(key.desc() for key in keys)).limit(page_size + 1).all()
+        has_more = len(rows) > page_size
+        rows = list(reversed(rows[:page_size]))
+        has_prev, has_next = has_more, True
+    else:
+        if after_key is not None:
+            query = query.filter(_after(keys, after_key))
+        rows = query.order_by(*keys).limit(page_size + 1).all()
+        has_next = len(rows) > page_size
+        rows = rows[:page_size]
+        has_prev = after_key is not None
+
+    books = [row[0] for row in rows]
+    snippets = {row[0].id: highlight(row[1]) for row in rows if row[1]}
+    if not rows:
+        return LibraryPage(books)
+    return LibraryPage(
+        books,
+        next_cursor=encode_cursor(list(rows[-1][2:])) if has_next else None,
+        prev_cursor=encode_cursor(list(rows[0][2:])) if has_prev else None,
+        snippets=snippets
+    )
+
+# Public library filters; each pages by id, newest first
+PUBLIC_FILTERS = {
+    'currently_reading': (
+        Book.finish_date.is_(None),
+        Book.want_to_read.isnot(True),  # Handle NULL and False
+        Book.library_only.isnot(True)  # Handle NULL and False
+    ),
+    'want_to_read': (Book.want_to_read == True,),
+}
+
+def public_books():
+    """Books whose owners share their library, with the privacy check done in SQL"""
+    return Book.query.join(User, User.id == Book.user_id).filter(User.share_library == True, User.is_active == True)
+
+def _public_cursor(book):
+    if book.finish_date is not None:
+        return encode_cursor(['finished', book.finish_date.isoformat(), book.id])
+    return encode_cursor(['unfinished', '', book.id])
+
+def paginate_public_library(filter_status, page_size, after=None):
+    """
+    One page of the public library. "All" lists finished books newest first, then
+    the rest newest first; as two keyset scans (ix_book_finish_date_id and the
+    primary key) each page reads only page_size + 1 rows however big the catalogue.
+    """
+    query = public_books()
+    cursor = decode_cursor(after, PUBLIC_KEY_TYPES)
+    if filter_status in PUBLIC_FILTERS:
+        query = query.filter(*PUBLIC_FILTERS[filter_status])
+        if cursor is not None:
+            query = query.filter(Book.id < cursor[2])
+        books = query.order_by(Book.id.desc()).limit(page_size + 1).all()
+    else:
+        books = []
+        segment = cursor[0] if cursor is not None else 'finished'
+        if segment == 'finished':
+            finished = query.filter(Book.finish_date.isnot(None))
+            if cursor is not None:
+                try:
+                    day = date.fromisoformat(cursor[1])
+                except ValueError:
+                    day = None
+                if day is not None:
+                    finished = finished.filter(or_(Book.finish_date < day,
+                                                   and_(Book.finish_date == day, Book.id < cursor[2])))
+            books = finished.order_by(Book.finish_date.desc(), Book.id.desc()).limit(page_size + 1).all()
+            cursor = None  # the unfinished books follow from the start
+        if len(books) <= page_size:
+            unfinished = query.filter(Book.finish_date.is_(None))
+            if cursor is not None:
+                unfinished = unfinished.filter(Book.id < cursor[2])
+            books += unfinished.order_by(Book.id.desc()).limit(page_size + 1 - len(books)).all()
+
+    if len(books) <= page_size:
+        return LibraryPage(books)
+    books = books[:page_size]
+    return LibraryPage(books, next_cursor=_public_cursor(books[-1]))
+
+def library_stats(criteria):
+    """Total, finished, currently reading and want-to-read counts in one aggregate query"""
+    priority = status_priority()
+    row = db.session.query(
+        func.count(Book.id),
+        func.sum(case((Book.finish_date.isnot(None), 1), else_=0)),
+        func.sum(case((priority == 1, 1), else_=0)),
+        func.sum(case((func.coalesce(Book.want_to_read, false()) == true(), 1), else_=0))
+    ).filter(*criteria).one()
+    total, finished, reading, want_to_read = (value or 0 for value in row)
+    return {'total': total, 'finished': finished, 'reading': reading, 'want_to_read': want_to_read}
+
+def filter_options(user_id):
+    """Categories, publishers and languages of a user's books as sorted (value, count) pairs"""
+    facets = get_facets(user_id)
+    return facets['category'], facets['publisher'], facets['language']
@@ -0,0 +1,246 @@
+"""
+Persistent metadata cache for MyBibliotheca
+Keeps OpenLibrary and Google Books lookups in the application database so that
+every worker process shares them, with negative caching and stale-while-revalidate
+"""
+
+import json
+import threading
+from datetime import datetime, timedelta, timezone
+from flask import current_app
+from sqlalchemy.exc import SQLAlchemyError
+from .models import db, MetadataCache
+
+# Per-process counters, exposed through get_cache_stats()
+_stats_lock = threading.Lock()
+_stats = {
+    'hits': 0,
+    'negative_hits': 0,
+    'stale_hits': 0,
+    'misses': 0,
+    'refreshes': 0,
+    'errors': 0,
+}
+
+# Keys currently being revalidated in the background by this process
+_refreshing = set()
+_refreshing_lock = threading.Lock()
+
+def _utcnow():
+    """Naive UTC timestamp (SQLite drops tzinfo on DateTime columns)"""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+def _count(counter):
+    with _stats_lock:
+        _stats[counter] += 1
+
+def _decode(entry):
+    """Return a fresh copy of the cached payload so callers can mutate it"""
+    if not entry.found or entry.payload is None:
+        return None
+    return json.loads(entry.payload)
+
+def _upsert_statement(values):
+    """Build a dialect-native upsert so concurrent workers never hit IntegrityError"""
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    elif dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        return None
+
+    stmt = insert(MetadataCache.__table__).values(**values)
+    return stmt.on_conflict_do_update(
+        index_elements=['provider', 'isbn'],
+        set_={key: stmt.excluded[key] for key in ('payload', 'found', 'fetched_at', 'expires_at')}
+    )
+
+def _write(provider, isbn, payload):
+    """Stage a cache row in the session without committing"""
+    config = current_app.config
+    ttl = config.get('METADATA_CACHE_TTL') if payload is not None else config.get('METADATA_CACHE_NEGATIVE_TTL')
+    now = _utcnow()
+    values = {
+        'provider': provider,
+        'isbn': isbn,
+        'payload': json.dumps(payload) if payload is not None else None,
+        'found': payload is not None,
+        'fetched_at': now,
+        'expires_at': now + timedelta(seconds=ttl),
+    }
+
+    stmt = _upsert_statement(values)
+    if stmt is not None:
+        db.session.execute(stmt)
+        return
+    entry = MetadataCache.query.filter_by(provider=provider, isbn=isbn).first()
+    if entry is None:
+        entry = MetadataCache(provider=provider, isbn=isbn)
+        db.session.add(entry)
+    for key, value in values.items():
+        setattr(entry, key, value)
+
+def store_many(provider, payloads):
+    """Store several provider results ({isbn: payload or None}) in one transaction"""
+    if not payloads:
+        return
+    try:
+        for isbn, payload in payloads.items():
+            _write(provider, isbn, payload)
+        db.session.commit()
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        _count('errors')
+        current_app.logger.warning(f"Failed to store {len(payloads)} metadata cache entries for {provider}: {e}")
+
+def store(provider, isbn, payload):
+    """Store a provider result; payload None records a negative ("not found") entry"""
+    store_many(provider, {isbn: payload})
+
+def get_entry(provider, isbn):
+    """Return the raw cache row for provider/isbn, or None"""
+    # populate_existing: another worker or thread may have refreshed the row since we loaded it
+    return MetadataCache.query.filter_by(provider=provider, isbn=isbn).populate_existing().first()
+
+def _revalidate(app, provider, isbns, fetch_many):
+    """Refresh stale entries outside the request that noticed them"""
+    try:
+        with app.app_context():
+            try:
+                store_many(provider, fetch_many(isbns))
+                _count('refreshes')
+            except Exception as e:
+                _count('errors')
+                app.logger.warning(f"Background refresh failed for {provider}:{','.join(isbns)}: {e}")
+    finally:
+        with _refreshing_lock:
+            _refreshing.difference_update((provider, isbn) for isbn in isbns)
+
+def _schedule_revalidation(provider, isbns, fetch_many):
+    with _refreshing_lock:
+        isbns = [isbn for isbn in isbns if (provider, isbn) not in _refreshing]
+        if not isbns:
+            return
+        _refreshing.update((provider, isbn) for isbn in isbns)
+
+    app = current_app._get_current_object()
+    if app.config.get('TESTING'):
+        # Keep tests deterministic: refresh inline instead of in a thread
+        _revalidate(app, provider, isbns, fetch_many)
+        return
+    threading.Thread(target=_revalidate, args=(app, provider, isbns, fetch_many), daemon=True).start()
+
+def _single(fetch):
+    """Adapt a one-ISBN fetch function to the {isbn: payload} batch shape"""
+    return lambda isbns: {isbn: fetch(isbn) for isbn in isbns}
+
+def cached_lookup(provider, isbn, fetch):
+    """
+    Return provider data for an ISBN, calling fetch(isbn) only when needed.
+
+    fetch must return a JSON-serialisable dict, None when the provider has no
+    record (cached negatively), or raise when the provider could not be reached
+    (not cached, the exception propagates to the caller).
+    """
+    if not current_app.config.get('METADATA_CACHE_ENABLED', True):
+        return fetch(isbn)
+
+    entry = get_entry(provider, isbn)
+    now = _utcnow()
+
+    if entry is not None:
+        if now < entry.expires_at:
+            _count('hits' if entry.found else 'negative_hits')
+            return _decode(entry)
+
+        stale_window = timedelta(seconds=current_app.config.get('METADATA_CACHE_STALE_TTL', 0))
+        if entry.found and now < entry.expires_at + stale_window:
+            _count('stale_hits')
+            payload = _decode(entry)
+            _schedule_revalidation(provider, [isbn], _single(fetch))
+            return payload
+
+    _count('misses')
+    payload = fetch(isbn)
+    store(provider, isbn, payload)
+    return payload
+
+def lookup_many(provider, isbns, fetch_many):
+    """
+    Batch variant of cached_lookup: returns {isbn: payload or None} for every ISBN.
+
+    Cache state for all ISBNs is read in one query and only the misses are passed
+    to fetch_many(isbns), which returns {isbn: payload or None}. ISBNs it leaves
+    out (e.g. a failed chunk) are reported as None but not cached.
+    """
+    isbns = list(dict.fromkeys(isbn for isbn in isbns if isbn))
+    if not isbns:
+        return {}
+    if not current_app.config.get('METADATA_CACHE_ENABLED', True):
+        fetched = fetch_many(isbns)
+        return {isbn: fetched.get(isbn) for isbn in isbns}
+
+    entries = {
+        entry.isbn: entry
+        for entry in MetadataCache.query.filter(
+            MetadataCache.provider == provider,
+            MetadataCache.isbn.in_(isbns)
+        ).populate_existing().all()
+    }
+    now = _utcnow()
+    stale_window = timedelta(seconds=current_app.config.get('METADATA_CACHE_STALE_TTL', 0))
+
+    results = {}
+    missing = []
+    stale = []
+    for isbn in isbns:
+        entry = entries.get(isbn)
+        if entry is not None and now < entry.expires_at:
+            _count('hits' if entry.found else 'negative_hits')
+            results[isbn] = _decode(entry)
+        elif entry is not None and entry.found and now < entry.expires_at + stale_window:
+            _count('stale_hits')
+            results[isbn] = _decode(entry)
+            stale.append(isbn)
+        else:
+            _count('misses')
+            missing.append(isbn)
+
+    if missing:
+        fetched = fetch_many(missing)
+        store_many(provider, {isbn: fetched[isbn] for isbn in missing if isbn in fetched})
+        for isbn in missing:
+            results[isbn] = fetched.get(isbn)
+    if stale:
+        _schedule_revalidation(provider, stale, fetch_many)
+
+    return {isbn: results[isbn] for isbn in isbns}
+
+def get_cache_stats(include_entries=True):
+    """Hit/miss counters for this process plus (optionally) entry counts from the shared store"""
+    with _stats_lock:
+        stats = dict(_stats)
+
+    lookups = stats['hits'] + stats['negative_hits'] + stats['stale_hits'] + stats['misses']
+    stats['hit_rate'] = round((lookups - stats['misses']) / lookups, 3) if lookups else None
+
+    if not include_entries:
+        return stats
+    try:
+        stats['entries'] = MetadataCache.query.count()
+        stats['negative_entries'] = MetadataCache.query.filter_by(found=False).count()
+    except SQLAlchemyError:
+        db.session.rollback()
+        stats['entries'] = stats['negative_entries'] = 'N/A'
+    return stats
+
+def purge(expired_only=True):
+    """Delete cache entries (only those past their stale window by default)"""
+    query = MetadataCache.query
+    if expired_only:
+        cutoff = _utcnow() - timedelta(seconds=current_app.config.get('METADATA_CACHE_STALE_TTL', 0))
+        query = query.filter(MetadataCache.expires_at < cutoff)
+    deleted = query.delete(synchronize_session=False)
+    db.session.commit()
+    return deleted
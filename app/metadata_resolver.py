@@ -0,0 +1,137 @@
+"""
+Unified book metadata resolver for MyBibliotheca
+Merges OpenLibrary and Google Books into one record per ISBN, querying each
+provider at most once per operation and only when a wanted field is still missing
+"""
+
+from dataclasses import dataclass, field, fields as dataclass_fields
+from typing import Optional
+from flask import current_app
+from .utils import fetch_books_data, fetch_google_books_data
+
+# Batch fetchers by provider name: {isbn: data dict or None}, cached and rate limited
+PROVIDERS = {
+    'openlibrary': fetch_books_data,
+    'google_books': fetch_google_books_data,
+}
+
+DEFAULT_PRECEDENCE = 'default=openlibrary,google_books;cover=google_books,openlibrary;description=google_books,openlibrary'
+
+# Imports prefer the batched provider and only fall back for what it lacks
+OPENLIBRARY_FIRST = {'default': ['openlibrary', 'google_books']}
+GOOGLE_BOOKS_FIRST = {'default': ['google_books', 'openlibrary']}
+
+@dataclass
+class BookMetadata:
+    """Merged metadata for one ISBN; `sources` records which provider supplied each field"""
+    isbn: str
+    title: Optional[str] = None
+    author: Optional[str] = None
+    cover: Optional[str] = None
+    description: Optional[str] = None
+    published_date: Optional[str] = None
+    page_count: Optional[int] = None
+    categories: Optional[str] = None
+    publisher: Optional[str] = None
+    language: Optional[str] = None
+    average_rating: Optional[float] = None
+    rating_count: Optional[int] = None
+    sources: dict = field(default_factory=dict)
+    queried: list = field(default_factory=list)
+
+    @property
+    def found(self):
+        return bool(self.sources)
+
+    def to_dict(self):
+        """Legacy book data dict (as returned by fetch_book_data) plus provenance"""
+        data = {name: getattr(self, name) for name in FIELDS}
+        data['sources'] = dict(self.sources)
+        return data
+
+    def book_fields(self):
+        """Keyword arguments for the metadata columns of a Book"""
+        data = {name: getattr(self, name) for name in FIELDS if name not in ('title', 'author', 'cover')}
+        data['cover_url'] = self.cover
+        return data
+
+FIELDS = tuple(f.name for f in dataclass_fields(BookMetadata) if f.name not in ('isbn', 'sources', 'queried'))
+
+def _parse_precedence(value):
+    """'default=a,b;cover=b,a' -> {'default': ['a', 'b'], 'cover': ['b', 'a']}"""
+    if isinstance(value, dict):
+        return {key: list(order) for key, order in value.items()}
+    precedence = {}
+    for part in (value or '').split(';'):
+        if '=' in part:
+            key, order = part.split('=', 1)
+            precedence[key.strip()] = [name.strip() for name in order.split(',') if name.strip()]
+    return precedence
+
+def get_precedence(overrides=None):
+    """Per-field provider order from METADATA_PRECEDENCE, optionally replaced by overrides"""
+    if overrides is not None:
+        precedence = _parse_precedence(overrides)
+    else:
+        precedence = _parse_precedence(current_app.config.get('METADATA_PRECEDENCE', DEFAULT_PRECEDENCE))
+    default = [name for name in precedence.get('default', list(PROVIDERS)) if name in PROVIDERS]
+    return {
+        name: [provider for provider in precedence.get(name, default) if provider in PROVIDERS]
+        for name in FIELDS
+    }
+
+def _next_provider(field_name, order, records, wanted):
+    """The provider to ask next for a field, or None if it is settled"""
+    for provider in order:
+        if provider not in records:
+            return provider if field_name in wanted else None
+        if (records[provider] or {}).get(field_name):
+            return None
+    return None
+
+def resolve_many(isbns, fields=None, precedence=None):
+    """
+    Resolve metadata for many ISBNs; returns {isbn: BookMetadata}.
+
+    fields lists the fields worth an extra provider call (default: all); other
+    fields are filled from whatever was fetched anyway. precedence overrides
+    METADATA_PRECEDENCE, e.g. OPENLIBRARY_FIRST.
+    """
+    isbns = list(dict.fromkeys(isbn for isbn in isbns if isbn))
+    order = get_precedence(precedence)
+    wanted = set(fields or FIELDS)
+    records = {isbn: {} for isbn in isbns}  # isbn -> {provider: data or None}
+
+    # Each round asks every provider for the ISBNs that still need it, so a
+    # provider is queried at most once per ISBN
+    while True:
+        needed = {}
+        for isbn in isbns:
+            for name in FIELDS:
+                provider = _next_provider(name, order[name], records[isbn], wanted)
+                if provider:
+                    needed.setdefault(provider, set()).add(isbn)
+        if not needed:
+            break
+        for provider, pending in needed.items():
+            batch = [isbn for isbn in isbns if isbn in pending]
+            fetched = PROVIDERS[provider](batch)
+            for isbn in batch:
+                records[isbn][provider] = fetched.get(isbn)
+
+    results = {}
+    for isbn in isbns:
+        metadata = BookMetadata(isbn=isbn, queried=list(records[isbn]))
+        for name in FIELDS:
+            for provider in order[name]:
+                value = (records[isbn].get(provider) or {}).get(name)
+                if value:
+                    setattr(metadata, name, value)
+                    metadata.sources[name] = provider
+                    break
+        results[isbn] = metadata
+    return results
+
+def resolve(isbn, fields=None, precedence=None):
+    """Resolve metadata for one ISBN (see resolve_many)"""
+    return resolve_many([isbn], fields=fields, precedence=precedence).get(isbn) or BookMetadata(isbn=isbn)
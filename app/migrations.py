@@ -0,0 +1,262 @@
+"""
+Versioned schema migrations for MyBibliotheca
+The schema version is stored in a one-row schema_version table, so starting
+against a current database costs a single query. Pending migrations run in
+order, after a backup, under a file lock that lets only one worker process
+migrate at a time. Append to MIGRATIONS whenever tables, columns or indexes change.
+"""
+
+import os
+import tempfile
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from sqlalchemy import inspect, insert, select, text, update
+from sqlalchemy.exc import OperationalError, ProgrammingError
+from .models import db, User, SchemaVersion
+from .backups import create_backup, database_path
+
+try:
+    import fcntl
+except ImportError:  # Windows, where the app runs as a single process
+    fcntl = None
+
+def backup_database(db_path):
+    """Back up the database before migration (an online backup, see app/backups.py)"""
+    if not db_path or not os.path.exists(db_path):
+        return None
+
+    try:
+        backup_path = create_backup(db_path)
+        print(f"✅ Database backup created: {backup_path}")
+        return backup_path
+    except Exception as e:
+        print(f"⚠️  Failed to create database backup: {e}")
+        return None
+
+def run_security_privacy_migration(inspector, db_engine):
+    """Add security and privacy fields to user table"""
+    try:
+        columns = [column['name'] for column in inspector.get_columns('user')]
+
+        # Security and privacy fields to add
+        security_privacy_fields = [
+            ('failed_login_attempts', 'INTEGER DEFAULT 0'),
+            ('locked_until', 'DATETIME'),
+            ('last_login', 'DATETIME'),
+            ('share_current_reading', 'BOOLEAN DEFAULT 1'),
+            ('share_reading_activity', 'BOOLEAN DEFAULT 1'),
+            ('share_library', 'BOOLEAN DEFAULT 1'),
+            ('password_must_change', 'BOOLEAN DEFAULT 0'),
+            ('password_changed_at', 'DATETIME'),
+            ('reading_streak_offset', 'INTEGER DEFAULT 0')
+        ]
+
+        missing_fields = [field for field, _ in security_privacy_fields if field not in columns]
+        if missing_fields:
+            print(f"🔄 Adding security/privacy fields: {missing_fields}")
+            with db_engine.connect() as conn:
+                for field_name, field_def in security_privacy_fields:
+                    if field_name not in columns:
+                        conn.execute(text(f"ALTER TABLE user ADD COLUMN {field_name} {field_def}"))
+                conn.commit()
+            print("✅ Security/privacy migration completed.")
+
+    except Exception as e:
+        print(f"⚠️  Security/privacy migration failed: {e}")
+        raise
+
+def add_book_columns(inspector, engine):
+    """Add the multi-user and metadata columns to the book table"""
+    book_columns = [
+        ('user_id', 'INTEGER'),
+        ('description', 'TEXT'),
+        ('published_date', 'VARCHAR(50)'),
+        ('page_count', 'INTEGER'),
+        ('categories', 'VARCHAR(500)'),
+        ('publisher', 'VARCHAR(500)'),
+        ('language', 'VARCHAR(10)'),
+        ('average_rating', 'REAL'),
+        ('rating_count', 'INTEGER'),
+        ('created_at', 'DATETIME')
+    ]
+    try:
+        columns = [column['name'] for column in inspector.get_columns('book')]
+        missing_columns = [name for name, _ in book_columns if name not in columns]
+        if missing_columns:
+            print(f"🔄 Adding missing book columns: {missing_columns}")
+            with engine.begin() as conn:
+                for name, definition in book_columns:
+                    if name in missing_columns:
+                        conn.execute(text(f"ALTER TABLE book ADD COLUMN {name} {definition}"))
+            print("✅ Book schema migration completed.")
+    except Exception as e:
+        print(f"⚠️  Book schema migration failed: {e}")
+        raise
+
+def add_reading_log_columns(inspector, engine):
+    """Add user_id and created_at to the reading_log table"""
+    try:
+        columns = [column['name'] for column in inspector.get_columns('reading_log')]
+        missing_columns = [name for name in ('user_id', 'created_at') if name not in columns]
+        if missing_columns:
+            print(f"🔄 Adding missing reading_log columns: {missing_columns}")
+            with engine.begin() as conn:
+                if 'user_id' in missing_columns:
+                    conn.execute(text("ALTER TABLE reading_log ADD COLUMN user_id INTEGER"))
+                if 'created_at' in missing_columns:
+                    conn.execute(text("ALTER TABLE reading_log ADD COLUMN created_at DATETIME"))
+            print("✅ reading_log table updated.")
+    except Exception as e:
+        print(f"⚠️  Reading log migration failed: {e}")
+        raise
+
+def assign_orphaned_data_to_admin():
+    """Assign existing books and reading logs without user_id to the admin user"""
+    from .models import Book, ReadingLog
+    try:
+        admin_user = User.query.filter_by(is_admin=True).first()
+        if not admin_user:
+            return
+
+        books = Book.query.filter_by(user_id=None).update({'user_id': admin_user.id}, synchronize_session=False)
+        logs = ReadingLog.query.filter_by(user_id=None).update({'user_id': admin_user.id}, synchronize_session=False)
+        db.session.commit()
+        if books or logs:
+            print(f"✅ Assigned {books} orphaned books and {logs} reading logs to admin user: {admin_user.username}")
+
+    except Exception as e:
+        print(f"⚠️  Failed to assign orphaned data to admin: {e}")
+        db.session.rollback()
+        raise
+
+def upgrade_legacy_schema():
+    """
+    Bring databases from before the multi-user release up to its schema; every
+    step is idempotent and raises on failure, so a failed run is retried
+    """
+    inspector = inspect(db.engine)
+    existing_tables = inspector.get_table_names()
+    if 'user' not in existing_tables:
+        print("🔄 Adding user authentication tables...")
+        db.create_all()
+        print("✅ User tables created. Setup required on first visit.")
+    else:
+        run_security_privacy_migration(inspector, db.engine)
+    if 'book' in existing_tables:
+        add_book_columns(inspector, db.engine)
+    if 'reading_log' in existing_tables:
+        add_reading_log_columns(inspector, db.engine)
+    assign_orphaned_data_to_admin()
+
+def create_indexes(*names):
+    """Create the named indexes declared on the models, skipping those that exist"""
+    indexes = {index.name: index for table in db.metadata.sorted_tables for index in table.indexes}
+    for name in names:
+        indexes[name].create(db.engine, checkfirst=True)
+
+def create_auxiliary_tables():
+    """Create the cache, feed, task and stats tables and the indexes declared with them"""
+    db.create_all()
+    # create_all() only builds indexes along with new tables
+    create_indexes('ix_book_finish_date_id', 'ix_book_want_to_read_id', 'ix_reading_log_user_date',
+                   'ix_activity_event_feed', 'ix_activity_event_book', 'ix_activity_event_user',
+                   'ix_task_status', 'ix_stats_snapshot_taken_at')
+
+def backfill_derived_data():
+    """Build the facet index and activity feed for existing books and logs"""
+    from .facets import ensure_facets_built
+    from .activity import ensure_activity_feed_built
+    ensure_facets_built()
+    ensure_activity_feed_built()
+
+def add_query_indexes():
+    """Indexes for per-user shelves and stats, recent books and book reading logs"""
+    create_indexes('ix_book_user_finish_date', 'ix_book_user_want_to_read', 'ix_book_created_at',
+                   'ix_reading_log_book_date')
+
+def add_metadata_cache_indexes():
+    """Indexes for counting negative cache entries and purging expired ones"""
+    create_indexes('ix_metadata_cache_found', 'ix_metadata_cache_expires_at')
+
+# (version, description, migration); a database at version N has had 1..N applied.
+# Each version has its own step, which only builds what that version introduced
+MIGRATIONS = [
+    (1, 'multi-user, security and metadata columns', upgrade_legacy_schema),
+    (2, 'auxiliary tables and indexes', create_auxiliary_tables),
+    (3, 'facet index and activity feed backfill', backfill_derived_data),
+    (4, 'indexes for per-user and recent-book queries', add_query_indexes),
+    (5, 'metadata cache indexes', add_metadata_cache_indexes),
+]
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+def read_schema_version(engine):
+    """The stored schema version, or None for databases that predate versioning"""
+    try:
+        with engine.connect() as conn:
+            return conn.execute(select(SchemaVersion.version).where(SchemaVersion.id == 1)).scalar()
+    except (OperationalError, ProgrammingError):
+        return None
+
+def stamp_schema_version(engine, version):
+    values = {'version': version, 'applied_at': datetime.now(timezone.utc).replace(tzinfo=None)}
+    with engine.begin() as conn:
+        SchemaVersion.__table__.create(conn, checkfirst=True)
+        if conn.execute(update(SchemaVersion).where(SchemaVersion.id == 1).values(**values)).rowcount == 0:
+            conn.execute(insert(SchemaVersion).values(id=1, **values))
+
+@contextmanager
+def migration_lock(path):
+    """Hold an exclusive lock on `path` across processes (no-op without fcntl)"""
+    if fcntl is None:
+        yield
+        return
+    with open(path, 'a') as handle:
+        fcntl.flock(handle, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(handle, fcntl.LOCK_UN)
+
+def run_migrations():
+    """Bring the database up to SCHEMA_VERSION; a single query when it already is"""
+    engine = db.engine
+    version = read_schema_version(engine)
+    if version == SCHEMA_VERSION:
+        print(f"✅ Database schema is up-to-date (version {version})")
+        return version
+
+    db_path = database_path(engine)
+    lock_path = f"{db_path}.migrate.lock" if db_path else os.path.join(tempfile.gettempdir(), 'mybibliotheca-migrate.lock')
+    with migration_lock(lock_path):
+        # Another worker may have migrated while we waited for the lock
+        version = read_schema_version(engine)
+        if version is not None and version >= SCHEMA_VERSION:
+            if version > SCHEMA_VERSION:
+                print(f"⚠️  Database schema version {version} is newer than this release ({SCHEMA_VERSION})")
+            return version
+
+        # Only the app's own tables make a database legacy; leftovers such as the
+        # FTS index and its shadow tables (which drop_all() keeps) do not
+        if version is None and not set(inspect(engine).get_table_names()) & set(db.metadata.tables):
+            print("📚 Creating fresh database schema...")
+            db.create_all()
+            stamp_schema_version(engine, SCHEMA_VERSION)
+            print("✅ Database schema created. Setup required on first visit.")
+            return SCHEMA_VERSION
+
+        print("🔄 Creating database backup before migration...")
+        backup_database(db_path)
+        for number, description, migrate in MIGRATIONS:
+            if number <= (version or 0):
+                continue
+            print(f"🔄 Migration {number}: {description}...")
+            try:
+                migrate()
+            except Exception as e:
+                db.session.rollback()
+                print(f"⚠️  Migration {number} failed, will retry on next start: {e}")
+                return version
+            stamp_schema_version(engine, number)
+            version = number
+        print(f"🎉 Database migrated to schema version {version}")
+        return version
@@ -4,6 +4,8 @@ from flask_login import UserMixin
 from werkzeug.security import generate_password_hash, check_password_hash
 import secrets
 import re
+import json
+import uuid
 
 db = SQLAlchemy()
 
@@ -165,9 +167,16 @@ class Book(db.Model):
     rating_count = db.Column(db.Integer, nullable=True)
     created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
     
-    # Add unique constraint for ISBN per user
+    # Add unique constraint for ISBN per user; the public library pages by (finish_date, id) and id.
+    # Per-user shelves, stats and month reviews filter on finish_date or want_to_read;
+    # admin and stats pages count and list recent books by created_at
     __table_args__ = (
         db.UniqueConstraint('user_id', 'isbn', name='unique_user_isbn'),
+        db.Index('ix_book_finish_date_id', 'finish_date', 'id'),
+        db.Index('ix_book_want_to_read_id', 'want_to_read', 'id'),
+        db.Index('ix_book_user_finish_date', 'user_id', 'finish_date'),
+        db.Index('ix_book_user_want_to_read', 'user_id', 'want_to_read'),
+        db.Index('ix_book_created_at', 'created_at'),
     )
 
     def __init__(self, title, author, isbn, user_id, start_date=None, finish_date=None, cover_url=None, want_to_read=False, library_only=False, description=None, published_date=None, page_count=None, categories=None, publisher=None, language=None, average_rating=None, rating_count=None, **kwargs):
@@ -230,10 +239,210 @@ class ReadingLog(db.Model):
     book = db.relationship('Book', backref=db.backref('reading_logs', lazy=True))
     user = db.relationship('User', backref=db.backref('reading_logs', lazy=True))
     
-    # Ensure unique log per user per book per date
+    # Ensure unique log per user per book per date; streaks walk (user_id, date),
+    # log_reading and book pages look up (book_id, date)
     __table_args__ = (
         db.UniqueConstraint('user_id', 'book_id', 'date', name='unique_user_book_date'),
+        db.Index('ix_reading_log_user_date', 'user_id', 'date'),
+        db.Index('ix_reading_log_book_date', 'book_id', 'date'),
     )
     
     def __repr__(self):
-        return f'<ReadingLog {self.user_id}:{self.book_id} on {self.date}>'
\ No newline at end of file
+        return f'<ReadingLog {self.user_id}:{self.book_id} on {self.date}>'
+
+class MetadataCache(db.Model):
+    """Cached provider lookup for an ISBN, shared by every worker process"""
+    id = db.Column(db.Integer, primary_key=True)
+    provider = db.Column(db.String(32), nullable=False)
+    isbn = db.Column(db.String(20), nullable=False)
+    payload = db.Column(db.Text, nullable=True)  # JSON document, NULL for "not found"
+    found = db.Column(db.Boolean, nullable=False, default=True)
+    fetched_at = db.Column(db.DateTime, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False)
+
+    # One row per ISBN ever looked up: the admin counts negative entries, purge() filters by expiry
+    __table_args__ = (
+        db.UniqueConstraint('provider', 'isbn', name='unique_provider_isbn'),
+        db.Index('ix_metadata_cache_found', 'found'),
+        db.Index('ix_metadata_cache_expires_at', 'expires_at'),
+    )
+
+    def __repr__(self):
+        return f'<MetadataCache {self.provider}:{self.isbn}>'
+
+class CoverImage(db.Model):
+    """A downloaded cover, keyed by source URL; image files live content-addressed under COVER_STORE"""
+    id = db.Column(db.Integer, primary_key=True)
+    source_key = db.Column(db.String(64), nullable=False, unique=True)  # sha256 of source_url
+    source_url = db.Column(db.Text, nullable=False)
+    digest = db.Column(db.String(64), nullable=True)  # sha256 of the image bytes, NULL if the download failed
+    width = db.Column(db.Integer, nullable=True)
+    height = db.Column(db.Integer, nullable=True)
+    fetched_at = db.Column(db.DateTime, nullable=False)
+
+    def __repr__(self):
+        return f'<CoverImage {self.source_key[:12]} -> {(self.digest or "failed")[:12]}>'
+
+class BookFacet(db.Model):
+    """Per-user count of books with a category, publisher or language (maintained by app.facets)"""
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    facet = db.Column(db.String(20), nullable=False)  # 'category', 'publisher' or 'language'
+    value = db.Column(db.String(255), nullable=False)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'facet', 'value', name='unique_user_facet_value'),
+    )
+
+    def __repr__(self):
+        return f'<BookFacet {self.user_id}:{self.facet}={self.value} ({self.count})>'
+
+class ReadingStreak(db.Model):
+    """Per-user reading streak over distinct log dates (maintained by app.streaks)"""
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, unique=True)
+    current_length = db.Column(db.Integer, nullable=False, default=0)  # consecutive days ending at last_log_date
+    last_log_date = db.Column(db.Date, nullable=True)
+    longest_length = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, nullable=True)
+
+    user = db.relationship('User', backref=db.backref('reading_streak', uselist=False, lazy=True, cascade='all, delete-orphan'))
+
+    def __repr__(self):
+        return f'<ReadingStreak {self.user_id}: {self.current_length} to {self.last_log_date}>'
+
+
+class ActivityEvent(db.Model):
+    """
+    Community feed entry (maintained by app.activity). `visible` mirrors the owner's
+    sharing settings for the kind of event and is updated when those change.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    book_id = db.Column(db.Integer, db.ForeignKey('book.id'), nullable=False)
+    kind = db.Column(db.String(16), nullable=False)  # 'started', 'finished' or 'logged'
+    event_date = db.Column(db.Date, nullable=False)
+    created_at = db.Column(db.DateTime, nullable=True)
+    visible = db.Column(db.Boolean, nullable=False, default=True)
+
+    user = db.relationship('User')
+    book = db.relationship('Book')
+
+    # The feed reads newest-first per kind among visible events; retractions look up by book or user
+    __table_args__ = (
+        db.Index('ix_activity_event_feed', 'kind', 'visible', 'event_date', 'id'),
+        db.Index('ix_activity_event_book', 'book_id', 'kind'),
+        db.Index('ix_activity_event_user', 'user_id', 'kind'),
+    )
+
+    def __repr__(self):
+        return f'<ActivityEvent {self.kind} {self.book_id} on {self.event_date}>'
+
+
+class Task(db.Model):
+    """Background job (e.g. a CSV import) processed outside the request cycle"""
+    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    task_type = db.Column(db.String(50), nullable=False)
+    name = db.Column(db.String(255), nullable=False)
+    description = db.Column(db.String(500), nullable=True)
+    status = db.Column(db.String(20), nullable=False, default='pending', index=True)
+
+    # Progress, persisted as a checkpoint so a restarted worker can resume
+    total_items = db.Column(db.Integer, default=0)
+    processed_items = db.Column(db.Integer, default=0)
+    success_count = db.Column(db.Integer, default=0)
+    error_count = db.Column(db.Integer, default=0)
+    current_item = db.Column(db.String(255), nullable=True)
+    error_message = db.Column(db.Text, nullable=True)
+
+    payload = db.Column(db.Text, nullable=True)  # JSON input for the task handler
+    result_data = db.Column(db.Text, nullable=True)  # JSON result / collected errors
+    cancel_requested = db.Column(db.Boolean, default=False)
+
+    # Claim bookkeeping for the worker pool
+    worker_id = db.Column(db.String(100), nullable=True)
+    heartbeat_at = db.Column(db.DateTime, nullable=True)
+
+    created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+    started_at = db.Column(db.DateTime, nullable=True)
+    completed_at = db.Column(db.DateTime, nullable=True)
+
+    user = db.relationship('User', backref=db.backref('tasks', lazy=True, cascade='all, delete-orphan'))
+
+    @property
+    def payload_data(self):
+        return json.loads(self.payload) if self.payload else {}
+
+    @property
+    def result(self):
+        return json.loads(self.result_data) if self.result_data else {}
+
+    @result.setter
+    def result(self, value):
+        self.result_data = json.dumps(value) if value is not None else None
+
+    @property
+    def progress(self):
+        """Completion percentage (0-100) for progress bars"""
+        if self.total_items:
+            return min(100, int(self.processed_items * 100 / self.total_items))
+        return 100 if self.status == 'completed' else 0
+
+    @property
+    def is_finished(self):
+        return self.status in ('completed', 'failed', 'cancelled')
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'name': self.name,
+            'task_type': self.task_type,
+            'status': self.status,
+            'progress': self.progress,
+            'total_items': self.total_items,
+            'processed_items': self.processed_items,
+            'success_count': self.success_count,
+            'error_count': self.error_count,
+            'current_item': self.current_item,
+            'error_message': self.error_message,
+            'cancel_requested': self.cancel_requested,
+            'result': self.result,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'completed_at': self.completed_at.isoformat() if self.completed_at else None
+        }
+
+    def __repr__(self):
+        return f'<Task {self.id} {self.task_type} {self.status}>'
+
+class StatsSnapshot(db.Model):
+    """Point-in-time system counters behind the admin dashboard and its history charts"""
+    id = db.Column(db.Integer, primary_key=True)
+    taken_at = db.Column(db.DateTime, nullable=False, index=True)  # naive UTC
+    total_users = db.Column(db.Integer, nullable=False, default=0)
+    active_users = db.Column(db.Integer, nullable=False, default=0)
+    admin_users = db.Column(db.Integer, nullable=False, default=0)
+    total_books = db.Column(db.Integer, nullable=False, default=0)
+    reading_logs = db.Column(db.Integer, nullable=False, default=0)
+    new_users_30d = db.Column(db.Integer, nullable=False, default=0)
+    new_books_30d = db.Column(db.Integer, nullable=False, default=0)
+    metadata_entries = db.Column(db.Integer, nullable=False, default=0)
+    metadata_negative_entries = db.Column(db.Integer, nullable=False, default=0)
+    disk_percent = db.Column(db.Float, nullable=True)  # NULL when psutil is unavailable
+    memory_percent = db.Column(db.Float, nullable=True)
+    details = db.Column(db.Text, nullable=True)  # JSON: top users and the full system probe
+
+    def __repr__(self):
+        return f'<StatsSnapshot {self.taken_at}>'
+
+class SchemaVersion(db.Model):
+    """The single row recording which numbered migrations (app/migrations.py) have been applied"""
+    __tablename__ = 'schema_version'
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False)
+    applied_at = db.Column(db.DateTime, nullable=False)
+
+    def __repr__(self):
+        return f'<SchemaVersion {self.version}>'
@@ -0,0 +1,260 @@
+"""
+Shared page cache for MyBibliotheca
+Keeps rendered fragments and small results that look the same to every viewer
+(community activity, the public library) for PAGE_CACHE_TTL seconds in a
+per-process LRU, optionally backed by a SQLite file that all workers share.
+Committed changes to books, reading logs or sharing settings bump a generation
+number that is part of every key, so a change is visible on the next request;
+per-user namespaces (user_namespace) are bumped by changes to that user's data.
+"""
+
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from flask import current_app, has_app_context
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from .models import Book, ReadingLog, User
+
+NAMESPACES = ('community', 'public_library')
+
+# What a change to each model can alter
+MODEL_NAMESPACES = {
+    Book: ('community', 'public_library'),
+    ReadingLog: ('community',),
+    User: ('community', 'public_library'),
+}
+SHARING_COLUMNS = ('is_active', 'share_current_reading', 'share_reading_activity', 'share_library')
+
+def user_namespace(user_id):
+    """Namespace for one user's cached results, invalidated by changes to their books and logs"""
+    return f'user:{user_id}'
+
+def _owner_namespaces(obj):
+    """user_namespace() of every user obj belongs or belonged to in this flush"""
+    history = inspect(obj).attrs.user_id.history
+    owners = set(history.unchanged or ()) | set(history.added or ()) | set(history.deleted or ())
+    return {user_namespace(user_id) for user_id in owners if user_id is not None}
+
+class SharedStore:
+    """Entries and generation numbers in a SQLite file opened by every worker"""
+
+    def __init__(self, path, timeout=1.0):
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+        self._writes = 0
+        conn = self._connection()
+        conn.execute('CREATE TABLE IF NOT EXISTS page_cache_entry '
+                     '(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)')
+        conn.execute('CREATE TABLE IF NOT EXISTS page_cache_generation '
+                     '(namespace TEXT PRIMARY KEY, generation INTEGER NOT NULL)')
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            # Autocommit: every statement is its own short transaction
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def generation(self, namespace):
+        row = self._connection().execute(
+            'SELECT generation FROM page_cache_generation WHERE namespace = ?', (namespace,)).fetchone()
+        return row[0] if row else 0
+
+    def bump(self, namespace):
+        self._connection().execute(
+            'INSERT INTO page_cache_generation (namespace, generation) VALUES (?, 1) '
+            'ON CONFLICT(namespace) DO UPDATE SET generation = generation + 1', (namespace,))
+
+    def get(self, key):
+        row = self._connection().execute(
+            'SELECT value, expires_at FROM page_cache_entry WHERE key = ? AND expires_at > ?', (key, time.time())).fetchone()
+        return tuple(row) if row else None
+
+    def set(self, key, value, expires_at):
+        conn = self._connection()
+        conn.execute('INSERT OR REPLACE INTO page_cache_entry (key, value, expires_at) VALUES (?, ?, ?)',
+                     (key, value, expires_at))
+        self._writes += 1
+        if self._writes % 100 == 0:
+            conn.execute('DELETE FROM page_cache_entry WHERE expires_at <= ?', (time.time(),))
+
+    def clear(self):
+        self._connection().execute('DELETE FROM page_cache_entry')
+
+class PageCache:
+    """TTL + LRU cache with generation-based invalidation per namespace"""
+
+    def __init__(self, max_entries=256, ttl=60, shared=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.shared = shared
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._generations = {namespace: 0 for namespace in NAMESPACES}
+        self._filling = {}  # key -> lock held by the thread producing it
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'shared_hits': 0, 'misses': 0, 'invalidations': 0, 'errors': 0}
+
+    def _count(self, counter):
+        with self._lock:
+            self.stats[counter] += 1
+
+    def _shared_call(self, method, *args, default=None):
+        """Call the shared store, degrading to the local cache if it fails"""
+        if self.shared is None:
+            return default
+        try:
+            return getattr(self.shared, method)(*args)
+        except sqlite3.Error as e:
+            self._count('errors')
+            current_app.logger.warning(f"Shared page cache unavailable: {e}")
+            return default
+
+    def generation(self, namespace):
+        with self._lock:
+            local = self._generations.get(namespace, 0)
+        return self._shared_call('generation', namespace, default=local)
+
+    def _get_local(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def _set_local(self, key, value, expires_at):
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_or_set(self, namespace, key, produce, ttl=None):
+        """The cached value for (namespace, key), calling produce() on a miss"""
+        full_key = f'{namespace}:{self.generation(namespace)}:{key}'
+        entry = self._get_local(full_key)
+        if entry is not None:
+            self._count('hits')
+            return entry[1]
+
+        # One producer per key in this process; concurrent requests wait for its result
+        with self._lock:
+            fill_lock = self._filling.setdefault(full_key, threading.Lock())
+        try:
+            with fill_lock:
+                entry = self._get_local(full_key)
+                if entry is not None:
+                    self._count('hits')
+                    return entry[1]
+                stored = self._shared_call('get', full_key)
+                if stored is not None:
+                    self._count('shared_hits')
+                    value = json.loads(stored[0])
+                    self._set_local(full_key, value, stored[1])
+                    return value
+
+                self._count('misses')
+                value = produce()
+                expires_at = time.time() + (ttl or self.ttl)
+                self._set_local(full_key, value, expires_at)
+                self._shared_call('set', full_key, json.dumps(value), expires_at)
+                return value
+        finally:
+            with self._lock:
+                self._filling.pop(full_key, None)
+
+    def invalidate(self, *namespaces):
+        with self._lock:
+            for namespace in namespaces:
+                self._generations[namespace] = self._generations.get(namespace, 0) + 1
+                self.stats['invalidations'] += 1
+            prefixes = tuple(f'{namespace}:' for namespace in namespaces)
+            for key in [key for key in self._entries if key.startswith(prefixes)]:
+                del self._entries[key]
+        for namespace in namespaces:
+            self._shared_call('bump', namespace)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        self._shared_call('clear')
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats['entries'] = len(self._entries)
+        lookups = stats['hits'] + stats['shared_hits'] + stats['misses']
+        stats['hit_rate'] = round((lookups - stats['misses']) / lookups, 3) if lookups else None
+        stats['shared'] = self.shared.path if self.shared is not None else None
+        return stats
+
+def _cache():
+    return current_app.extensions.get('page_cache') if has_app_context() else None
+
+def cached(namespace, key, produce, ttl=None):
+    """produce() (JSON-serializable) cached under namespace/key; uncached if the cache is off"""
+    cache = _cache()
+    if cache is None:
+        return produce()
+    return cache.get_or_set(namespace, key, produce, ttl)
+
+def invalidate(*namespaces):
+    cache = _cache()
+    if cache is not None:
+        cache.invalidate(*(namespaces or NAMESPACES))
+
+def get_page_cache_stats():
+    cache = _cache()
+    return cache.get_stats() if cache is not None else {'enabled': False}
+
+@event.listens_for(Session, 'before_flush')
+def _collect_page_changes(session, flush_context, instances):
+    touched = session.info.setdefault('page_cache_namespaces', set())
+    for obj in list(session.new) + list(session.deleted):
+        touched.update(MODEL_NAMESPACES.get(type(obj), ()))
+        if isinstance(obj, (Book, ReadingLog)):
+            touched.update(_owner_namespaces(obj))
+    for obj in session.dirty:
+        if isinstance(obj, User):
+            # Only sharing settings change what others see of a user
+            if any(inspect(obj).attrs[column].history.has_changes() for column in SHARING_COLUMNS):
+                touched.update(MODEL_NAMESPACES[User])
+        elif type(obj) in MODEL_NAMESPACES and session.is_modified(obj):
+            touched.update(MODEL_NAMESPACES[type(obj)])
+            touched.update(_owner_namespaces(obj))
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_committed(session):
+    touched = session.info.pop('page_cache_namespaces', None)
+    if touched:
+        invalidate(*touched)
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _discard_page_changes(session, previous_transaction):
+    session.info.pop('page_cache_namespaces', None)
+
+def init_page_cache(app):
+    if not app.config.get('PAGE_CACHE_ENABLED', True):
+        return
+    shared = None
+    path = app.config.get('PAGE_CACHE_SHARED_PATH')
+    if path:
+        try:
+            shared = SharedStore(path)
+        except sqlite3.Error as e:
+            print(f"⚠️  Shared page cache unavailable, using per-process cache only: {e}")
+    app.extensions['page_cache'] = PageCache(
+        max_entries=app.config.get('PAGE_CACHE_SIZE', 256),
+        ttl=app.config.get('PAGE_CACHE_TTL', 60),
+        shared=shared
+    )
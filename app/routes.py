@@ -1,15 +1,28 @@
-from flask import Blueprint, current_app, render_template, request, redirect, url_for, jsonify, flash, send_file
+from flask import Blueprint, current_app, render_template, request, redirect, url_for, jsonify, flash, send_file, abort
+from markupsafe import Markup
 from flask_login import login_required, current_user
-from .models import Book, db, ReadingLog, User
-from .utils import fetch_book_data, get_reading_streak, get_google_books_cover, generate_month_review_image
+from .models import Book, db, ReadingLog, User, Task, ActivityEvent
+from sqlalchemy import func, case, and_
+from .utils import get_reading_streak, render_month_review
+from .metadata_resolver import resolve, GOOGLE_BOOKS_FIRST
+from .library import paginate_books, paginate_public_library, library_stats, filter_options
+from .search import book_search
+from .streaks import compute_streaks, NO_STREAK
+from .activity import feed_page, feed_counts
+from .page_cache import cached
+from .user_stats import get_user_stats, profile_books
+from .tasks import enqueue_task, request_cancel
+from .importers import save_upload
+from .backups import BACKUP_EXTENSIONS, available_compressions, database_path, snapshot_for_download, stream_file
+from .throttle import provider_slot
+from .http_client import http_get
+from .covers import COVER_SIZES, request_cover, ensure_thumbnail, cover_src, is_http_url
 from datetime import datetime, date, timedelta
 import secrets
-import requests
 from io import BytesIO
 import pytz
 import csv # Ensure csv is imported
 import calendar
-from sqlalchemy import or_
 
 bp = Blueprint('main', __name__)
 
@@ -40,14 +53,12 @@ def reading_history():
 
 @bp.route('/fetch_book/<isbn>', methods=['GET'])
 def fetch_book(isbn):
-    book_data = fetch_book_data(isbn) or {}
-    google_cover = get_google_books_cover(isbn)
-    if google_cover:
-        book_data['cover'] = google_cover
+    metadata = resolve(isbn)
+    book_data = metadata.to_dict()
     # If neither source provides a cover, set a default
     if not book_data.get('cover'):
         book_data['cover'] = url_for('static', filename='bookshelf.png')
-    return jsonify(book_data), 200 if book_data else 404
+    return jsonify(book_data), 200 if metadata.found else 404
 
 @bp.route('/')
 @login_required
@@ -59,81 +70,55 @@ def index():
     language = request.args.get('language', '').strip()
     
     # Start with all user's books
-    query = Book.query.filter_by(user_id=current_user.id)
-    
-    # Apply search filter
-    if search:
-        search_filter = or_(
-            Book.title.ilike(f'%{search}%'),
-            Book.author.ilike(f'%{search}%'),
-            Book.description.ilike(f'%{search}%'),
-            Book.categories.ilike(f'%{search}%'),
-            Book.publisher.ilike(f'%{search}%')
-        )
-        query = query.filter(search_filter)
+    criteria = [Book.user_id == current_user.id]
     
     # Apply category filter
     if category:
-        query = query.filter(Book.categories.ilike(f'%{category}%'))
+        criteria.append(Book.categories.ilike(f'%{category}%'))
     
     # Apply publisher filter
     if publisher:
-        query = query.filter(Book.publisher == publisher)
+        criteria.append(Book.publisher == publisher)
     
     # Apply language filter
     if language:
-        query = query.filter(Book.language == language)
-    
-    # Get filtered books
-    all_filtered_books = query.all()
-    
-    # Sort books by reading status priority
-    def get_sort_priority(book):
-        # Currently Reading = 1 (highest priority)
-        if not book.finish_date and not book.want_to_read and not book.library_only:
-            return 1
-        # Want to Read = 2
-        elif book.want_to_read:
-            return 2
-        # Finished = 3
-        elif book.finish_date:
-            return 3
-        # Library Only = 4 (lowest priority)
-        else:
-            return 4
-    
-    # Sort by priority first, then by title
-    books = sorted(all_filtered_books, key=lambda book: (get_sort_priority(book), book.title.lower()))
-    
-    # Get all books for filter options (unfiltered)
-    all_books = Book.query.filter_by(user_id=current_user.id).all()
-    
-    # Extract unique values for filters
-    categories = sorted(set([
-        cat.strip() for book in all_books 
-        if book.categories 
-        for cat in book.categories.split(',')
-    ]))
-    
-    publishers = sorted(set([
-        book.publisher for book in all_books 
-        if book.publisher and book.publisher.strip()
-    ]))
-    
-    languages = sorted(set([
-        book.language for book in all_books 
-        if book.language and book.language.strip()
-    ]))
-    
+        criteria.append(Book.language == language)
+    
+    return render_library_page(criteria,
+                               search=book_search(search),
+                               current_search=search,
+                               current_category=category,
+                               current_publisher=publisher,
+                               current_language=language)
+
+def render_library_page(criteria, search=None, **context):
+    """
+    Render library.html for one keyset page of the books matching criteria
+    (sorted by reading status, then title, in SQL; by relevance when searching)
+    """
+    page_size = max(1, current_app.config.get('LIBRARY_PAGE_SIZE', 48))
+    page = paginate_books(criteria, page_size,
+                          after=request.args.get('after'),
+                          before=request.args.get('before'),
+                          search=search)
+
+    def page_url(**cursor):
+        args = {key: value for key, value in request.args.items() if key not in ('after', 'before') and value}
+        args.update(cursor)
+        return url_for(request.endpoint, **args)
+
+    categories, publishers, languages = filter_options(current_user.id)
     return render_template('library.html',
-                         books=books,
+                         books=page.books,
+                         page=page,
+                         stats=library_stats(criteria + ([search.criterion()] if search else [])),
+                         next_url=page_url(after=page.next_cursor) if page.has_next else None,
+                         prev_url=page_url(before=page.prev_cursor) if page.has_prev else None,
+                         first_url=page_url() if page.has_prev else None,
                          categories=categories,
                          publishers=publishers,
                          languages=languages,
-                         current_search=search,
-                         current_category=category,
-                         current_publisher=publisher,
-                         current_language=language)
+                         **context)
 
 @bp.route('/add', methods=['GET', 'POST'])
 @login_required
@@ -147,14 +132,11 @@ def add_book():
                 flash('Error: ISBN is required to fetch book data.', 'danger')
                 return render_template('add_book.html', book_data=None)
 
-            book_data = fetch_book_data(isbn)
-            if not book_data:
+            metadata = resolve(isbn)
+            if not metadata.found:
                 flash('No book data found for the provided ISBN.', 'warning')
             else:
-                # Overwrite cover with Google Books if available
-                google_cover = get_google_books_cover(isbn)
-                if google_cover:
-                    book_data['cover'] = google_cover
+                book_data = metadata.to_dict()
 
             # Re-render the form with fetched data
             return render_template('add_book.html', book_data=book_data)
@@ -180,36 +162,12 @@ def add_book():
             want_to_read = 'want_to_read' in request.form
             library_only = 'library_only' in request.form
 
-            cover_url = get_google_books_cover(isbn)
-
-            # Get additional metadata from Google Books API first, then fallback to OpenLibrary
-            google_data = get_google_books_cover(isbn, fetch_title_author=True)
-            if google_data:
-                description = google_data.get('description')
-                published_date = google_data.get('published_date')
-                page_count = google_data.get('page_count')
-                categories = google_data.get('categories')
-                publisher = google_data.get('publisher')
-                language = google_data.get('language')
-                average_rating = google_data.get('average_rating')
-                rating_count = google_data.get('rating_count')
-            else:
-                # Fallback to OpenLibrary data
-                ol_data = fetch_book_data(isbn)
-                if ol_data:
-                    description = ol_data.get('description')
-                    published_date = ol_data.get('published_date')
-                    page_count = ol_data.get('page_count')
-                    categories = ol_data.get('categories')
-                    publisher = ol_data.get('publisher')
-                    language = ol_data.get('language')
-                    average_rating = None
-                    rating_count = None
-                else:
-                    description = published_date = page_count = categories = publisher = language = average_rating = rating_count = None
+            # One merged lookup for cover and metadata (each provider asked at most once)
+            metadata = resolve(isbn)
+            cover_url = metadata.cover
 
             if not cover_url:
-                flash('Warning: No cover image found on Google Books for this ISBN. A default image will be used. A manual cover URL can be added in the "edit book" section.', 'warning')
+                flash('Warning: No cover image found for this ISBN. A default image will be used. A manual cover URL can be added in the "edit book" section.', 'warning')
 
             book = Book(
                 title=title,
@@ -218,17 +176,9 @@ def add_book():
                 user_id=current_user.id,  # Add user_id for multi-user support
                 start_date=start_date,
                 finish_date=finish_date,
-                cover_url=cover_url,
                 want_to_read=want_to_read,
                 library_only=library_only,
-                description=description,
-                published_date=published_date,
-                page_count=page_count,
-                categories=categories,
-                publisher=publisher,
-                language=language,
-                average_rating=average_rating,
-                rating_count=rating_count
+                **metadata.book_fields()
             )
             book.save()
             flash(f'Book "{title}" added successfully.', 'success')
@@ -282,7 +232,9 @@ def log_reading(uid):
 @login_required
 def delete_book(uid):
     book = Book.query.filter_by(uid=uid, user_id=current_user.id).first_or_404()
-    ReadingLog.query.filter_by(book_id=book.id).delete()
+    # Delete logs through the ORM so the materialized reading streak follows
+    for log in ReadingLog.query.filter_by(book_id=book.id):
+        db.session.delete(log)
     db.session.delete(book)
     db.session.commit()
     flash('Book deleted successfully.')
@@ -364,11 +316,12 @@ def search_books():
     if request.method == 'POST':
         query = request.form.get('query', '')
         if query:
-            # Google Books API search
-            resp = requests.get(
-                'https://www.googleapis.com/books/v1/volumes',
-                params={'q': query, 'maxResults': 10}
-            )
+            # Google Books API search (shares the provider's concurrency and rate limits)
+            with provider_slot('google_books'):
+                resp = http_get(
+                    current_app.config.get('GOOGLE_BOOKS_API_URL', 'https://www.googleapis.com/books/v1/volumes'),
+                    params={'q': query, 'maxResults': 10}
+                )
             data = resp.json()
             for item in data.get('items', []):
                 volume_info = item.get('volumeInfo', {})
@@ -396,47 +349,22 @@ def library():
     search_query = request.args.get('search', '')
 
     # Start with books belonging to current user
-    books_query = Book.query.filter_by(user_id=current_user.id)
+    criteria = [Book.user_id == current_user.id]
 
     # Apply additional filters
     if category_filter:
-        books_query = books_query.filter(Book.categories.contains(category_filter))
+        criteria.append(Book.categories.contains(category_filter))
     if publisher_filter:
-        books_query = books_query.filter(Book.publisher.ilike(f'%{publisher_filter}%'))
+        criteria.append(Book.publisher.ilike(f'%{publisher_filter}%'))
     if language_filter:
-        books_query = books_query.filter(Book.language == language_filter)
-    if search_query:
-        books_query = books_query.filter(
-            (Book.title.ilike(f'%{search_query}%')) |
-            (Book.author.ilike(f'%{search_query}%')) |
-            (Book.description.ilike(f'%{search_query}%'))
-        )
-
-    books = books_query.all()
-
-    # Get distinct values for filter dropdowns
-    all_books = Book.query.filter_by(user_id=current_user.id).all()
-    categories = set()
-    publishers = set()
-    languages = set()
-
-    for book in all_books:
-        if book.categories:
-            categories.update([cat.strip() for cat in book.categories.split(',')])
-        if book.publisher:
-            publishers.add(book.publisher)
-        if book.language:
-            languages.add(book.language)
+        criteria.append(Book.language == language_filter)
 
     # Fetch all users for assignment
     users = User.query.all()
 
-    return render_template(
-        'library.html',
-        books=books,
-        categories=sorted(categories),
-        publishers=sorted(publishers),
-        languages=sorted(languages),
+    return render_library_page(
+        criteria,
+        search=book_search(search_query),
         current_category=category_filter,
         current_publisher=publisher_filter,
         current_language=language_filter,
@@ -444,24 +372,55 @@ def library():
         users=users  # Pass users to the template
     )
 
+def public_library_params():
+    filter_status = request.args.get('filter', 'all')
+    if filter_status not in ('all', 'currently_reading', 'want_to_read'):
+        filter_status = 'all'
+    return filter_status, request.args.get('after') or None
+
+def public_library_page(filter_status, after):
+    return paginate_public_library(filter_status, current_app.config.get('PUBLIC_LIBRARY_PAGE_SIZE', 48), after)
+
+def public_book_json(book):
+    return {
+        'uid': book.uid,
+        'title': book.title,
+        'author': book.author,
+        'isbn': book.isbn,
+        'cover': cover_src(book, 'small'),
+        'want_to_read': bool(book.want_to_read),
+        'currently_reading': not book.finish_date and not book.want_to_read and not book.library_only,
+        'finished': book.finish_date is not None,
+        'library_only': bool(book.library_only),
+    }
+
 @bp.route('/public-library')
 def public_library():
-    filter_status = request.args.get('filter', 'all')
-    books_query = Book.query
-    
-    if filter_status == 'currently_reading':
-        books_query = books_query.filter(
-            Book.finish_date.is_(None),
-            Book.want_to_read.isnot(True),  # Handle NULL and False
-            Book.library_only.isnot(True)  # Handle NULL and False
-        )
-    elif filter_status == 'want_to_read':
-        books_query = books_query.filter(Book.want_to_read.is_(True))
-    else:  # Default "Show All" case
-        books_query = books_query.order_by(Book.finish_date.desc().nullslast(), Book.id.desc())
-    
-    books = books_query.all()
-    return render_template('public_library.html', books=books, filter_status=filter_status)
+    filter_status, after = public_library_params()
+
+    def render():
+        page = public_library_page(filter_status, after)
+        return render_template('public_library_shelf.html', books=page.books, filter_status=filter_status,
+                               next_cursor=page.next_cursor)
+
+    # The shelf is the same for every visitor; only the page around it is rendered per request
+    shelf = cached('public_library', f'shelf:{filter_status}:{after or ""}', render)
+    return render_template('public_library.html', shelf=Markup(shelf), filter_status=filter_status)
+
+@bp.route('/public-library.json')
+def public_library_json():
+    """One page of the public library as JSON, for loading more books in place"""
+    filter_status, after = public_library_params()
+
+    def load():
+        page = public_library_page(filter_status, after)
+        return {
+            'books': [public_book_json(book) for book in page.books],
+            'next_cursor': page.next_cursor,
+            'next_url': url_for('main.public_library_json', filter=filter_status, after=page.next_cursor) if page.next_cursor else None,
+        }
+
+    return jsonify(cached('public_library', f'json:{filter_status}:{after or ""}', load))
 
 @bp.route('/book/<uid>/edit', methods=['GET', 'POST'])
 @login_required
@@ -477,6 +436,9 @@ def edit_book(uid):
         book.author = request.form['author']
         book.isbn = new_isbn
         cover_url = request.form.get('cover_url', '').strip()
+        if cover_url and not is_http_url(cover_url):
+            flash('The cover URL must start with http:// or https://.', 'danger')
+            return render_template('edit_book.html', book=book)
         book.cover_url = cover_url if cover_url else None
         
         # Update new metadata fields
@@ -510,12 +472,47 @@ def month_review(year, month):
         # This should only be accessed if there are books (from month_wrapup)
         return "No books found", 404
 
-    img = generate_month_review_image(books, month, year)
-    buf = BytesIO()
-    img.save(buf, format='JPEG')
-    buf.seek(0)
+    buf = BytesIO(render_month_review(current_user.id, books, month, year))
     return send_file(buf, mimetype='image/jpeg', as_attachment=True, download_name=f"month_review_{year}_{month}.jpg")
 
+def book_is_public(book):
+    """Whether the book is on the public library shelf"""
+    return bool(book.user.is_active and book.user.share_library)
+
+def cover_visible(book):
+    """
+    Whether the visitor may see this book's cover: its owner always, anyone when
+    the book is in the public library, signed-in readers when it is in the community feed
+    """
+    if current_user.is_authenticated and book.user_id == current_user.id:
+        return True
+    if book_is_public(book):
+        return True
+    return current_user.is_authenticated and db.session.query(
+        ActivityEvent.query.filter_by(book_id=book.id, visible=True).exists()).scalar()
+
+@bp.route('/book/<uid>/cover/<size>.jpg')
+def book_cover(uid, size):
+    """A book's cover from the local store; the placeholder until a background download stores it"""
+    if size not in COVER_SIZES:
+        abort(404)
+    book = Book.query.filter_by(uid=uid).first_or_404()
+    if not cover_visible(book):
+        abort(404)
+    record = request_cover(book.cover_url) if book.cover_url else None
+    path = ensure_thumbnail(record.digest, size) if record is not None else None
+    if path is None:
+        # Not stored (yet, or the download failed); never send the browser to the raw URL
+        return redirect(url_for('static', filename='bookshelf.png'))
+    response = send_file(path, mimetype='image/jpeg', etag=f'{record.digest}-{size}',
+                         conditional=True, max_age=current_app.config.get('COVER_CACHE_MAX_AGE', 86400 * 365))
+    # Only covers from the public library may be kept by shared caches
+    public = book_is_public(book)
+    response.cache_control.public = public
+    response.cache_control.private = not public
+    response.cache_control.immutable = True
+    return response
+
 @bp.route('/month_wrapup')
 @login_required
 def month_wrapup():
@@ -553,43 +550,24 @@ def add_book_from_search():
     author = request.form.get('author')
     isbn = request.form.get('isbn')
     cover_url = request.form.get('cover_url')
+    if cover_url and not is_http_url(cover_url):
+        cover_url = None
 
     # Prevent duplicate ISBNs
     if isbn and Book.query.filter_by(isbn=isbn, user_id=current_user.id).first():
         flash('A book with this ISBN already exists.', 'danger')
         return redirect(url_for('main.search_books'))
 
-    # Get additional metadata if available
-    if isbn:
-        google_data = get_google_books_cover(isbn, fetch_title_author=True)
-        if google_data:
-            description = google_data.get('description')
-            published_date = google_data.get('published_date')
-            page_count = google_data.get('page_count')
-            categories = google_data.get('categories')
-            publisher = google_data.get('publisher')
-            language = google_data.get('language')
-            average_rating = google_data.get('average_rating')
-            rating_count = google_data.get('rating_count')
-        else:
-            description = published_date = page_count = categories = publisher = language = average_rating = rating_count = None
-    else:
-        description = published_date = page_count = categories = publisher = language = average_rating = rating_count = None
+    # Search results come from Google Books; OpenLibrary is only asked for a missing description
+    metadata_fields = resolve(isbn, fields=('description',), precedence=GOOGLE_BOOKS_FIRST).book_fields() if isbn else {}
+    metadata_fields['cover_url'] = cover_url or metadata_fields.get('cover_url')
 
     book = Book(
         title=title,
         author=author,
         isbn=isbn,
         user_id=current_user.id,  # Add user_id for multi-user support
-        cover_url=cover_url,
-        description=description,
-        published_date=published_date,
-        page_count=page_count,
-        categories=categories,
-        publisher=publisher,
-        language=language,
-        average_rating=average_rating,
-        rating_count=rating_count
+        **metadata_fields
     )
     book.save()
     flash(f'Added "{title}" to your library.', 'success')
@@ -603,93 +581,36 @@ def import_goodreads():
         flash('Please upload a valid Goodreads CSV file.', 'danger')
         return redirect(url_for('main.add_book'))
 
-    stream = file.stream.read().decode('utf-8').splitlines()
-    reader = csv.DictReader(stream)
-    imported = 0
-    for row in reader:
-        title = row.get('Title')
-        author = row.get('Author')
-        # Goodreads CSV sometimes has ISBN/ISBN13 as ='978...'
-        def clean_isbn(val):
-            if not val:
-                return ""
-            val = val.strip()
-            if val.startswith('="') and val.endswith('"'):
-                val = val[2:-1]
-            return val.strip()
-        isbn = clean_isbn(row.get('ISBN13')) or clean_isbn(row.get('ISBN'))
-        date_read = row.get('Date Read')
-        want_to_read = 'to-read' in (row.get('Bookshelves') or '')
-        finish_date = None
-        if date_read:
-            try:
-                finish_date = datetime.strptime(date_read, "%Y/%m/%d").date()
-            except Exception:
-                pass
-        # Skip books with missing or blank ISBN
-        if not title or not author or not isbn or isbn == "":
-            continue
-        if not Book.query.filter_by(isbn=isbn, user_id=current_user.id).first():
-            # Try Google Books first for comprehensive metadata
-            google_data = get_google_books_cover(isbn, fetch_title_author=True)
-            if google_data:
-                cover_url = google_data.get('cover')
-                description = google_data.get('description')
-                published_date = google_data.get('published_date')
-                page_count = google_data.get('page_count')
-                categories = google_data.get('categories')
-                publisher = google_data.get('publisher')
-                language = google_data.get('language')
-                average_rating = google_data.get('average_rating')
-                rating_count = google_data.get('rating_count')
-            else:
-                # Fallback to OpenLibrary if Google Books fails
-                book_data = fetch_book_data(isbn)
-                if book_data:
-                    cover_url = book_data.get('cover')
-                    description = book_data.get('description')
-                    published_date = book_data.get('published_date')
-                    page_count = book_data.get('page_count')
-                    categories = book_data.get('categories')
-                    publisher = book_data.get('publisher')
-                    language = book_data.get('language')
-                    average_rating = rating_count = None
-                else:
-                    cover_url = url_for('static', filename='bookshelf.png')
-                    description = published_date = page_count = categories = publisher = language = average_rating = rating_count = None
-            
-            book = Book(
-                title=title,
-                author=author,
-                isbn=isbn,
-                user_id=current_user.id,  # Add user_id for multi-user support
-                finish_date=finish_date,
-                want_to_read=want_to_read,
-                cover_url=cover_url,
-                description=description,
-                published_date=published_date,
-                page_count=page_count,
-                categories=categories,
-                publisher=publisher,
-                language=language,
-                average_rating=average_rating,
-                rating_count=rating_count
-            )
-            db.session.add(book)
-            imported += 1
-    db.session.commit()
-    flash(f'Imported {imported} books from Goodreads.', 'success')
-    return redirect(url_for('main.add_book'))
+    path = save_upload(file)
+    task_id = enqueue_task(
+        'goodreads_import',
+        current_user.id,
+        name='Goodreads Import',
+        description=f'Importing {file.filename}',
+        payload={'path': path, 'default_cover': url_for('static', filename='bookshelf.png')}
+    )
+    flash('Goodreads import started. You can follow its progress here.', 'info')
+    return redirect(url_for('main.task_status', task_id=task_id))
 
 @bp.route('/download_db', methods=['GET'])
 @login_required
 def download_db():
-    db_path = current_app.config.get('SQLALCHEMY_DATABASE_URI').replace('sqlite:///', '')
-    return send_file(
-        db_path,
-        as_attachment=True,
-        download_name='books.db',
-        mimetype='application/octet-stream'
+    """
+    Stream a consistent snapshot: the whole database for admins, only the user's own
+    account, books and reading logs otherwise; ?compress=gzip compresses on the fly
+    """
+    if database_path() is None:
+        flash('Database download is only available for SQLite databases.', 'warning')
+        return redirect(url_for('main.index'))
+    compression = request.args.get('compress', 'none')
+    if compression not in available_compressions():
+        abort(400)
+    path = snapshot_for_download(current_user)
+    download_name = ('books.db' if current_user.is_admin else 'my_books.db') + BACKUP_EXTENSIONS[compression]
+    return current_app.response_class(
+        stream_file(path, compression, delete=True),
+        mimetype='application/octet-stream',
+        headers={'Content-Disposition': f'attachment; filename="{download_name}"'}
     )
 
 @bp.route('/bulk_import', methods=['GET', 'POST'])
@@ -705,91 +626,16 @@ def bulk_import():
             return redirect(request.url)
         if file and file.filename.endswith('.csv'):
             try:
-                # Read CSV file
-                csv_file = csv.reader(file.stream.read().decode("utf-8").splitlines())
-                default_status = request.form.get('default_status', 'library_only')
-                imported_count = 0
-                failed_count = 0
-                failed_isbns = []
-
-                for row in csv_file:
-                    if not row:  # Skip empty rows
-                        continue
-                    isbn = row[0].strip()
-                    if not isbn: # Skip rows with empty ISBN
-                        continue
-
-                    # Check if book already exists
-                    if Book.get_book_by_isbn(isbn):
-                        failed_count += 1
-                        failed_isbns.append(f"{isbn} (already exists)")
-                        continue
-
-                    book_data = fetch_book_data(isbn)
-                    if not book_data:
-                        google_book_data = get_google_books_cover(isbn, fetch_title_author=True)
-                        if google_book_data and google_book_data.get('title') and google_book_data.get('author'):
-                            book_data = google_book_data
-                        else:
-                            failed_count += 1
-                            failed_isbns.append(f"{isbn} (data not found)")
-                            continue
-                    else:
-                        # Enhance OpenLibrary data with Google Books data
-                        google_data = get_google_books_cover(isbn, fetch_title_author=True)
-                        if google_data:
-                            for key, value in google_data.items():
-                                if value and not book_data.get(key):
-                                    book_data[key] = value
-                    
-                    title = book_data.get('title')
-                    author = book_data.get('author')
-                    cover_url = book_data.get('cover') or get_google_books_cover(isbn)
-                    description = book_data.get('description')
-                    published_date = book_data.get('published_date')
-                    page_count = book_data.get('page_count')
-                    categories = book_data.get('categories')
-                    publisher = book_data.get('publisher')
-                    language = book_data.get('language')
-                    average_rating = book_data.get('average_rating')
-                    rating_count = book_data.get('rating_count')
-
-
-                    if not title or not author:
-                        failed_count += 1
-                        failed_isbns.append(f"{isbn} (missing title/author)")
-                        continue
-
-                    want_to_read = default_status == 'want_to_read'
-                    library_only = default_status == 'library_only'
-                    start_date = date.today() if default_status == 'reading' else None
-
-                    new_book = Book(
-                        title=title,
-                        author=author,
-                        isbn=isbn,
-                        user_id=current_user.id,  # Add user_id for multi-user support
-                        cover_url=cover_url,
-                        want_to_read=want_to_read,
-                        library_only=library_only,
-                        start_date=start_date,
-                        description=description,
-                        published_date=published_date,
-                        page_count=page_count,
-                        categories=categories,
-                        publisher=publisher,
-                        language=language,
-                        average_rating=average_rating,
-                        rating_count=rating_count
-                    )
-                    new_book.save()
-                    imported_count += 1
-
-                if imported_count > 0:
-                    flash(f'Successfully imported {imported_count} books.', 'success')
-                if failed_count > 0:
-                    flash(f'Failed to import {failed_count} books: {", ".join(failed_isbns)}', 'danger')
-                return redirect(url_for('main.index'))
+                path = save_upload(file)
+                task_id = enqueue_task(
+                    'bulk_import',
+                    current_user.id,
+                    name='Bulk Import',
+                    description=f'Importing ISBNs from {file.filename}',
+                    payload={'path': path, 'default_status': request.form.get('default_status', 'library_only')}
+                )
+                flash('Bulk import started. You can follow its progress here.', 'info')
+                return redirect(url_for('main.task_status', task_id=task_id))
 
             except Exception as e:
                 current_app.logger.error(f"Error during bulk import: {e}")
@@ -801,134 +647,180 @@ def bulk_import():
 
     return render_template('bulk_import.html')
 
+@bp.route('/tasks')
+@login_required
+def list_tasks():
+    """Show the current user's background tasks"""
+    tasks = Task.query.filter_by(user_id=current_user.id).order_by(Task.created_at.desc()).limit(50).all()
+    return render_template('task_list.html', tasks=tasks)
+
+def get_task_or_404(task_id):
+    """Fetch a task owned by the current user (admins may view any task)"""
+    task = Task.query.get_or_404(task_id)
+    if task.user_id != current_user.id and not current_user.is_admin:
+        abort(404)
+    return task
+
+@bp.route('/task/<task_id>')
+@login_required
+def task_status(task_id):
+    task = get_task_or_404(task_id)
+    return render_template('task_status.html', task=task)
+
+@bp.route('/api/task/<task_id>')
+@login_required
+def api_task_status(task_id):
+    """JSON progress for the task status page's auto-refresh"""
+    task = get_task_or_404(task_id)
+    return jsonify(task.to_dict())
+
+@bp.route('/task/<task_id>/cancel', methods=['POST'])
+@login_required
+def cancel_task(task_id):
+    task = get_task_or_404(task_id)
+    if request_cancel(task):
+        flash('Cancellation requested.', 'info')
+    else:
+        flash('This task has already finished.', 'warning')
+    return redirect(url_for('main.task_status', task_id=task.id))
+
 @bp.route('/community_activity')
 @login_required
 def community_activity():
     """Show activity from users who have enabled activity sharing"""
-    
-    # Get users who share their reading activity
-    sharing_users = User.query.filter_by(share_reading_activity=True, is_active=True).all()
-    
-    # Recent books (books finished in the last 30 days)
-    recent_finished_books = Book.query.join(User).filter(
-        User.share_reading_activity == True,
-        User.is_active == True,
-        Book.finish_date.isnot(None),
-        Book.finish_date >= (datetime.now().date() - timedelta(days=30))
-    ).order_by(Book.finish_date.desc()).limit(20).all()
-    
-    # Recent reading logs (from last 7 days)
-    recent_logs = ReadingLog.query.join(User).filter(
-        User.share_reading_activity == True,
-        User.is_active == True,
-        ReadingLog.date >= (datetime.now().date() - timedelta(days=7))
-    ).order_by(ReadingLog.date.desc()).limit(50).all()
-    
-    # Currently reading books from sharing users
-    currently_reading = Book.query.join(User).filter(
-        User.share_current_reading == True,
-        User.is_active == True,
-        Book.start_date.isnot(None),
-        Book.finish_date.is_(None)
-    ).order_by(Book.start_date.desc()).limit(20).all()
-    
-    # Get some statistics
-    total_books_this_month = Book.query.join(User).filter(
-        User.share_reading_activity == True,
-        User.is_active == True,
-        Book.finish_date.isnot(None),
-        Book.finish_date >= datetime.now().date().replace(day=1)
-    ).count()
-    
-    total_active_readers = len(sharing_users)
+    today = datetime.now().date()
+
+    def overview():
+        # Card counts come from the activity feed in one query
+        return [User.query.filter_by(share_reading_activity=True, is_active=True).count(),
+                *feed_counts(month_start=today.replace(day=1), logs_since=today - timedelta(days=7))]
+
+    total_active_readers, total_books_this_month, recent_activity_count, currently_reading_count = cached(
+        'community', f'overview:{today}', overview)
     
     return render_template('community_activity.html',
-                         recent_finished_books=recent_finished_books,
-                         recent_logs=recent_logs,
-                         currently_reading=currently_reading,
+                         currently_reading_count=currently_reading_count,
+                         recent_activity_count=recent_activity_count,
                          total_books_this_month=total_books_this_month,
-                         total_active_readers=total_active_readers,
-                         sharing_users=sharing_users)
+                         total_active_readers=total_active_readers)
+
+# Sort options for the active readers list: column label -> default direction
+ACTIVE_READER_SORTS = {
+    'activity': 'desc',
+    'books_this_month': 'desc',
+    'total_books': 'desc',
+    'currently_reading': 'desc',
+    'username': 'asc',
+    'joined': 'asc',
+}
+
+def active_reader_stats(sort='activity', direction=None):
+    """
+    Query of (User, books_this_month, total_books, currently_reading, activity) for
+    every sharing user: one grouped aggregate over their books, sorted in SQL
+    """
+    if sort not in ACTIVE_READER_SORTS:
+        sort = 'activity'
+    if direction not in ('asc', 'desc'):
+        direction = ACTIVE_READER_SORTS[sort]
+
+    month_start = datetime.now().date().replace(day=1)
+    finished = Book.finish_date.isnot(None)
+    books_this_month = func.coalesce(func.sum(case((and_(finished, Book.finish_date >= month_start), 1), else_=0)), 0)
+    total_books = func.count(Book.finish_date)  # COUNT skips NULL finish dates
+    currently_reading = func.coalesce(func.sum(case((and_(Book.start_date.isnot(None), Book.finish_date.is_(None)), 1), else_=0)), 0)
+    columns = {
+        'books_this_month': books_this_month.label('books_this_month'),
+        'total_books': total_books.label('total_books'),
+        'currently_reading': currently_reading.label('currently_reading'),
+        'activity': (books_this_month + currently_reading).label('activity'),
+    }
+    order = {
+        'username': User.username,
+        'joined': User.created_at,
+    }.get(sort, columns.get(sort))
+    order = order.desc() if direction == 'desc' else order.asc()
+
+    query = db.session.query(User, *columns.values()).outerjoin(Book, Book.user_id == User.id).filter(
+        User.share_reading_activity == True,
+        User.is_active == True
+    ).group_by(User.id)
+    # User id breaks ties so pages never overlap
+    return query.order_by(order, User.id), sort, direction
 
 @bp.route('/community_activity/active_readers')
 @login_required
 def community_active_readers():
     """Show list of active readers"""
-    sharing_users = User.query.filter_by(share_reading_activity=True, is_active=True).all()
-    
-    # Get stats for each user
-    user_stats = []
-    for user in sharing_users:
-        books_this_month = Book.query.filter(
-            Book.user_id == user.id,
-            Book.finish_date.isnot(None),
-            Book.finish_date >= datetime.now().date().replace(day=1)
-        ).count()
-        
-        total_books = Book.query.filter(
-            Book.user_id == user.id,
-            Book.finish_date.isnot(None)
-        ).count()
-        
-        currently_reading_count = Book.query.filter(
-            Book.user_id == user.id,
-            Book.start_date.isnot(None),
-            Book.finish_date.is_(None)
-        ).count()
-        
-        user_stats.append({
-            'user': user,
-            'books_this_month': books_this_month,
-            'total_books': total_books,
-            'currently_reading': currently_reading_count
-        })
-    
-    # Sort by activity (books this month + currently reading)
-    user_stats.sort(key=lambda x: x['books_this_month'] + x['currently_reading'], reverse=True)
-    
-    return render_template('community_stats/active_readers.html', user_stats=user_stats)
+    page = request.args.get('page', 1, type=int)
+    query, sort, direction = active_reader_stats(request.args.get('sort', 'activity'), request.args.get('direction'))
+    readers = query.paginate(page=page, per_page=current_app.config.get('ACTIVE_READERS_PER_PAGE', 25), error_out=False)
+
+    # Streaks for the whole page in one query
+    streaks = compute_streaks(row.User.id for row in readers.items)
+    user_stats = [{
+        'user': row.User,
+        'books_this_month': row.books_this_month,
+        'total_books': row.total_books,
+        'currently_reading': row.currently_reading,
+        'streak': streaks.get(row.User.id, NO_STREAK).current + (row.User.reading_streak_offset or 0)
+    } for row in readers.items]
+
+    return render_template('community_stats/active_readers.html',
+                         user_stats=user_stats,
+                         readers=readers,
+                         sort=sort,
+                         direction=direction,
+                         sorts=ACTIVE_READER_SORTS)
+
+def community_feed_page(kind, since=None):
+    """The requested page of an activity feed section"""
+    return feed_page(kind, since=since, after=request.args.get('after'),
+                     page_size=current_app.config.get('COMMUNITY_FEED_PAGE_SIZE', 30))
+
+def cached_community_section(render):
+    """A community section fragment, shared by every viewer until the feed changes"""
+    key = f"{request.endpoint}:{datetime.now().date()}:{request.args.get('after', '')}"
+    return cached('community', key, render)
 
 @bp.route('/community_activity/books_this_month')
 @login_required
 def community_books_this_month():
     """Show books finished this month"""
-    books = Book.query.join(User).filter(
-        User.share_reading_activity == True,
-        User.is_active == True,
-        Book.finish_date.isnot(None),
-        Book.finish_date >= datetime.now().date().replace(day=1)
-    ).order_by(Book.finish_date.desc()).all()
+    def render():
+        feed = community_feed_page('finished', since=datetime.now().date().replace(day=1))
+        month_name = calendar.month_name[datetime.now().month]
+        return render_template('community_stats/books_this_month.html', 
+                             books=[event.book for event in feed.events],
+                             next_cursor=feed.next_cursor,
+                             month_name=month_name,
+                             year=datetime.now().year)
     
-    month_name = calendar.month_name[datetime.now().month]
-    return render_template('community_stats/books_this_month.html', 
-                         books=books, 
-                         month_name=month_name,
-                         year=datetime.now().year)
+    return cached_community_section(render)
 
 @bp.route('/community_activity/currently_reading')
 @login_required
 def community_currently_reading():
     """Show books currently being read"""
-    books = Book.query.join(User).filter(
-        User.share_current_reading == True,
-        User.is_active == True,
-        Book.start_date.isnot(None),
-        Book.finish_date.is_(None)
-    ).order_by(Book.start_date.desc()).all()
+    def render():
+        feed = community_feed_page('started')
+        return render_template('community_stats/currently_reading.html',
+                             books=[event.book for event in feed.events],
+                             next_cursor=feed.next_cursor)
     
-    return render_template('community_stats/currently_reading.html', books=books)
+    return cached_community_section(render)
 
 @bp.route('/community_activity/recent_activity')
 @login_required
 def community_recent_activity():
     """Show recent reading activity"""
-    recent_logs = ReadingLog.query.join(User).filter(
-        User.share_reading_activity == True,
-        User.is_active == True,
-        ReadingLog.date >= (datetime.now().date() - timedelta(days=7))
-    ).order_by(ReadingLog.date.desc()).limit(50).all()
+    def render():
+        feed = community_feed_page('logged', since=datetime.now().date() - timedelta(days=7))
+        return render_template('community_stats/recent_activity.html',
+                             recent_logs=feed.events,
+                             next_cursor=feed.next_cursor)
     
-    return render_template('community_stats/recent_activity.html', recent_logs=recent_logs)
+    return cached_community_section(render)
 
 @bp.route('/user/<int:user_id>/profile')
 @login_required
@@ -941,45 +833,20 @@ def user_profile(user_id):
         flash('This user has not enabled profile sharing.', 'warning')
         return redirect(url_for('main.community_activity'))
     
-    # Get user's reading statistics
-    total_books = Book.query.filter(
-        Book.user_id == user.id,
-        Book.finish_date.isnot(None)
-    ).count()
-    
-    books_this_year = Book.query.filter(
-        Book.user_id == user.id,
-        Book.finish_date.isnot(None),
-        Book.finish_date >= date(datetime.now().year, 1, 1)
-    ).count()
-    
-    books_this_month = Book.query.filter(
-        Book.user_id == user.id,
-        Book.finish_date.isnot(None),
-        Book.finish_date >= datetime.now().date().replace(day=1)
-    ).count()
-    
-    currently_reading = Book.query.filter(
-        Book.user_id == user.id,
-        Book.start_date.isnot(None),
-        Book.finish_date.is_(None)
-    ).all() if user.share_current_reading else []
-    
-    recent_finished = Book.query.filter(
-        Book.user_id == user.id,
-        Book.finish_date.isnot(None)
-    ).order_by(Book.finish_date.desc()).limit(10).all()
-    
-    reading_logs_count = ReadingLog.query.filter_by(user_id=user.id).count()
+    # Counters come from the per-user stats cache; both book lists from one query
+    stats = get_user_stats(user.id)
+    currently_reading, recent_finished = profile_books(user.id, include_reading=bool(user.share_current_reading))
     
     return render_template('user_profile.html',
                          profile_user=user,
-                         total_books=total_books,
-                         books_this_year=books_this_year,
-                         books_this_month=books_this_month,
+                         total_books=stats['finished_books'],
+                         books_this_year=stats['finished_this_year'],
+                         books_this_month=stats['finished_this_month'],
                          currently_reading=currently_reading,
                          recent_finished=recent_finished,
-                         reading_logs_count=reading_logs_count)
+                         reading_logs_count=stats['reading_logs'],
+                         current_streak=stats['current_streak'] + (user.reading_streak_offset or 0),
+                         longest_streak=stats['longest_streak'])
 
 @bp.route('/book/<uid>/assign', methods=['POST'])
 @login_required
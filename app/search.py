@@ -0,0 +1,137 @@
+"""
+Library search for MyBibliotheca
+An SQLite FTS5 index over book title, author, description, categories and
+publisher, kept in sync by triggers, with bm25 ranking, prefix matching and
+highlighted snippets. Other databases fall back to ILIKE matching.
+"""
+
+import re
+from markupsafe import Markup, escape
+from sqlalchemy import Column, Integer, MetaData, Table, Text, literal_column, func, or_, select, text
+from sqlalchemy.exc import OperationalError
+from .models import db, Book
+
+SEARCH_COLUMNS = ('title', 'author', 'description', 'categories', 'publisher')
+
+# bm25 column weights, in SEARCH_COLUMNS order: a title hit outranks one in a long description
+COLUMN_WEIGHTS = (10.0, 6.0, 1.0, 3.0, 2.0)
+
+# Snippet highlight markers; control characters never occur in book text, so they survive escaping
+_MARK_START, _MARK_END = '\x02', '\x03'
+
+# Not part of db.metadata: create_all() must not try to build the virtual table
+book_fts = Table('book_fts', MetaData(), Column('rowid', Integer), *(Column(name, Text) for name in SEARCH_COLUMNS))
+
+_columns = ', '.join(SEARCH_COLUMNS)
+_new_values = ', '.join(f'new.{name}' for name in SEARCH_COLUMNS)
+_old_values = ', '.join(f'old.{name}' for name in SEARCH_COLUMNS)
+
+FTS_SCHEMA = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS book_fts USING fts5(
+        {_columns}, content='book', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS book_fts_ai AFTER INSERT ON book BEGIN
+        INSERT INTO book_fts(rowid, {_columns}) VALUES (new.id, {_new_values});
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS book_fts_ad AFTER DELETE ON book BEGIN
+        INSERT INTO book_fts(book_fts, rowid, {_columns}) VALUES ('delete', old.id, {_old_values});
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS book_fts_au AFTER UPDATE OF {_columns} ON book BEGIN
+        INSERT INTO book_fts(book_fts, rowid, {_columns}) VALUES ('delete', old.id, {_old_values});
+        INSERT INTO book_fts(rowid, {_columns}) VALUES (new.id, {_new_values});
+    END""",
+]
+
+def init_search_index(app):
+    """
+    Create the FTS5 index and its sync triggers (SQLite only). The index is rebuilt
+    whenever the triggers were missing, e.g. on first run or after the book table
+    was recreated, since changes made without them were never indexed. When they
+    are all present this is a single read, with no write transaction.
+    """
+    enabled = False
+    if db.engine.dialect.name == 'sqlite':
+        try:
+            with db.engine.connect() as conn:
+                had_triggers = conn.execute(text(
+                    "SELECT count(*) FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'book_fts_%'"
+                )).scalar() == 3
+            if not had_triggers:
+                with db.engine.begin() as conn:
+                    for statement in FTS_SCHEMA:
+                        conn.execute(text(statement))
+                    print("🔄 Building full-text search index...")
+                    conn.execute(text("INSERT INTO book_fts(book_fts) VALUES ('rebuild')"))
+                    print("✅ Full-text search index built")
+            enabled = True
+        except OperationalError as e:
+            print(f"⚠️  Full-text search unavailable, falling back to basic search: {e}")
+    app.extensions['fts_enabled'] = enabled
+    return enabled
+
+def rebuild_search_index():
+    """Re-read every book into the FTS index (e.g. after restoring a backup)"""
+    db.session.execute(text("INSERT INTO book_fts(book_fts) VALUES ('rebuild')"))
+    db.session.commit()
+
+def to_match_query(term):
+    """
+    Turn free text into a safe FTS5 query: every word must match, as a prefix.
+    Returns None when the text contains no searchable words.
+    """
+    words = re.findall(r'\w+', term or '', re.UNICODE)
+    if not words:
+        return None
+    return ' '.join(f'"{word}"*' for word in words)
+
+def highlight(snippet):
+    """Escape a raw FTS snippet and turn its match markers into <mark> tags"""
+    if not snippet:
+        return None
+    return Markup(str(escape(snippet)).replace(_MARK_START, '<mark>').replace(_MARK_END, '</mark>'))
+
+class BookSearch:
+    """
+    A search term applied to the book table
+    With FTS5 it joins the index for ranking and snippets; otherwise it is a plain ILIKE filter.
+    """
+
+    def __init__(self, term, fts_enabled, columns=SEARCH_COLUMNS):
+        self.term = term
+        self.columns = columns
+        self.match = to_match_query(term) if fts_enabled else None
+        self.ranked = self.match is not None
+
+    def _match_clause(self):
+        return literal_column('book_fts').op('MATCH')(self.match)
+
+    def criterion(self):
+        """Filter for queries that do not need ranking (counts, facets)"""
+        if self.ranked:
+            return Book.id.in_(select(book_fts.c.rowid).where(self._match_clause()))
+        return or_(*(getattr(Book, name).ilike(f'%{self.term}%') for name in self.columns))
+
+    def apply(self, query):
+        """Join the FTS index into a Book query and filter it to matching rows"""
+        if not self.ranked:
+            return query.filter(self.criterion())
+        return query.join(book_fts, book_fts.c.rowid == Book.id).filter(self._match_clause())
+
+    @property
+    def rank(self):
+        """bm25 score (lower is better); only valid on a query passed through apply()"""
+        return func.bm25(literal_column('book_fts'), *COLUMN_WEIGHTS)
+
+    @property
+    def snippet(self):
+        """Best matching fragment of any column, with raw highlight markers"""
+        return func.snippet(literal_column('book_fts'), -1, _MARK_START, _MARK_END, '…', 12)
+
+def book_search(term, columns=SEARCH_COLUMNS):
+    """BookSearch for the current app, or None for an empty term"""
+    from flask import current_app
+    term = (term or '').strip()
+    if not term:
+        return None
+    return BookSearch(term, current_app.extensions.get('fts_enabled', False), columns)
@@ -0,0 +1,34 @@
+"""
+First-run setup state for MyBibliotheca
+Setup is complete once any user exists. That only ever flips one way in
+practice, so each worker process caches the positive answer after seeing it
+once; until then the database (shared by every worker) is asked on each check.
+"""
+
+from flask import current_app, has_app_context
+from sqlalchemy import event
+from .models import db, User
+
+def is_setup_complete():
+    """True once at least one user exists; cached per process after the first True"""
+    app = current_app._get_current_object()
+    if app.extensions.get('setup_complete'):
+        return True
+    complete = db.session.query(User.id).limit(1).first() is not None
+    if complete:
+        app.extensions['setup_complete'] = True
+    return complete
+
+def mark_setup_complete():
+    """Record that setup finished (e.g. right after the first admin is created)"""
+    current_app.extensions['setup_complete'] = True
+
+def reset_setup_state():
+    """Forget the cached state so the next check asks the database again"""
+    current_app.extensions.pop('setup_complete', None)
+
+@event.listens_for(User, 'after_delete')
+def _user_deleted(mapper, connection, target):
+    # Deleting the last user sends the instance back to setup; re-check rather than guess
+    if has_app_context():
+        reset_setup_state()
@@ -0,0 +1,280 @@
+"""
+Reading streaks for MyBibliotheca
+Keeps each user's current and longest run of consecutive reading days in the
+reading_streak table, updated in the same transaction as every ORM insert and
+delete of a ReadingLog, so showing a streak is a single-row lookup.
+compute_streaks() derives streaks for many users at once in one SQL query.
+"""
+
+from collections import defaultdict, namedtuple
+from datetime import datetime, timedelta, timezone
+from flask import current_app
+from sqlalchemy import case, event, func, literal_column, select
+from sqlalchemy.orm import Session
+from .models import db, ReadingLog, ReadingStreak
+
+def _utcnow():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+def _log_dates(connection, user_id, *conditions, descending=False):
+    """Distinct log dates of a user, streamed in date order"""
+    column = ReadingLog.__table__.c.date
+    stmt = (select(column).distinct()
+            .where(ReadingLog.__table__.c.user_id == user_id, *conditions)
+            .order_by(column.desc() if descending else column))
+    return connection.execute(stmt)
+
+def _run_length(connection, user_id, start, step):
+    """Consecutive log days from `start` going back (step=-1) or forward (step=1); reads only that run"""
+    column = ReadingLog.__table__.c.date
+    condition = column <= start if step < 0 else column >= start
+    result = _log_dates(connection, user_id, condition, descending=step < 0)
+    length, expected = 0, start
+    try:
+        for (day,) in result:
+            if day != expected:
+                break
+            length += 1
+            expected += timedelta(days=step)
+    finally:
+        result.close()
+    return length
+
+def compute_streak(dates):
+    """(current_length, last_log_date, longest_length) from ascending distinct dates"""
+    current, last, longest = 0, None, 0
+    for day in dates:
+        current = current + 1 if last is not None and day - last == timedelta(days=1) else 1
+        last = day
+        longest = max(longest, current)
+    return current, last, longest
+
+def _load(connection, user_id):
+    table = ReadingStreak.__table__
+    row = connection.execute(
+        select(table.c.current_length, table.c.last_log_date, table.c.longest_length).where(table.c.user_id == user_id)
+    ).first()
+    return tuple(row) if row else None
+
+def _save(connection, user_id, current, last, longest):
+    table = ReadingStreak.__table__
+    values = {'current_length': current, 'last_log_date': last, 'longest_length': longest, 'updated_at': _utcnow()}
+    updated = connection.execute(table.update().where(table.c.user_id == user_id).values(**values))
+    if not updated.rowcount:
+        connection.execute(table.insert().values(user_id=user_id, **values))
+
+# current: days in the streak as shown today (0 once it lapsed); run_length: days in the
+# latest run regardless of today; longest: longest run ever
+Streak = namedtuple('Streak', 'current run_length longest last_log_date')
+NO_STREAK = Streak(0, 0, 0, None)
+
+def _day_number(column, dialect):
+    """Integer day count for a DATE column, so consecutive days differ by 1 (None if unsupported)"""
+    if dialect == 'sqlite':
+        return func.julianday(column)
+    if dialect == 'postgresql':
+        return column - literal_column("DATE '1970-01-01'")
+    if dialect in ('mysql', 'mariadb'):
+        return func.to_days(column)
+    return None
+
+def _streak_rows(connection, user_ids=None):
+    """
+    (user_id, latest run length, last log date, longest run) for every user with logs, or
+    just user_ids. Gaps and islands: within a user's log dates ordered by day, day number
+    minus dense rank is constant along a run of consecutive days.
+    """
+    log = ReadingLog.__table__
+    day_number = _day_number(log.c.date, connection.dialect.name)
+    if day_number is None:
+        # No window-friendly date arithmetic: walk each user's dates instead
+        if user_ids is None:
+            user_ids = [uid for (uid,) in connection.execute(select(log.c.user_id).distinct())]
+        for uid in user_ids:
+            current, last, longest = compute_streak(day for (day,) in _log_dates(connection, uid))
+            if last is not None:
+                yield uid, current, last, longest
+        return
+
+    # dense_rank rather than row_number: several books logged on one day share a rank,
+    # so no separate DISTINCT pass is needed
+    islands = select(
+        log.c.user_id, log.c.date,
+        (day_number - func.dense_rank().over(partition_by=log.c.user_id, order_by=log.c.date)).label('island')
+    )
+    if user_ids is not None:
+        islands = islands.where(log.c.user_id.in_(list(user_ids)))
+    islands = islands.cte('islands')
+    runs = select(
+        islands.c.user_id,
+        func.max(islands.c.date).label('last_day'),
+        func.count(islands.c.date.distinct()).label('length')
+    ).group_by(islands.c.user_id, islands.c.island).cte('runs')
+    latest = select(
+        runs.c.user_id, runs.c.last_day, runs.c.length,
+        func.max(runs.c.last_day).over(partition_by=runs.c.user_id).label('latest_day')
+    ).cte('latest_runs')
+    stmt = select(
+        latest.c.user_id,
+        func.max(case((latest.c.last_day == latest.c.latest_day, latest.c.length), else_=0)),
+        func.max(latest.c.latest_day),
+        func.max(latest.c.length)
+    ).group_by(latest.c.user_id)
+    yield from connection.execute(stmt)
+
+def _today():
+    import pytz
+    return datetime.now(pytz.timezone(current_app.config.get('TIMEZONE', 'UTC'))).date()
+
+def compute_streaks(user_ids=None, connection=None):
+    """
+    {user_id: Streak} for all users with reading logs, or only user_ids, in one query.
+    Users without logs are absent; use .get(user_id, NO_STREAK).
+    """
+    if user_ids is not None:
+        user_ids = list(user_ids)
+        if not user_ids:
+            return {}
+    connection = connection or db.session.connection()
+    today = _today()
+    streaks = {}
+    for user_id, run_length, last, longest in _streak_rows(connection, user_ids):
+        current = run_length if (today - last).days <= 1 else 0
+        streaks[user_id] = Streak(current, run_length, longest, last)
+    return streaks
+
+def _recompute(connection, user_id):
+    streak = compute_streaks([user_id], connection).get(user_id, NO_STREAK)
+    _save(connection, user_id, streak.run_length, streak.last_log_date, streak.longest)
+    return streak.run_length, streak.last_log_date, streak.longest
+
+def _day_added(connection, user_id, state, day):
+    """Streak after `day` became a log date; only the runs touching it are read"""
+    current, last, longest = state
+    if last is None or day > last:
+        before = current if last is not None and day - last == timedelta(days=1) else 0
+        current, last = before + 1, day
+        return current, last, max(longest, current)
+    # Backdated log: it may join the run before it to the run after it
+    before = _run_length(connection, user_id, day - timedelta(days=1), -1)
+    after = _run_length(connection, user_id, day + timedelta(days=1), 1)
+    merged = before + 1 + after
+    if day + timedelta(days=after) == last:
+        current = merged
+    return current, last, max(longest, merged)
+
+def _day_removed(connection, user_id, state, day):
+    """Streak after `day` stopped being a log date"""
+    current, last, longest = state
+    if last is None:
+        return state
+    before = _run_length(connection, user_id, day - timedelta(days=1), -1)
+    after = _run_length(connection, user_id, day + timedelta(days=1), 1)
+    if day == last:
+        if before:
+            current, last = before, day - timedelta(days=1)
+        else:
+            column = ReadingLog.__table__.c.date
+            last = connection.execute(select(func.max(column)).where(ReadingLog.__table__.c.user_id == user_id)).scalar()
+            current = _run_length(connection, user_id, last, -1) if last else 0
+    elif last - timedelta(days=current) < day < last:
+        current = after
+    if before + 1 + after >= longest:
+        # The longest run was split; only a full pass can tell what the next longest is
+        return _recompute(connection, user_id)
+    return current, last, longest
+
+def _apply(connection, changes):
+    for user_id, days in changes.items():
+        state = _load(connection, user_id)
+        column = ReadingLog.__table__.c.date
+        # Only days that gained their first log or lost their last one move the streak
+        counts = dict(connection.execute(
+            select(column, func.count()).where(ReadingLog.__table__.c.user_id == user_id, column.in_(list(days)))
+            .group_by(column)
+        ).all())
+        moved = {}
+        for day, (added, removed) in days.items():
+            remaining = counts.get(day, 0)
+            if added and remaining == added:
+                moved[day] = 'added'
+            elif removed and remaining == 0:
+                moved[day] = 'removed'
+        if not moved:
+            continue
+        if state is None or len(moved) > 1:
+            # First streak for this user, or several days at once (an import): recount
+            _recompute(connection, user_id)
+            continue
+        day, change = moved.popitem()
+        if change == 'added':
+            state = _day_added(connection, user_id, state, day)
+        else:
+            state = _day_removed(connection, user_id, state, day)
+        _save(connection, user_id, *state)
+
+@event.listens_for(Session, 'before_flush')
+def _collect_log_changes(session, flush_context, instances):
+    # {user_id: {date: [logs added, logs removed]}}
+    changes = session.info.setdefault('streak_changes', defaultdict(lambda: defaultdict(lambda: [0, 0])))
+    for log in session.new:
+        if isinstance(log, ReadingLog) and log.user_id is not None and log.date is not None:
+            changes[log.user_id][log.date][0] += 1
+    for log in session.deleted:
+        if isinstance(log, ReadingLog) and log.user_id is not None and log.date is not None:
+            changes[log.user_id][log.date][1] += 1
+
+@event.listens_for(Session, 'after_flush')
+def _write_log_changes(session, flush_context):
+    changes = session.info.pop('streak_changes', None)
+    if changes:
+        _apply(session.connection(), changes)
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _discard_log_changes(session, previous_transaction):
+    session.info.pop('streak_changes', None)
+
+def rebuild_streaks(user_id=None):
+    """Recompute streaks from the reading_log table (after bulk SQL changes); returns rows written"""
+    user_ids = [user_id] if user_id is not None else None
+    streaks = compute_streaks(user_ids)
+    if user_id is not None:
+        streaks.setdefault(user_id, NO_STREAK)
+
+    delete = ReadingStreak.query
+    if user_id is not None:
+        delete = delete.filter(ReadingStreak.user_id == user_id)
+    delete.delete(synchronize_session=False)
+    now = _utcnow()
+    db.session.bulk_insert_mappings(ReadingStreak, [
+        {'user_id': uid, 'current_length': streak.run_length, 'last_log_date': streak.last_log_date,
+         'longest_length': streak.longest, 'updated_at': now}
+        for uid, streak in streaks.items()
+    ])
+    db.session.commit()
+    return len(streaks)
+
+def get_streak(user_id):
+    """The stored ReadingStreak row, built from the logs on first use"""
+    query = ReadingStreak.query.filter_by(user_id=user_id).populate_existing()
+    streak = query.first()
+    if streak is None:
+        rebuild_streaks(user_id)
+        streak = query.first()
+    return streak
+
+def current_streak(user_id):
+    """
+    Days in the user's current streak: the run ending at the latest log date,
+    provided that date is today or yesterday in the configured timezone
+    """
+    streak = get_streak(user_id)
+    if streak is None or streak.last_log_date is None:
+        return 0
+    if (_today() - streak.last_log_date).days > 1:
+        return 0
+    return streak.current_length
+
+def longest_streak(user_id):
+    streak = get_streak(user_id)
+    return streak.longest_length if streak else 0
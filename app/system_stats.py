@@ -0,0 +1,189 @@
+"""
+System statistics snapshots for MyBibliotheca
+The admin dashboard's counters and host probes are collected at most once per
+STATS_SNAPSHOT_INTERVAL (by a background thread in each worker, or lazily on the
+first stale read) and stored as a time series, so dashboard loads and API polls
+read the latest snapshot from memory and history can be charted.
+"""
+
+import json
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from flask import current_app
+from sqlalchemy import func, select
+from sqlalchemy.exc import SQLAlchemyError
+from .models import db, User, Book, ReadingLog, MetadataCache, StatsSnapshot
+
+COUNTERS = ('total_users', 'active_users', 'admin_users', 'total_books', 'reading_logs',
+            'new_users_30d', 'new_books_30d', 'metadata_entries', 'metadata_negative_entries')
+SERIES = COUNTERS + ('disk_percent', 'memory_percent')
+
+class SnapshotState:
+    """This process's latest snapshot and refresher thread for one app"""
+
+    def __init__(self):
+        self.latest = None  # as returned by snapshot_dict()
+        self.lock = threading.Lock()
+        self.take_lock = threading.Lock()
+        self.refresher = None
+
+def _utcnow():
+    """Naive UTC timestamp (SQLite drops tzinfo on DateTime columns)"""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+def _count(model, *conditions):
+    return select(func.count(model.id)).where(*conditions).scalar_subquery()
+
+def collect_counters(now=None):
+    """Every COUNTERS value in one query"""
+    since = (now or _utcnow()) - timedelta(days=30)
+    row = db.session.execute(select(
+        _count(User),
+        _count(User, User.is_active.is_(True)),
+        _count(User, User.is_admin.is_(True)),
+        _count(Book),
+        _count(ReadingLog),
+        _count(User, User.created_at >= since),
+        _count(Book, Book.created_at >= since),
+        _count(MetadataCache),
+        _count(MetadataCache, MetadataCache.found.is_(False)),
+    )).one()
+    return dict(zip(COUNTERS, row))
+
+def _top_users(limit=5):
+    rows = db.session.query(
+        User.username,
+        func.count(Book.id).label('book_count')
+    ).join(Book).group_by(User.id).order_by(func.count(Book.id).desc()).limit(limit).all()
+    return [{'username': username, 'book_count': count} for username, count in rows]
+
+def probe_system():
+    """Disk and memory usage (with fallback if psutil not available)"""
+    try:
+        import psutil
+        disk_usage = psutil.disk_usage('/')
+        memory = psutil.virtual_memory()
+
+        return {
+            'disk_free_gb': round(disk_usage.free / (1024**3), 2),
+            'disk_total_gb': round(disk_usage.total / (1024**3), 2),
+            'disk_percent': round((disk_usage.used / disk_usage.total) * 100, 1),
+            'memory_percent': memory.percent,
+            'memory_available_gb': round(memory.available / (1024**3), 2)
+        }
+    except ImportError:
+        return {
+            'disk_free_gb': 'N/A',
+            'disk_total_gb': 'N/A',
+            'disk_percent': 'N/A',
+            'memory_percent': 'N/A',
+            'memory_available_gb': 'N/A'
+        }
+
+def _number(value):
+    return value if isinstance(value, (int, float)) else None
+
+def snapshot_dict(snapshot):
+    details = json.loads(snapshot.details) if snapshot.details else {}
+    data = {name: getattr(snapshot, name) for name in SERIES}
+    data.update(
+        taken_at=snapshot.taken_at.isoformat(),
+        top_users=details.get('top_users', []),
+        system=details.get('system', {})
+    )
+    return data
+
+def _state():
+    return current_app.extensions['system_stats']
+
+def _remember(data):
+    state = _state()
+    with state.lock:
+        state.latest = data
+    return data
+
+def _current():
+    state = _state()
+    with state.lock:
+        return state.latest
+
+def take_snapshot():
+    """Collect and store a new snapshot, pruning those older than STATS_HISTORY_DAYS"""
+    now = _utcnow()
+    system = probe_system()
+    snapshot = StatsSnapshot(
+        taken_at=now,
+        disk_percent=_number(system['disk_percent']),
+        memory_percent=_number(system['memory_percent']),
+        details=json.dumps({'top_users': _top_users(), 'system': system}),
+        **collect_counters(now)
+    )
+    db.session.add(snapshot)
+    keep_days = current_app.config.get('STATS_HISTORY_DAYS', 30)
+    StatsSnapshot.query.filter(StatsSnapshot.taken_at < now - timedelta(days=keep_days)).delete(synchronize_session=False)
+    db.session.commit()
+    return _remember(snapshot_dict(snapshot))
+
+def _age(data):
+    return (_utcnow() - datetime.fromisoformat(data['taken_at'])).total_seconds()
+
+def refresh_snapshot(max_age=None):
+    """
+    The newest snapshot no older than max_age seconds (STATS_SNAPSHOT_INTERVAL by
+    default): another worker's if it is recent enough, otherwise a new one
+    """
+    if max_age is None:
+        max_age = current_app.config.get('STATS_SNAPSHOT_INTERVAL', 300)
+    with _state().take_lock:
+        latest = _current()
+        if latest is not None and _age(latest) < max_age:
+            return latest
+        stored = StatsSnapshot.query.order_by(StatsSnapshot.taken_at.desc()).first()
+        if stored is not None and (_utcnow() - stored.taken_at).total_seconds() < max_age:
+            return _remember(snapshot_dict(stored))
+        return take_snapshot()
+
+def latest_snapshot():
+    """The latest snapshot, from memory unless it has gone stale"""
+    _ensure_refresher(current_app._get_current_object())
+    latest = _current()
+    if latest is not None and _age(latest) < current_app.config.get('STATS_SNAPSHOT_INTERVAL', 300):
+        return latest
+    return refresh_snapshot()
+
+def snapshot_history(hours=24, series=SERIES):
+    """{'taken_at': [...], name: [...]} for every snapshot in the last `hours`, oldest first"""
+    columns = [getattr(StatsSnapshot, name) for name in series]
+    rows = (db.session.query(StatsSnapshot.taken_at, *columns)
+            .filter(StatsSnapshot.taken_at >= _utcnow() - timedelta(hours=hours))
+            .order_by(StatsSnapshot.taken_at).all())
+    history = {'taken_at': [row[0].isoformat() for row in rows]}
+    for index, name in enumerate(series, start=1):
+        history[name] = [row[index] for row in rows]
+    return history
+
+def _refresh_loop(app, interval):
+    while True:
+        time.sleep(interval)
+        with app.app_context():
+            try:
+                refresh_snapshot(max_age=interval)
+            except SQLAlchemyError as e:
+                db.session.rollback()
+                app.logger.warning(f"Could not refresh system stats snapshot: {e}")
+
+def _ensure_refresher(app):
+    """Start this process's refresher thread on first use (not in tests or with interval 0)"""
+    interval = app.config.get('STATS_SNAPSHOT_INTERVAL', 300)
+    if app.config.get('TESTING') or interval <= 0:
+        return
+    state = app.extensions['system_stats']
+    with state.lock:
+        if state.refresher is not None:
+            return
+        state.refresher = threading.Thread(target=_refresh_loop, args=(app, interval), name='stats-snapshot', daemon=True)
+        state.refresher.start()
+
+def init_system_stats(app):
+    app.extensions['system_stats'] = SnapshotState()
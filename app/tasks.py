@@ -0,0 +1,326 @@
+"""
+Background task engine for MyBibliotheca
+Persists jobs in the task table and runs them in a per-process worker pool,
+with progress checkpoints, cancellation and resumption after a restart
+"""
+
+import os
+import itertools
+import json
+import socket
+import threading
+import time
+import traceback
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from flask import current_app
+from sqlalchemy import or_
+from sqlalchemy.exc import SQLAlchemyError
+from .models import db, Task
+
+TASK_HANDLERS = {}
+
+# Claim generations in this process; with the worker id they make every claim unique
+_claims = itertools.count(1)
+
+class TaskCancelled(Exception):
+    """Raised inside a handler when the user cancelled the task"""
+
+class TaskLost(Exception):
+    """Raised at a checkpoint when the task was requeued and claimed by another worker"""
+
+def task_handler(task_type):
+    """
+    Register a function as the handler for a task type
+    Usage: @task_handler('bulk_import') def run(task, progress): ...
+    """
+    def decorator(f):
+        TASK_HANDLERS[task_type] = f
+        return f
+    return decorator
+
+def _utcnow():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+class TaskProgress:
+    """Progress reporter handed to task handlers; every update is a resumable checkpoint"""
+
+    def __init__(self, task):
+        self.task = task
+        # Plain values, safe to read from the keepalive thread
+        self.task_id = task.id
+        self.owner = task.worker_id  # the claim token written by claim_task()
+
+    @property
+    def start_index(self):
+        """Number of items already processed (non-zero when resuming)"""
+        return self.task.processed_items or 0
+
+    def set_total(self, total):
+        self.task.total_items = total
+        self._checkpoint()
+
+    def set_current(self, item):
+        self.task.current_item = str(item)[:255] if item is not None else None
+
+    def item_done(self, success=True, error=None):
+        """Record one processed item and commit it together with the handler's own changes"""
+        task = self.task
+        task.processed_items = (task.processed_items or 0) + 1
+        if success:
+            task.success_count = (task.success_count or 0) + 1
+        else:
+            task.error_count = (task.error_count or 0) + 1
+            if error:
+                result = task.result
+                result.setdefault('errors', []).append(error)
+                task.result = result
+        self._checkpoint()
+
+    def check_cancelled(self):
+        """Raise TaskCancelled if cancellation was requested from another request or worker"""
+        requested = db.session.query(Task.cancel_requested).filter_by(id=self.task.id).scalar()
+        if requested:
+            raise TaskCancelled()
+
+    def _beat(self):
+        """Refresh the heartbeat in the current transaction; False if our claim is gone"""
+        return bool(Task.query.filter_by(id=self.task_id, status='running', worker_id=self.owner).update(
+            {'heartbeat_at': _utcnow()}, synchronize_session=False))
+
+    def confirm_claim(self):
+        """Raise TaskLost (discarding uncommitted work) if another worker has claimed the task"""
+        if not self._beat():
+            db.session.rollback()
+            raise TaskLost()
+
+    @contextmanager
+    def keepalive(self):
+        """
+        Keep the heartbeat fresh during a long step without checkpoints (e.g. a
+        provider batch), so requeue_stale_tasks() does not hand the task to another worker
+        """
+        app = current_app._get_current_object()
+        interval = app.config.get('TASK_STALE_AFTER', 300) / 3
+        stop = threading.Event()
+
+        def beat():
+            while not stop.wait(interval):
+                with app.app_context():
+                    try:
+                        self._beat()
+                        db.session.commit()
+                    except SQLAlchemyError as e:
+                        db.session.rollback()
+                        app.logger.warning(f"Task {self.task_id} heartbeat failed: {e}")
+
+        thread = threading.Thread(target=beat, name='task-heartbeat', daemon=True)
+        thread.start()
+        try:
+            yield
+        finally:
+            stop.set()
+            thread.join()
+
+    def _checkpoint(self):
+        self.confirm_claim()
+        db.session.commit()
+        self.check_cancelled()
+
+def _worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"
+
+def _remove_upload(task):
+    """Delete an uploaded file that belongs to a finished task"""
+    path = task.payload_data.get('path')
+    if path and os.path.exists(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+def _finish(task, status, result=None, error_message=None):
+    task.status = status
+    task.completed_at = _utcnow()
+    task.current_item = None
+    task.worker_id = None
+    if result is not None:
+        merged = task.result
+        merged.update(result)
+        task.result = merged
+    if error_message:
+        task.error_message = error_message
+    db.session.commit()
+    _remove_upload(task)
+
+def execute_task(task_id):
+    """Run a claimed task to completion inside the current app context"""
+    task = db.session.get(Task, task_id)
+    if task is None:
+        return
+
+    handler = TASK_HANDLERS.get(task.task_type)
+    if handler is None:
+        _finish(task, 'failed', error_message=f"Unknown task type: {task.task_type}")
+        return
+
+    progress = TaskProgress(task)
+    try:
+        progress.check_cancelled()
+        result = handler(task, progress)
+        progress.confirm_claim()
+        _finish(task, 'completed', result=result)
+    except TaskLost:
+        # Requeued while we were slow; the new owner resumes from the last checkpoint
+        current_app.logger.warning(f"Task {task_id} was claimed by another worker; stopping this run")
+    except TaskCancelled:
+        db.session.rollback()
+        task = db.session.get(Task, task_id)
+        _finish(task, 'cancelled', result={'message': f"Cancelled after {task.processed_items} of {task.total_items} items."})
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"Task {task_id} failed: {e}\n{traceback.format_exc()}")
+        task = db.session.get(Task, task_id)
+        _finish(task, 'failed', error_message=str(e))
+
+def claim_task(task_id, worker_id):
+    """
+    Atomically move a pending task to running; False if another worker got it first.
+    The stored worker_id gets a claim generation, so a run that lost its claim
+    through requeue_stale_tasks() notices at its next checkpoint.
+    """
+    now = _utcnow()
+    claimed = Task.query.filter_by(id=task_id, status='pending').update({
+        'status': 'running',
+        'worker_id': f"{worker_id}:{next(_claims)}",
+        'heartbeat_at': now,
+        'started_at': db.func.coalesce(Task.started_at, now)
+    }, synchronize_session=False)
+    db.session.commit()
+    return bool(claimed)
+
+def claim_next_task(worker_id):
+    """Claim the oldest pending task; returns its id or None"""
+    candidates = db.session.query(Task.id).filter_by(status='pending').order_by(Task.created_at).limit(5).all()
+    for (task_id,) in candidates:
+        if claim_task(task_id, worker_id):
+            return task_id
+    return None
+
+def requeue_stale_tasks():
+    """Put running tasks whose worker stopped sending heartbeats back in the queue"""
+    cutoff = _utcnow() - timedelta(seconds=current_app.config.get('TASK_STALE_AFTER', 300))
+    requeued = Task.query.filter(
+        Task.status == 'running',
+        or_(Task.heartbeat_at.is_(None), Task.heartbeat_at < cutoff)
+    ).update({'status': 'pending', 'worker_id': None}, synchronize_session=False)
+    db.session.commit()
+    return requeued
+
+def has_unfinished_tasks():
+    return db.session.query(Task.id).filter(Task.status.in_(['pending', 'running'])).first() is not None
+
+class TaskWorkerPool:
+    """Daemon threads that poll the task table; they exit once the queue is drained"""
+
+    def __init__(self, app):
+        self.app = app
+        self.wakeup = threading.Event()
+        self.threads = []
+        self.lock = threading.Lock()
+        self.last_requeue = 0
+
+    def ensure_running(self):
+        size = self.app.config.get('TASK_WORKERS', 2)
+        with self.lock:
+            self.wakeup.set()
+            self.threads = [t for t in self.threads if t.is_alive()]
+            while len(self.threads) < size:
+                thread = threading.Thread(target=self._run, name=f"task-worker-{len(self.threads)}", daemon=True)
+                self.threads.append(thread)
+                thread.start()
+
+    def _retire(self):
+        """Leave the pool unless new work was announced while we were checking"""
+        with self.lock:
+            if self.wakeup.is_set():
+                return False
+            current = threading.current_thread()
+            self.threads = [t for t in self.threads if t is not current]
+            return True
+
+    def _run(self):
+        worker_id = _worker_id()
+        interval = self.app.config.get('TASK_POLL_INTERVAL', 2)
+        requeue_interval = self.app.config.get('TASK_STALE_AFTER', 300) / 2
+        while True:
+            self.wakeup.clear()
+            with self.app.app_context():
+                try:
+                    if time.monotonic() - self.last_requeue >= requeue_interval:
+                        self.last_requeue = time.monotonic()
+                        requeue_stale_tasks()
+                    task_id = claim_next_task(worker_id)
+                    if task_id:
+                        execute_task(task_id)
+                        continue
+                    if not has_unfinished_tasks() and self._retire():
+                        return
+                except Exception as e:
+                    db.session.rollback()
+                    self.app.logger.error(f"Task worker error: {e}")
+            self.wakeup.wait(interval)
+
+def _get_pool(app):
+    pool = app.extensions.get('task_pool')
+    if pool is None:
+        pool = app.extensions['task_pool'] = TaskWorkerPool(app)
+    return pool
+
+def _runs_inline(app):
+    return app.config.get('TESTING') or app.config.get('TASK_WORKERS', 2) <= 0
+
+def enqueue_task(task_type, user_id, name, description=None, payload=None):
+    """Persist a new task and hand it to the worker pool; returns the task id"""
+    task = Task(
+        task_type=task_type,
+        user_id=user_id,
+        name=name,
+        description=description,
+        payload=json.dumps(payload or {})
+    )
+    db.session.add(task)
+    db.session.commit()
+    task_id = task.id
+
+    app = current_app._get_current_object()
+    if _runs_inline(app):
+        if claim_task(task_id, _worker_id()):
+            execute_task(task_id)
+    else:
+        _get_pool(app).ensure_running()
+    return task_id
+
+def request_cancel(task):
+    """Cancel a pending task immediately, or ask the running worker to stop"""
+    if task.is_finished:
+        return False
+    if task.status == 'pending':
+        task.cancel_requested = True
+        _finish(task, 'cancelled', result={'message': 'Cancelled before it started.'})
+    else:
+        task.cancel_requested = True
+        db.session.commit()
+    return True
+
+def init_task_engine(app):
+    """Resume unfinished tasks (e.g. after a restart) by starting the worker pool"""
+    if _runs_inline(app):
+        return
+    try:
+        with app.app_context():
+            if has_unfinished_tasks():
+                print("🔄 Resuming unfinished background tasks...")
+                _get_pool(app).ensure_running()
+    except Exception as e:
+        print(f"⚠️  Could not check for unfinished background tasks: {e}")
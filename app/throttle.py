@@ -0,0 +1,134 @@
+"""
+Outbound request throttling for MyBibliotheca
+Per-provider concurrency caps and token-bucket rate limits, plus a small
+thread-pool helper used to fetch book metadata concurrently
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from flask import current_app
+
+# Fallbacks for providers without their own <PROVIDER>_MAX_CONCURRENCY / <PROVIDER>_RATE_LIMIT settings
+DEFAULT_MAX_CONCURRENCY = 2
+DEFAULT_RATE_LIMIT = 1.0
+
+_limiters_lock = threading.Lock()
+
+class TokenBucket:
+    """
+    Thread-safe token bucket: `rate` tokens per second, at most `capacity` banked.
+    Callers reserve a token up front and sleep outside the lock, so waiting
+    threads are served in arrival order. A rate of 0 disables limiting.
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity or max(1.0, self.rate))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Take one token, blocking until it is available; returns seconds waited"""
+        if self.rate <= 0:
+            return 0.0
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+        if wait:
+            time.sleep(wait)
+        return wait
+
+class ProviderLimiter:
+    """Caps in-flight requests to one provider and spaces them with a token bucket"""
+
+    def __init__(self, name, max_concurrency, rate):
+        self.name = name
+        self.max_concurrency = max(1, int(max_concurrency))
+        self.semaphore = threading.BoundedSemaphore(self.max_concurrency)
+        self.bucket = TokenBucket(rate, capacity=self.max_concurrency)
+        self.stats_lock = threading.Lock()
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.requests = 0
+        self.throttled_seconds = 0.0
+
+    @contextmanager
+    def slot(self):
+        """Hold one of the provider's request slots for the duration of the block"""
+        with self.semaphore:
+            waited = self.bucket.acquire()
+            with self.stats_lock:
+                self.requests += 1
+                self.throttled_seconds += waited
+                self.in_flight += 1
+                self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+            try:
+                yield
+            finally:
+                with self.stats_lock:
+                    self.in_flight -= 1
+
+    def stats(self):
+        with self.stats_lock:
+            return {
+                'max_concurrency': self.max_concurrency,
+                'rate_limit': self.bucket.rate,
+                'requests': self.requests,
+                'in_flight': self.in_flight,
+                'peak_in_flight': self.peak_in_flight,
+                'throttled_seconds': round(self.throttled_seconds, 3)
+            }
+
+def provider_concurrency(provider):
+    """Configured concurrency cap for a provider, e.g. OPENLIBRARY_MAX_CONCURRENCY"""
+    return max(1, int(current_app.config.get(f"{provider.upper()}_MAX_CONCURRENCY", DEFAULT_MAX_CONCURRENCY)))
+
+def get_limiter(provider):
+    """The app-wide limiter for a provider, created from config on first use"""
+    app = current_app._get_current_object()
+    limiters = app.extensions.setdefault('provider_limiters', {})
+    limiter = limiters.get(provider)
+    if limiter is None:
+        with _limiters_lock:
+            limiter = limiters.get(provider)
+            if limiter is None:
+                rate = float(app.config.get(f"{provider.upper()}_RATE_LIMIT", DEFAULT_RATE_LIMIT))
+                limiter = limiters[provider] = ProviderLimiter(provider, provider_concurrency(provider), rate)
+    return limiter
+
+def provider_slot(provider):
+    """
+    Context manager every outbound request to a provider should run under
+    Usage: with provider_slot('openlibrary'): http_get(...)
+    """
+    return get_limiter(provider).slot()
+
+def get_limiter_stats():
+    """Per-provider request counters for this process"""
+    limiters = current_app.extensions.get('provider_limiters', {})
+    return {name: limiter.stats() for name, limiter in sorted(limiters.items())}
+
+def map_concurrently(func, items, max_workers):
+    """
+    Apply func to every item on up to max_workers threads, preserving order.
+    Each thread runs inside the caller's app context; exceptions propagate,
+    so func should handle the errors it wants to tolerate.
+    """
+    items = list(items)
+    if max_workers <= 1 or len(items) <= 1:
+        return [func(item) for item in items]
+
+    app = current_app._get_current_object()
+
+    def run(item):
+        with app.app_context():
+            return func(item)
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(items)), thread_name_prefix='metadata-fetch') as pool:
+        return list(pool.map(run, items))
@@ -0,0 +1,71 @@
+"""
+Per-user reading statistics for MyBibliotheca
+Every counter shown on profile and activity pages comes from one aggregate query
+(conditional counts that run on any backend), cached per user in the page cache
+until one of the user's books or reading logs changes.
+"""
+
+from datetime import date, datetime
+from sqlalchemy import and_, case, func, or_, select
+from .models import db, Book, ReadingLog
+from .page_cache import cached, user_namespace
+from .streaks import compute_streaks, NO_STREAK
+
+STAT_NAMES = ('total_books', 'finished_books', 'finished_this_year', 'finished_this_month',
+              'currently_reading', 'added_this_year', 'reading_logs')
+
+def _count_if(*conditions):
+    return func.count(case((and_(*conditions), 1)))
+
+def compute_user_stats(user_id, today=None):
+    """{stat: count} for one user in a single query (see STAT_NAMES)"""
+    today = today or datetime.now().date()
+    year_start, month_start = today.replace(month=1, day=1), today.replace(day=1)
+    log_count = (select(func.count(ReadingLog.id)).where(ReadingLog.user_id == user_id)
+                 .scalar_subquery())
+    row = db.session.execute(
+        select(
+            func.count(Book.id),
+            func.count(Book.finish_date),
+            _count_if(Book.finish_date >= year_start),
+            _count_if(Book.finish_date >= month_start),
+            _count_if(Book.start_date.isnot(None), Book.finish_date.is_(None)),
+            _count_if(Book.created_at >= datetime(year_start.year, 1, 1)),
+            log_count,
+        ).where(Book.user_id == user_id)
+    ).one()
+    return dict(zip(STAT_NAMES, (value or 0 for value in row)))
+
+def get_user_stats(user_id):
+    """
+    compute_user_stats() plus current_streak/longest_streak, served from the cache
+    until the user's books or logs change (or the day does)
+    """
+    today = datetime.now().date()
+
+    def load():
+        stats = compute_user_stats(user_id, today)
+        streak = compute_streaks([user_id]).get(user_id, NO_STREAK)
+        stats.update(current_streak=streak.current, longest_streak=streak.longest)
+        return stats
+
+    return cached(user_namespace(user_id), f'stats:{today}', load)
+
+def profile_books(user_id, recent=10, include_reading=True):
+    """
+    (currently reading, `recent` latest finished) in one query: unfinished started
+    books plus finished books on or after the `recent`-th latest finish date
+    """
+    cutoff = (select(Book.finish_date)
+              .where(Book.user_id == user_id, Book.finish_date.isnot(None))
+              .order_by(Book.finish_date.desc()).limit(1).offset(recent - 1)
+              .scalar_subquery())
+    conditions = [Book.finish_date >= func.coalesce(cutoff, date.min)]
+    if include_reading:
+        conditions.append(and_(Book.start_date.isnot(None), Book.finish_date.is_(None)))
+    books = Book.query.filter(Book.user_id == user_id, or_(*conditions)).all()
+    reading = sorted((book for book in books if book.finish_date is None),
+                     key=lambda book: (book.start_date, book.id), reverse=True)
+    finished = sorted((book for book in books if book.finish_date is not None),
+                      key=lambda book: (book.finish_date, book.id), reverse=True)[:recent]
+    return reading, finished
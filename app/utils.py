@@ -1,170 +1,177 @@
-from datetime import date, timedelta, datetime
-import pytz
-from .models import ReadingLog
-from sqlalchemy import func
 import calendar
 from PIL import Image, ImageDraw, ImageFont
 from io import BytesIO
 import requests
 import os
+import functools
+import threading
+from collections import OrderedDict
 from flask import current_app
+from . import metadata_cache
+from .throttle import provider_slot, provider_concurrency, map_concurrently
+from .http_client import http_get
+
+def _parse_openlibrary_book(book):
+    """Normalise an OpenLibrary `jscmd=data` record into our book data dict"""
+    title = book.get('title', '')
+    authors = ', '.join([a['name'] for a in book.get('authors', [])])
+    cover_url = book.get('cover', {}).get('large') or book.get('cover', {}).get('medium') or book.get('cover', {}).get('small')
+
+    # Extract additional metadata
+    description = book.get('notes', {}).get('value') if isinstance(book.get('notes'), dict) else book.get('notes')
+    published_date = book.get('publish_date', '')
+    page_count = book.get('number_of_pages')
+    subjects = book.get('subjects', [])
+    categories = ', '.join([s['name'] if isinstance(s, dict) else str(s) for s in subjects[:5]])  # Limit to 5 categories
+    publishers = book.get('publishers', [])
+    publisher = publishers[0]['name'] if publishers and isinstance(publishers[0], dict) else (publishers[0] if publishers else '')
+    languages = book.get('languages', [])
+    language = languages[0]['key'].split('/')[-1] if languages and isinstance(languages[0], dict) else (languages[0] if languages else '')
+
+    return {
+        'title': title,
+        'author': authors,
+        'cover': cover_url,
+        'description': description,
+        'published_date': published_date,
+        'page_count': page_count,
+        'categories': categories,
+        'publisher': publisher,
+        'language': language
+    }
+
+def _request_openlibrary(isbns):
+    """One multi-bibkey OpenLibrary request; returns {isbn: data or None}, raises on network errors"""
+    with provider_slot('openlibrary'):
+        response = http_get(
+            current_app.config.get('OPENLIBRARY_API_URL', 'https://openlibrary.org/api/books'),
+            params={
+                'bibkeys': ','.join(f"ISBN:{isbn}" for isbn in isbns),
+                'format': 'json',
+                'jscmd': 'data'
+            }
+        )
+    response.raise_for_status()
+    data = response.json()
+
+    results = {}
+    for isbn in isbns:
+        book_key = f"ISBN:{isbn}"
+        results[isbn] = _parse_openlibrary_book(data[book_key]) if book_key in data else None
+    return results
+
+def _fetch_openlibrary(isbn):
+    """Query OpenLibrary for one ISBN; returns None if unknown, raises on network errors"""
+    return _request_openlibrary([isbn])[isbn]
+
+def _fetch_openlibrary_batch(isbns):
+    """
+    Query OpenLibrary in chunks of OPENLIBRARY_BATCH_SIZE, up to
+    OPENLIBRARY_MAX_CONCURRENCY chunks at a time; failed chunks are left out
+    """
+    batch_size = max(1, current_app.config.get('OPENLIBRARY_BATCH_SIZE', 50))
+    chunks = [isbns[start:start + batch_size] for start in range(0, len(isbns), batch_size)]
+
+    def fetch_chunk(chunk):
+        try:
+            return _request_openlibrary(chunk)
+        except (requests.exceptions.RequestException, ValueError) as e:
+            current_app.logger.warning(f"Failed to fetch book data for {len(chunk)} ISBNs: {e}")
+            return {}
+
+    results = {}
+    for chunk_results in map_concurrently(fetch_chunk, chunks, provider_concurrency('openlibrary')):
+        results.update(chunk_results)
+    return results
 
 def fetch_book_data(isbn):
     """Fetch book data with timeout and error handling"""
-    url = f"https://openlibrary.org/api/books?bibkeys=ISBN:{isbn}&format=json&jscmd=data"
     try:
-        response = requests.get(url, timeout=10)  # 10 second timeout
-        response.raise_for_status()
-        data = response.json()
-        
-        book_key = f"ISBN:{isbn}"
-        if book_key in data:
-            book = data[book_key]
-            title = book.get('title', '')
-            authors = ', '.join([a['name'] for a in book.get('authors', [])])
-            cover_url = book.get('cover', {}).get('large') or book.get('cover', {}).get('medium') or book.get('cover', {}).get('small')
-            
-            # Extract additional metadata
-            description = book.get('notes', {}).get('value') if isinstance(book.get('notes'), dict) else book.get('notes')
-            published_date = book.get('publish_date', '')
-            page_count = book.get('number_of_pages')
-            subjects = book.get('subjects', [])
-            categories = ', '.join([s['name'] if isinstance(s, dict) else str(s) for s in subjects[:5]])  # Limit to 5 categories
-            publishers = book.get('publishers', [])
-            publisher = publishers[0]['name'] if publishers and isinstance(publishers[0], dict) else (publishers[0] if publishers else '')
-            languages = book.get('languages', [])
-            language = languages[0]['key'].split('/')[-1] if languages and isinstance(languages[0], dict) else (languages[0] if languages else '')
-            
-            return {
-                'title': title,
-                'author': authors,
-                'cover': cover_url,
-                'description': description,
-                'published_date': published_date,
-                'page_count': page_count,
-                'categories': categories,
-                'publisher': publisher,
-                'language': language
-            }
-        return None
-    
+        return metadata_cache.cached_lookup('openlibrary', isbn, _fetch_openlibrary)
     except (requests.exceptions.RequestException, requests.exceptions.Timeout, ValueError) as e:
         # Log the error for debugging but don't crash the bulk import
         current_app.logger.warning(f"Failed to fetch book data for ISBN {isbn}: {e}")
         return None
 
+def fetch_books_data(isbns):
+    """
+    Fetch OpenLibrary data for many ISBNs using chunked multi-bibkey requests.
+    Returns {isbn: book data or None}; cached ISBNs are not requested again.
+    """
+    return metadata_cache.lookup_many('openlibrary', isbns, _fetch_openlibrary_batch)
+
+def _parse_google_volume(volume_info):
+    """Normalise a Google Books volumeInfo record into our book data dict"""
+    image_links = volume_info.get("imageLinks", {})
+    return {
+        'cover': image_links.get("thumbnail") or image_links.get("smallThumbnail"),
+        'title': volume_info.get('title'),
+        'author': ", ".join(volume_info.get('authors', [])),
+        'description': volume_info.get('description', ''),
+        'published_date': volume_info.get('publishedDate', ''),
+        'page_count': volume_info.get('pageCount'),
+        'categories': ', '.join(volume_info.get('categories', [])),
+        'publisher': volume_info.get('publisher', ''),
+        'language': volume_info.get('language', ''),
+        'average_rating': volume_info.get('averageRating'),
+        'rating_count': volume_info.get('ratingsCount')
+    }
+
+def _fetch_google_books(isbn):
+    """Query Google Books for one ISBN; returns None if unknown, raises on network errors"""
+    url = current_app.config.get('GOOGLE_BOOKS_API_URL', 'https://www.googleapis.com/books/v1/volumes')
+    with provider_slot('google_books'):
+        resp = http_get(url, params={'q': f"isbn:{isbn}"})
+    resp.raise_for_status()
+    items = resp.json().get("items")
+    if items:
+        return _parse_google_volume(items[0]["volumeInfo"])
+    return None
+
+def _fetch_google_books_batch(isbns):
+    """Query Google Books for many ISBNs, up to GOOGLE_BOOKS_MAX_CONCURRENCY at a time; failed lookups are left out"""
+    def fetch(isbn):
+        try:
+            return isbn, _fetch_google_books(isbn), True
+        except Exception as e:
+            current_app.logger.warning(f"Failed to fetch Google Books data for ISBN {isbn}: {e}")
+            return isbn, None, False
+
+    return {
+        isbn: data
+        for isbn, data, ok in map_concurrently(fetch, isbns, provider_concurrency('google_books'))
+        if ok
+    }
+
+def fetch_google_books_data(isbns):
+    """
+    Fetch Google Books data for many ISBNs concurrently.
+    Returns {isbn: book data or None}; cached ISBNs are not requested again.
+    """
+    return metadata_cache.lookup_many('google_books', isbns, _fetch_google_books_batch)
+
 def get_google_books_cover(isbn, fetch_title_author=False):
-    url = f"https://www.googleapis.com/books/v1/volumes?q=isbn:{isbn}"
+    # Cover and metadata share one cached Google Books lookup
     try:
-        resp = requests.get(url, timeout=5)
-        data = resp.json()
-        items = data.get("items")
-        if items:
-            volume_info = items[0]["volumeInfo"]
-            image_links = volume_info.get("imageLinks", {})
-            cover_url = image_links.get("thumbnail") or image_links.get("smallThumbnail")
-            
-            if fetch_title_author:
-                title = volume_info.get('title')
-                authors = ", ".join(volume_info.get('authors', []))
-                description = volume_info.get('description', '')
-                published_date = volume_info.get('publishedDate', '')
-                page_count = volume_info.get('pageCount')
-                categories = ', '.join(volume_info.get('categories', []))
-                publisher = volume_info.get('publisher', '')
-                language = volume_info.get('language', '')
-                average_rating = volume_info.get('averageRating')
-                rating_count = volume_info.get('ratingsCount')
-                
-                return {
-                    'cover': cover_url,
-                    'title': title,
-                    'author': authors,
-                    'description': description,
-                    'published_date': published_date,
-                    'page_count': page_count,
-                    'categories': categories,
-                    'publisher': publisher,
-                    'language': language,
-                    'average_rating': average_rating,
-                    'rating_count': rating_count
-                }
-            return cover_url
+        data = metadata_cache.cached_lookup('google_books', isbn, _fetch_google_books)
     except Exception:
-        pass
+        data = None
+    if not data:
+        return None
     if fetch_title_author:
-        return None # Or return a dict with None values if preferred
-    return None
+        return data
+    return data.get('cover')
 
 def format_date(date):
     return date.strftime("%Y-%m-%d") if date else None
 
 def calculate_reading_streak(user_id, streak_offset=0):
     """
-    Calculate reading streak for a specific user with foolproof logic
+    Calculate reading streak for a specific user, plus their offset
+    Reads the materialized streak (see app.streaks) instead of walking every log
     """
-    # Get all unique dates with reading logs for this user, sorted descending
-    dates = (
-        ReadingLog.query
-        .filter_by(user_id=user_id)
-        .with_entities(ReadingLog.date)
-        .distinct()
-        .order_by(ReadingLog.date.desc())
-        .all()
-    )
-    
-    if not dates:
-        return streak_offset
-    
-    # Convert to list of date objects
-    log_dates = [d[0] for d in dates if d[0] is not None]
-    
-    if not log_dates:
-        return streak_offset
-    
-    # Sort in descending order (most recent first)
-    log_dates.sort(reverse=True)
-    
-    # Use configured timezone to get "today"
-    from flask import current_app
-    import pytz
-    timezone = pytz.timezone(current_app.config.get('TIMEZONE', 'UTC'))
-    today = datetime.now(timezone).date()
-    
-    streak = 0
-    
-    # Check if there's a log for today or yesterday
-    # (allow for timezone differences and late logging)
-    most_recent = log_dates[0]
-    days_since_recent = (today - most_recent).days
-    
-    # If the most recent log is more than 1 day old, streak is broken
-    if days_since_recent > 1:
-        return streak_offset
-    
-    # Start counting the streak
-    current_date = most_recent
-    
-    for log_date in log_dates:
-        # If this date continues the streak (same day or previous day)
-        if log_date == current_date:
-            streak += 1
-            current_date = current_date - timedelta(days=1)
-        else:
-            # Check if there's a gap
-            days_gap = (current_date - log_date).days
-            if days_gap == 0:
-                # Same date, skip (already counted)
-                continue
-            elif days_gap == 1:
-                # Previous day, continue streak
-                streak += 1
-                current_date = log_date - timedelta(days=1)
-            else:
-                # Gap found, streak ends
-                break
-    
-    return streak + streak_offset
+    from .streaks import current_streak
+    return current_streak(user_id) + (streak_offset or 0)
 
 def get_reading_streak(timezone=None):
     """
@@ -176,82 +183,121 @@ def get_reading_streak(timezone=None):
         return 0
     return current_user.get_reading_streak()
 
+# Month review renderer state, per process. The background and fonts are decoded
+# once; finished JPEGs are kept per (user, year, month) alongside a fingerprint of
+# that month's books, so a changed finish date, cover or book list re-renders.
+_MONTH_REVIEW_SIZE = 1080
+_month_reviews = OrderedDict()
+_month_reviews_lock = threading.Lock()
+
+@functools.lru_cache(maxsize=4)
+def _month_review_background(img_size):
+    bg_path = os.path.abspath(os.path.join(os.path.dirname(__file__), 'static', 'bookshelf.png'))
+    try:
+        return Image.open(bg_path).convert('RGBA').resize((img_size, img_size))
+    except Exception as e:
+        print(f"⚠️ Failed to load bookshelf background: {e}")
+        return Image.new('RGBA', (img_size, img_size), (255, 230, 200, 255))
+
+@functools.lru_cache(maxsize=64)
+def _month_review_font(size):
+    font_path = "/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf"
+    if not os.path.exists(font_path):
+        font_path = os.path.join(os.path.dirname(__file__), "static", "Arial.ttf")
+    try:
+        return ImageFont.truetype(font_path, size)
+    except Exception as e:
+        print(f"⚠️ Font load failed: {e}")
+        return ImageFont.load_default()
+
+@functools.lru_cache(maxsize=64)
+def _fit_month_title(text, max_width):
+    """The largest title font (stepping down by 10pt from 220) that fits, and the text width"""
+    font_size = 220
+    while True:
+        font = _month_review_font(font_size)
+        bbox = font.getbbox(text)
+        w = bbox[2] - bbox[0]
+        if w <= max_width or font_size <= 20:
+            return font, w
+        font_size -= 10
+
 def generate_month_review_image(books, month, year):
-    import calendar
-    from PIL import Image, ImageDraw, ImageFont
-    from io import BytesIO
-    import requests
-    import os
+    from .covers import load_covers
 
-    img_size = 1080
+    img_size = _MONTH_REVIEW_SIZE
     cols = 4
     cover_w, cover_h = 200, 300
     padding = 30
     # Increase title_height to give more space for the text
     title_height = 220
     grid_w = cols * cover_w + (cols - 1) * padding
-    rows = ((len(books) - 1) // cols) + 1 if books else 1
-    grid_h = rows * cover_h + (rows - 1) * padding
     # Move grid lower to avoid overlap
     grid_top = title_height + 40
     grid_left = (img_size - grid_w) // 2
 
-    # Try bookshelf background
-    bg_path = os.path.abspath(os.path.join(os.path.dirname(__file__), 'static', 'bookshelf.png'))
-    print("Looking for bookshelf background at:", bg_path)
-    try:
-        bg = Image.open(bg_path).convert('RGBA').resize((img_size, img_size))
-        print("Bookshelf background loaded!")
-    except Exception as e:
-        print("Failed to load bookshelf background:", e)
-        bg = Image.new('RGBA', (img_size, img_size), (255, 230, 200, 255))
-
+    # Bookshelf background, decoded once per process
+    bg = _month_review_background(img_size).copy()
     draw = ImageDraw.Draw(bg)
 
     # Draw month title in white
     month_name = f"{calendar.month_name[month].upper()} {year}"
     max_width = img_size - 80  # 40px margin on each side
-    font_size = 220
-    font_path = "/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf"
-    if not os.path.exists(font_path):
-        font_path = os.path.join(os.path.dirname(__file__), "static", "Arial.ttf")
-    while font_size > 10:
-        try:
-            font = ImageFont.truetype(font_path, font_size)
-        except Exception as e:
-            print("Font load failed:", e)
-            font = ImageFont.load_default()
-        bbox = draw.textbbox((0, 0), month_name, font=font)
-        w, h = bbox[2] - bbox[0], bbox[3] - bbox[1]
-        if w <= max_width:
-            break
-        font_size -= 10
+    font, w = _fit_month_title(month_name, max_width)
     shadow_offset = 4
     # Draw shadow for readability
     draw.text(((img_size - w) // 2 + shadow_offset, 40 + shadow_offset), month_name, fill=(0,0,0,128), font=font)
     # Draw main text in white
     draw.text(((img_size - w) // 2, 40), month_name, fill=(255, 255, 255), font=font)
 
-    # Place covers
-    for idx, book in enumerate(books):
+    # Covers come from the local store; any not stored yet are downloaded concurrently
+    covers = load_covers([getattr(book, 'cover_url', None) for book in books], 'medium')
+    for idx, cover in enumerate(covers):
         row = idx // cols
         col = idx % cols
         x = grid_left + col * (cover_w + padding)
         y = grid_top + row * (cover_h + padding)
-        cover_url = getattr(book, 'cover_url', None)
-        try:
-            if cover_url:
-                r = requests.get(cover_url, timeout=10)
-                cover = Image.open(BytesIO(r.content)).convert("RGBA")
-                cover = cover.resize((cover_w, cover_h))
-            else:
-                raise Exception("No cover")
-        except Exception:
+        if cover is None:
             cover = Image.new('RGBA', (cover_w, cover_h), (220, 220, 220, 255))
-        bg.paste(cover, (x, y), cover if cover.mode == 'RGBA' else None)
+        else:
+            cover = cover.convert("RGBA").resize((cover_w, cover_h))
+        bg.paste(cover, (x, y), cover)
 
     return bg.convert('RGB')
 
+def _month_review_fingerprint(books):
+    return tuple((book.id, book.finish_date, book.cover_url) for book in books)
+
+def render_month_review(user_id, books, month, year):
+    """
+    JPEG bytes of a user's month review, reused while the month's finished books
+    (and their finish dates and covers) are unchanged
+    """
+    books = sorted(books, key=lambda book: (book.finish_date, book.id))
+    key = (user_id, year, month)
+    fingerprint = _month_review_fingerprint(books)
+    with _month_reviews_lock:
+        cached = _month_reviews.get(key)
+        if cached is not None and cached[0] == fingerprint:
+            _month_reviews.move_to_end(key)
+            return cached[1]
+
+    buf = BytesIO()
+    generate_month_review_image(books, month, year).save(buf, format='JPEG')
+    data = buf.getvalue()
+
+    limit = current_app.config.get('MONTH_REVIEW_CACHE_SIZE', 64)
+    with _month_reviews_lock:
+        _month_reviews[key] = (fingerprint, data)
+        _month_reviews.move_to_end(key)
+        while len(_month_reviews) > limit:
+            _month_reviews.popitem(last=False)
+    return data
+
+def clear_month_review_cache():
+    with _month_reviews_lock:
+        _month_reviews.clear()
+
 def ensure_https_url(url):
     """Convert HTTP URLs to HTTPS for better security and compatibility."""
     if url and url.startswith('http://'):
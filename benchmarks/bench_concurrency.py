@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Benchmark read throughput under concurrent writes: default SQLite settings vs. tuned pragmas
+
+Seeds a throwaway database with --logs reading logs, then runs --readers reader
+processes (per-user log count plus the ten most recent logs, like a profile
+page) against --writers writer processes (one reading log per transaction, like
+log_reading) for --seconds, first with SQLite's defaults (rollback journal) and
+then with the pragmas app/database.py applies, reporting operations per second
+and "database is locked" failures.
+
+Usage: python benchmarks/bench_concurrency.py [--readers 4] [--writers 2] [--seconds 10] [--logs 200000]
+"""
+
+import argparse
+import multiprocessing
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+USERS = 100
+
+def seed(path, logs):
+    from sqlalchemy import create_engine
+    from app.models import db, ReadingLog
+    engine = create_engine(f'sqlite:///{path}')
+    db.metadata.create_all(engine, tables=[ReadingLog.__table__])
+    rng = random.Random(42)
+    start = date.today() - timedelta(days=3650)
+    with engine.begin() as conn:
+        for offset in range(0, logs, 50000):
+            conn.execute(ReadingLog.__table__.insert(), [
+                {'book_id': n // USERS + 1, 'user_id': n % USERS + 1, 'date': start + timedelta(days=rng.randint(0, 3650))}
+                for n in range(offset, min(offset + 50000, logs))
+            ])
+    engine.dispose()
+
+def worker(role, path, tuned, seconds, results):
+    from sqlalchemy import create_engine, func, select
+    from sqlalchemy.exc import OperationalError
+    from app.database import configure_engine
+    from app.models import ReadingLog
+    from config import Config
+
+    engine = create_engine(f'sqlite:///{path}')
+    if tuned:
+        configure_engine(engine, {name: getattr(Config, name) for name in dir(Config) if name.startswith('SQLITE_')})
+    rng = random.Random(os.getpid())
+    ops = errors = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        user_id = rng.randint(1, USERS)
+        try:
+            if role == 'reader':
+                with engine.connect() as conn:
+                    conn.execute(select(func.count(ReadingLog.id)).where(ReadingLog.user_id == user_id)).scalar()
+                    conn.execute(select(ReadingLog.date).where(ReadingLog.user_id == user_id)
+                                 .order_by(ReadingLog.date.desc()).limit(10)).all()
+            else:
+                with engine.begin() as conn:
+                    # A fresh book per write keeps (user, book, date) unique
+                    conn.execute(ReadingLog.__table__.insert(), {'book_id': os.getpid() * 10**7 + ops, 'user_id': user_id, 'date': date.today()})
+            ops += 1
+        except OperationalError:
+            errors += 1
+    engine.dispose()
+    results.put((role, ops, errors))
+
+def run(path, tuned, readers, writers, seconds):
+    results = multiprocessing.Queue()
+    processes = [multiprocessing.Process(target=worker, args=(role, path, tuned, seconds, results))
+                 for role in ['reader'] * readers + ['writer'] * writers]
+    for process in processes:
+        process.start()
+    totals = {'reader': [0, 0], 'writer': [0, 0]}
+    for _ in processes:
+        role, ops, errors = results.get()
+        totals[role][0] += ops
+        totals[role][1] += errors
+    for process in processes:
+        process.join()
+    return totals
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--readers', type=int, default=4, help='reader processes')
+    parser.add_argument('--writers', type=int, default=2, help='writer processes')
+    parser.add_argument('--seconds', type=float, default=10, help='duration of each run')
+    parser.add_argument('--logs', type=int, default=200000, help='reading logs to seed')
+    args = parser.parse_args()
+
+    # Throwaway databases so the benchmark never touches the real one; WAL mode sticks to a file
+    workdir = tempfile.mkdtemp()
+    try:
+        seeded = os.path.join(workdir, 'seed.db')
+        seed(seeded, args.logs)
+        print(f"\nSeeded {args.logs} reading logs; {args.readers} readers vs {args.writers} writers for {args.seconds:g}s each")
+        print(f"{'settings':<12}{'reads/s':>10}{'writes/s':>10}{'locked':>8}")
+        baseline = None
+        for label, tuned in (('default', False), ('tuned', True)):
+            path = os.path.join(workdir, f'{label}.db')
+            shutil.copy(seeded, path)
+            totals = run(path, tuned, args.readers, args.writers, args.seconds)
+            reads = totals['reader'][0] / args.seconds
+            writes = totals['writer'][0] / args.seconds
+            locked = totals['reader'][1] + totals['writer'][1]
+            speedup = f"   {reads / baseline:.1f}x reads" if baseline else ''
+            print(f"{label:<12}{reads:>10.0f}{writes:>10.0f}{locked:>8}{speedup}")
+            baseline = baseline or reads
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Benchmark CSV ingestion: whole-file decode vs. the streaming reader
+
+Writes a Goodreads-style export of about --size-mb megabytes (long review
+columns, like real exports) and measures the time and peak Python memory of
+reading every importable row the old way, with the upload read, decoded and
+split into lines up front, against counting and batching the rows through
+read_goodreads_rows(). Both must yield the same number of rows.
+
+Usage: python benchmarks/bench_import.py [--size-mb 100] [--batch-size 50]
+"""
+
+import argparse
+import csv
+import io
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+HEADER = ['Book Id', 'Title', 'Author', 'ISBN', 'ISBN13', 'Date Read', 'Bookshelves', 'My Review']
+
+def write_export(path, size_mb):
+    review = 'A long and thoughtful review. ' * 60
+    rows = 0
+    with open(path, 'w', encoding='utf-8-sig', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(HEADER)
+        while f.tell() < size_mb * 1024 * 1024:
+            writer.writerow([rows, f'Book {rows}', f'Author {rows % 1000}', f'="{rows:010d}"',
+                             f'="978{rows:010d}"', '2024/01/15', 'read' if rows % 3 else 'to-read', review])
+            rows += 1
+    return rows
+
+def whole_file(path):
+    from app.importers import clean_isbn
+    with open(path, 'rb') as f:
+        lines = f.read().decode('utf-8-sig').splitlines()
+    rows = [(row['Title'], row['Author'], clean_isbn(row['ISBN13']) or clean_isbn(row['ISBN']))
+            for row in csv.DictReader(io.StringIO('\n'.join(lines)))]
+    return len(rows)
+
+def streaming(path, batch_size):
+    from app.importers import batched, read_goodreads_rows
+    total = sum(1 for _ in read_goodreads_rows(path))
+    seen = 0
+    for chunk in batched(read_goodreads_rows(path), batch_size):
+        seen += len(chunk)
+    assert seen == total
+    return seen
+
+def measure(label, func, *args):
+    tracemalloc.start()
+    start = time.perf_counter()
+    rows = func(*args)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print(f"  {label:<12} {rows:>9} rows  {elapsed:7.2f}s  peak {peak / 1024 / 1024:8.1f} MB")
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--size-mb', type=int, default=100, help='approximate size of the generated export')
+    parser.add_argument('--batch-size', type=int, default=50, help='rows per downstream batch')
+    args = parser.parse_args()
+
+    fd, path = tempfile.mkstemp(suffix='.csv')
+    os.close(fd)
+    try:
+        rows = write_export(path, args.size_mb)
+        print(f"\nGoodreads export: {rows} rows, {os.path.getsize(path) / 1024 / 1024:.1f} MB")
+        expected = measure('whole file', whole_file, path)
+        assert measure('streaming', streaming, path, args.batch_size) == expected
+    finally:
+        os.remove(path)
+
+if __name__ == '__main__':
+    main()
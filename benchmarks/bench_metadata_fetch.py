@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Benchmark concurrent metadata fetching against a local fake provider
+
+Starts an HTTP server that answers like OpenLibrary and Google Books after an
+injected delay, then times fetch_books_data / fetch_google_books_data for a
+range of concurrency settings. The metadata cache is disabled so every run
+goes over the wire.
+
+Usage: python benchmarks/bench_metadata_fetch.py [--isbns 48] [--latency 0.2] [--concurrency 1,2,4,8]
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def start_fake_provider(latency):
+    """Serve /api/books (multi-bibkey) and /books/v1/volumes after `latency` seconds"""
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            time.sleep(latency)
+            url = urlparse(self.path)
+            query = parse_qs(url.query)
+            if url.path == '/api/books':
+                body = {
+                    key: {'title': f'Book {key}', 'authors': [{'name': 'Bench Author'}]}
+                    for key in query['bibkeys'][0].split(',')
+                }
+            else:
+                isbn = query['q'][0].split(':', 1)[1]
+                body = {'items': [{'volumeInfo': {'title': f'Book {isbn}', 'authors': ['Bench Author']}}]}
+            payload = json.dumps(body).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def run(app, fetch, isbns, provider, concurrency, rate):
+    app.config[f'{provider.upper()}_MAX_CONCURRENCY'] = concurrency
+    app.config[f'{provider.upper()}_RATE_LIMIT'] = rate
+    app.extensions.pop('provider_limiters', None)  # rebuild limiters from the new settings
+    start = time.perf_counter()
+    results = fetch(isbns)
+    elapsed = time.perf_counter() - start
+    assert all(results.get(isbn) for isbn in isbns), "fake provider returned incomplete results"
+    return elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--isbns', type=int, default=48, help='ISBNs per run')
+    parser.add_argument('--latency', type=float, default=0.2, help='injected provider latency in seconds')
+    parser.add_argument('--concurrency', default='1,2,4,8', help='comma separated concurrency caps to compare')
+    parser.add_argument('--rate', type=float, default=0, help='requests per second per provider (0 = unlimited)')
+    parser.add_argument('--batch-size', type=int, default=4, help='ISBNs per OpenLibrary request')
+    args = parser.parse_args()
+
+    # Throwaway database so the benchmark never touches the real one
+    db_fd, db_path = tempfile.mkstemp(suffix='.db')
+    os.environ['DATABASE_URL'] = f'sqlite:///{db_path}'
+    from app import create_app
+    from app.utils import fetch_books_data, fetch_google_books_data
+
+    server = start_fake_provider(args.latency)
+    base_url = f'http://127.0.0.1:{server.server_port}'
+    app = create_app()
+    app.config.update({
+        'METADATA_CACHE_ENABLED': False,
+        'OPENLIBRARY_API_URL': f'{base_url}/api/books',
+        'OPENLIBRARY_BATCH_SIZE': args.batch_size,
+        'GOOGLE_BOOKS_API_URL': f'{base_url}/books/v1/volumes',
+    })
+
+    isbns = [f'978{n:010d}' for n in range(args.isbns)]
+    levels = [int(level) for level in args.concurrency.split(',')]
+    providers = [
+        ('openlibrary', fetch_books_data),
+        ('google_books', fetch_google_books_data),
+    ]
+
+    print(f"\n{args.isbns} ISBNs, {args.latency * 1000:.0f} ms latency, rate limit {args.rate or 'off'}")
+    print(f"{'provider':<14}{'concurrency':>12}{'seconds':>10}{'ISBNs/s':>10}{'speedup':>10}")
+    try:
+        with app.app_context():
+            for provider, fetch in providers:
+                baseline = None
+                for level in levels:
+                    elapsed = run(app, fetch, isbns, provider, level, args.rate)
+                    baseline = baseline or elapsed
+                    print(f"{provider:<14}{level:>12}{elapsed:>10.2f}{args.isbns / elapsed:>10.1f}{baseline / elapsed:>9.1f}x")
+    finally:
+        server.shutdown()
+        os.close(db_fd)
+        os.unlink(db_path)
+
+if __name__ == '__main__':
+    main()
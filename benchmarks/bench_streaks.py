@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Benchmark streak computation: one gaps-and-islands query vs. a per-user loop
+
+Seeds a throwaway database with --users users and --logs reading logs spread
+over them (runs of consecutive days broken by random gaps), then times
+compute_streaks() for everyone against the old approach of one distinct-dates
+query plus a Python walk per user, and checks both agree.
+
+Usage: python benchmarks/bench_streaks.py [--users 1000] [--logs 1000000]
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def seed(db, User, Book, ReadingLog, users, logs):
+    rng = random.Random(42)
+    db.session.execute(User.__table__.insert(), [
+        {'username': f'reader{n}', 'email': f'reader{n}@example.com', 'password_hash': '-',
+         'is_active': True, 'is_admin': False}
+        for n in range(users)
+    ])
+    user_ids = [uid for (uid,) in db.session.query(User.id).order_by(User.id)]
+    db.session.execute(Book.__table__.insert(), [
+        {'uid': f'b{uid}', 'title': 'Book', 'author': 'Author', 'isbn': '9780000000000', 'user_id': uid}
+        for uid in user_ids
+    ])
+    books = dict(db.session.query(Book.user_id, Book.id))
+
+    per_user = logs // users
+    start = date.today() - timedelta(days=per_user * 2)
+    rows = []
+    for uid in user_ids:
+        day = start
+        for _ in range(per_user):
+            rows.append({'book_id': books[uid], 'user_id': uid, 'date': day})
+            day += timedelta(days=1 if rng.random() < 0.9 else rng.randint(2, 4))
+        if len(rows) >= 50000:
+            db.session.execute(ReadingLog.__table__.insert(), rows)
+            rows = []
+    if rows:
+        db.session.execute(ReadingLog.__table__.insert(), rows)
+    db.session.commit()
+    return user_ids
+
+def per_user_loop(db, ReadingLog, user_ids):
+    from app.streaks import compute_streak
+    results = {}
+    for uid in user_ids:
+        dates = [day for (day,) in db.session.query(ReadingLog.date).filter_by(user_id=uid).distinct().order_by(ReadingLog.date)]
+        results[uid] = compute_streak(dates)
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=1000, help='users to seed')
+    parser.add_argument('--logs', type=int, default=1000000, help='reading logs to seed (spread evenly)')
+    args = parser.parse_args()
+
+    # Throwaway database so the benchmark never touches the real one
+    db_fd, db_path = tempfile.mkstemp(suffix='.db')
+    os.environ['DATABASE_URL'] = f'sqlite:///{db_path}'
+    from app import create_app
+    from app.models import db, User, Book, ReadingLog
+    from app.streaks import compute_streaks
+
+    app = create_app()
+    try:
+        with app.app_context():
+            start = time.perf_counter()
+            user_ids = seed(db, User, Book, ReadingLog, args.users, args.logs)
+            print(f"\nSeeded {args.users} users / {args.logs} logs in {time.perf_counter() - start:.1f}s")
+
+            start = time.perf_counter()
+            looped = per_user_loop(db, ReadingLog, user_ids)
+            loop_seconds = time.perf_counter() - start
+
+            start = time.perf_counter()
+            batched = compute_streaks()
+            batch_seconds = time.perf_counter() - start
+
+            mismatches = [uid for uid in user_ids
+                          if (batched[uid].run_length, batched[uid].last_log_date, batched[uid].longest) != looped[uid]]
+            assert not mismatches, f"results differ for {len(mismatches)} users"
+
+            subset = user_ids[:20]
+            start = time.perf_counter()
+            compute_streaks(subset)
+            subset_seconds = time.perf_counter() - start
+
+            print(f"{'method':<28}{'seconds':>10}")
+            print(f"{'per-user loop':<28}{loop_seconds:>10.2f}")
+            print(f"{'window query (all users)':<28}{batch_seconds:>10.2f}   {loop_seconds / batch_seconds:.1f}x faster")
+            print(f"{'window query (20 users)':<28}{subset_seconds:>10.3f}")
+    finally:
+        os.close(db_fd)
+        os.unlink(db_path)
+
+if __name__ == '__main__':
+    main()
@@ -38,11 +38,91 @@ class Config:
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or f"sqlite:///{DATABASE_PATH}"
     SQLALCHEMY_TRACK_MODIFICATIONS = False
 
+    # SQLite connection tuning for several workers sharing one file (see app/database.py)
+    SQLITE_WAL = os.environ.get('SQLITE_WAL', 'true').lower() in ['true', 'on', '1']  # readers don't wait for writers
+    SQLITE_BUSY_TIMEOUT = int(os.environ.get('SQLITE_BUSY_TIMEOUT', 5000))  # ms to wait for a lock before "database is locked"
+    SQLITE_SYNCHRONOUS = os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL')  # NORMAL is durable in WAL mode except on power loss
+    SQLITE_MMAP_SIZE = int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))  # bytes of the file memory-mapped
+    SQLITE_CACHE_SIZE_KB = int(os.environ.get('SQLITE_CACHE_SIZE_KB', 16384))  # page cache per connection
+    SQLITE_CHECKPOINT_INTERVAL = int(os.environ.get('SQLITE_CHECKPOINT_INTERVAL', 300))  # seconds between WAL checkpoints; 0 disables
+
     # External APIs
     ISBN_API_KEY = os.environ.get('ISBN_API_KEY') or 'your_isbn_api_key'
+
+    # Book metadata providers
+    OPENLIBRARY_API_URL = os.environ.get('OPENLIBRARY_API_URL', 'https://openlibrary.org/api/books')
+    OPENLIBRARY_BATCH_SIZE = int(os.environ.get('OPENLIBRARY_BATCH_SIZE', 50))  # ISBNs per multi-bibkey request
+    GOOGLE_BOOKS_API_URL = os.environ.get('GOOGLE_BOOKS_API_URL', 'https://www.googleapis.com/books/v1/volumes')
+    # Provider order per field when merging metadata ("default" applies to fields not listed)
+    METADATA_PRECEDENCE = os.environ.get(
+        'METADATA_PRECEDENCE',
+        'default=openlibrary,google_books;cover=google_books,openlibrary;description=google_books,openlibrary'
+    )
+
+    # Shared HTTP client (pooled keep-alive connections for all provider calls)
+    HTTP_POOL_CONNECTIONS = int(os.environ.get('HTTP_POOL_CONNECTIONS', 10))  # hosts kept in the pool
+    HTTP_POOL_MAXSIZE = int(os.environ.get('HTTP_POOL_MAXSIZE', 10))  # connections per host
+    HTTP_CONNECT_TIMEOUT = float(os.environ.get('HTTP_CONNECT_TIMEOUT', 5))
+    HTTP_READ_TIMEOUT = float(os.environ.get('HTTP_READ_TIMEOUT', 10))
+    HTTP_MAX_RETRIES = int(os.environ.get('HTTP_MAX_RETRIES', 2))  # on connection errors, 429 and 5xx
+    HTTP_RETRY_BACKOFF = float(os.environ.get('HTTP_RETRY_BACKOFF', 0.5))  # exponential backoff factor in seconds
+
+    # Outbound request limits per provider (requests in flight, requests per second; 0 = unlimited rate)
+    OPENLIBRARY_MAX_CONCURRENCY = int(os.environ.get('OPENLIBRARY_MAX_CONCURRENCY', 2))
+    OPENLIBRARY_RATE_LIMIT = float(os.environ.get('OPENLIBRARY_RATE_LIMIT', 2))
+    GOOGLE_BOOKS_MAX_CONCURRENCY = int(os.environ.get('GOOGLE_BOOKS_MAX_CONCURRENCY', 4))
+    GOOGLE_BOOKS_RATE_LIMIT = float(os.environ.get('GOOGLE_BOOKS_RATE_LIMIT', 5))
+    COVERS_MAX_CONCURRENCY = int(os.environ.get('COVERS_MAX_CONCURRENCY', 4))  # cover image downloads, any host
+    COVERS_RATE_LIMIT = float(os.environ.get('COVERS_RATE_LIMIT', 20))
+
+    # Metadata cache (shared by all workers through the app database)
+    METADATA_CACHE_ENABLED = os.environ.get('METADATA_CACHE_ENABLED', 'true').lower() in ['true', 'on', '1']
+    METADATA_CACHE_TTL = int(os.environ.get('METADATA_CACHE_TTL', 86400 * 30))  # 30 days
+    METADATA_CACHE_NEGATIVE_TTL = int(os.environ.get('METADATA_CACHE_NEGATIVE_TTL', 86400))  # 1 day for "not found"
+    METADATA_CACHE_STALE_TTL = int(os.environ.get('METADATA_CACHE_STALE_TTL', 86400 * 7))  # serve stale while refreshing
+
+    # Local cover store (covers downloaded once, served with thumbnails from our own origin)
+    COVER_STORE = os.environ.get('COVER_STORE', os.path.join(data_dir, 'covers'))
+    COVER_MAX_BYTES = int(os.environ.get('COVER_MAX_BYTES', 5 * 1024 * 1024))
+    COVER_CACHE_MAX_AGE = int(os.environ.get('COVER_CACHE_MAX_AGE', 86400 * 365))  # browser cache lifetime
+    COVER_RETRY_AFTER = int(os.environ.get('COVER_RETRY_AFTER', 86400))  # retry failed downloads after a day
+    COVER_JPEG_QUALITY = int(os.environ.get('COVER_JPEG_QUALITY', 85))
+    COVER_FETCH_CONCURRENCY = int(os.environ.get('COVER_FETCH_CONCURRENCY', 8))  # parallel downloads for bulk renders
+    COVER_FETCH_WORKERS = int(os.environ.get('COVER_FETCH_WORKERS', 2))  # background download threads per process; 0 = inline
+    COVER_ALLOW_PRIVATE_HOSTS = os.environ.get('COVER_ALLOW_PRIVATE_HOSTS', 'false').lower() in ['true', 'on', '1']  # allow LAN/localhost cover URLs
+    MONTH_REVIEW_CACHE_SIZE = int(os.environ.get('MONTH_REVIEW_CACHE_SIZE', 64))  # rendered month reviews kept per process
+
+    # Community pages
+    ACTIVE_READERS_PER_PAGE = int(os.environ.get('ACTIVE_READERS_PER_PAGE', 25))
+    COMMUNITY_FEED_PAGE_SIZE = int(os.environ.get('COMMUNITY_FEED_PAGE_SIZE', 30))  # events per feed page
+    PUBLIC_LIBRARY_PAGE_SIZE = int(os.environ.get('PUBLIC_LIBRARY_PAGE_SIZE', 48))  # books per public library page
+
+    # Shared page cache (community and public library fragments, same for every viewer)
+    PAGE_CACHE_ENABLED = os.environ.get('PAGE_CACHE_ENABLED', 'true').lower() in ['true', 'on', '1']
+    PAGE_CACHE_TTL = int(os.environ.get('PAGE_CACHE_TTL', 60))  # seconds; changes invalidate sooner
+    PAGE_CACHE_SIZE = int(os.environ.get('PAGE_CACHE_SIZE', 256))  # entries kept per process
+    PAGE_CACHE_SHARED_PATH = os.environ.get('PAGE_CACHE_SHARED_PATH', '')  # SQLite file shared by workers; empty = per process only
+    
+    # Admin system statistics snapshots
+    STATS_SNAPSHOT_INTERVAL = int(os.environ.get('STATS_SNAPSHOT_INTERVAL', 300))  # seconds between snapshots; 0 = on every read
+    STATS_HISTORY_DAYS = int(os.environ.get('STATS_HISTORY_DAYS', 30))  # snapshots kept for the history charts
     
+    # Database backups (SQLite online backup API)
+    BACKUP_DIR = os.environ.get('BACKUP_DIR', '')  # empty = backups/ next to the database
+    BACKUP_COMPRESSION = os.environ.get('BACKUP_COMPRESSION', 'none')  # none, gzip or zstd (needs zstandard)
+    BACKUP_KEEP = int(os.environ.get('BACKUP_KEEP', 10))  # newest backups kept; 0 keeps all
+    BACKUP_PAGES_PER_STEP = int(os.environ.get('BACKUP_PAGES_PER_STEP', 1024))  # pages copied per backup step
+    BACKUP_STEP_PAUSE = float(os.environ.get('BACKUP_STEP_PAUSE', 0.0))  # seconds between steps, lets writers in
+
+    # Background tasks (imports run in a worker pool outside the request cycle)
+    UPLOAD_FOLDER = os.path.join(data_dir, 'uploads')
+    TASK_WORKERS = int(os.environ.get('TASK_WORKERS', 2))  # threads per process, 0 runs tasks inline
+    TASK_POLL_INTERVAL = float(os.environ.get('TASK_POLL_INTERVAL', 2))  # seconds between queue polls
+    TASK_STALE_AFTER = int(os.environ.get('TASK_STALE_AFTER', 300))  # requeue running tasks without heartbeat
+
     # Application settings
     TIMEZONE = os.environ.get('TIMEZONE') or 'UTC'
+    LIBRARY_PAGE_SIZE = int(os.environ.get('LIBRARY_PAGE_SIZE', 48))  # books per library page
     
     # Authentication settings
     REMEMBER_COOKIE_DURATION = 86400 * 7  # 7 days
@@ -1,6 +1,8 @@
 import pytest
 import os
 import tempfile
+from contextlib import contextmanager
+from sqlalchemy import event
 from app import create_app
 from app.models import db, User, Book, ReadingLog
 
@@ -10,10 +12,10 @@ def app():
     # Create a temporary file to isolate the test database
     db_fd, db_path = tempfile.mkstemp()
     
-    app = create_app()
-    app.config.update({
+    app = create_app({
         "TESTING": True,
         "SQLALCHEMY_DATABASE_URI": f"sqlite:///{db_path}",
+        "SQLITE_CHECKPOINT_INTERVAL": 0,  # No checkpointer thread outliving the temporary database
         "WTF_CSRF_ENABLED": False,  # Disable CSRF for testing
         "SECRET_KEY": "test-secret-key"
     })
@@ -26,6 +28,24 @@ def app():
     os.close(db_fd)
     os.unlink(db_path)
 
+@pytest.fixture
+def statement_recorder():
+    """Context manager collecting the SQL of every statement the app's engine runs inside the block."""
+    @contextmanager
+    def record():
+        statements = []
+
+        def listener(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        engine = db.engine
+        event.listen(engine, 'before_cursor_execute', listener)
+        try:
+            yield statements
+        finally:
+            event.remove(engine, 'before_cursor_execute', listener)
+    return record
+
 @pytest.fixture
 def client(app):
     """A test client for the app."""
@@ -0,0 +1,149 @@
+import pytest
+from datetime import date, datetime, timedelta
+from app.models import db, User, Book, ReadingLog, ActivityEvent
+from app.activity import feed_page, feed_counts, rebuild_activity_feed
+
+PASSWORD = 'Act1vity#Password'
+
+@pytest.fixture
+def sharer(app):
+    """A user sharing everything, with one book."""
+    with app.app_context():
+        user = User(username='sharer', email='sharer@test.com', is_active=True)
+        user.set_password(PASSWORD)
+        db.session.add(user)
+        db.session.commit()
+        db.session.add(Book(title='Shared Book', author='Author', isbn='9780000000001', user_id=user.id))
+        db.session.commit()
+        return user.id
+
+def events(**match):
+    return sorted((e.kind, e.event_date, e.visible) for e in ActivityEvent.query.filter_by(**match).populate_existing())
+
+def snapshot():
+    return sorted((e.user_id, e.book_id, e.kind, e.event_date, e.visible) for e in ActivityEvent.query.populate_existing())
+
+class TestActivityFeed:
+    """Test the materialized community activity feed."""
+
+    def test_book_dates_and_logs_append_events(self, app, sharer):
+        with app.app_context():
+            book = Book.query.filter_by(user_id=sharer).one()
+            book.start_date = date(2024, 5, 1)
+            db.session.commit()
+            db.session.add(ReadingLog(book_id=book.id, user_id=sharer, date=date(2024, 5, 2)))
+            book.finish_date = date(2024, 5, 3)
+            db.session.commit()
+            assert events(book_id=book.id) == [('finished', date(2024, 5, 3), True),
+                                               ('logged', date(2024, 5, 2), True),
+                                               ('started', date(2024, 5, 1), True)]
+
+            # Re-dating replaces the event; clearing the date retracts it
+            book.finish_date = date(2024, 5, 4)
+            db.session.commit()
+            assert ('finished', date(2024, 5, 4), True) in events(book_id=book.id)
+            assert len(events(book_id=book.id, kind='finished')) == 1
+            book.finish_date = None
+            db.session.commit()
+            assert events(book_id=book.id, kind='finished') == []
+
+            db.session.delete(ReadingLog.query.filter_by(book_id=book.id).one())
+            db.session.commit()
+            assert events(book_id=book.id, kind='logged') == []
+
+            db.session.delete(book)
+            db.session.commit()
+            assert ActivityEvent.query.count() == 0
+
+    def test_privacy_toggle_flips_visibility(self, app, sharer):
+        with app.app_context():
+            today = datetime.now().date()
+            book = Book.query.filter_by(user_id=sharer).one()
+            book.start_date = today
+            db.session.add(ReadingLog(book_id=book.id, user_id=sharer, date=today))
+            db.session.commit()
+            month_start, week_ago = today.replace(day=1), today - timedelta(days=7)
+            assert feed_counts(month_start, week_ago) == (0, 1, 1)
+
+            user = db.session.get(User, sharer)
+            user.share_reading_activity = False
+            db.session.commit()
+            assert events(user_id=sharer) == [('logged', today, False), ('started', today, True)]
+            assert feed_counts(month_start, week_ago) == (0, 0, 1)
+            assert feed_page('logged').events == []
+
+            user.share_current_reading = False
+            user.share_reading_activity = True
+            db.session.commit()
+            assert feed_counts(month_start, week_ago) == (0, 1, 0)
+
+            # New events follow the current settings
+            other = Book(title='Other', author='Author', isbn='9780000000002', user_id=sharer, start_date=today)
+            db.session.add(other)
+            db.session.commit()
+            assert events(book_id=other.id) == [('started', today, False)]
+
+            user.is_active = False
+            db.session.commit()
+            assert not any(visible for _, _, visible in events(user_id=sharer))
+
+    def test_cursor_pagination(self, app, sharer):
+        with app.app_context():
+            book = Book.query.filter_by(user_id=sharer).one()
+            for offset in range(5):
+                db.session.add(ReadingLog(book_id=book.id, user_id=sharer, date=date(2024, 1, 1) + timedelta(days=offset)))
+            db.session.commit()
+            seen, cursor = [], None
+            while True:
+                page = feed_page('logged', after=cursor, page_size=2)
+                seen.extend(event.event_date.day for event in page.events)
+                cursor = page.next_cursor
+                if cursor is None:
+                    break
+            assert seen == [5, 4, 3, 2, 1]
+            assert feed_page('logged', since=date(2024, 1, 4)).events[-1].event_date == date(2024, 1, 4)
+            assert len(feed_page('logged', after='not-a-cursor').events) == 5
+
+    def test_rebuild_matches_incremental(self, app, sharer):
+        with app.app_context():
+            book = Book.query.filter_by(user_id=sharer).one()
+            book.start_date, book.finish_date = date(2024, 2, 1), date(2024, 2, 9)
+            db.session.add(ReadingLog(book_id=book.id, user_id=sharer, date=date(2024, 2, 5)))
+            db.session.add(Book(title='Reading', author='A', isbn='9780000000003', user_id=sharer, start_date=date(2024, 3, 1)))
+            db.session.get(User, sharer).share_current_reading = False
+            db.session.commit()
+            incremental = snapshot()
+            assert rebuild_activity_feed() == len(incremental)
+            assert snapshot() == incremental
+
+    def test_reassigned_book_moves_its_events(self, app, sharer):
+        with app.app_context():
+            private = User(username='private', email='private@test.com', is_active=True, share_reading_activity=False)
+            private.set_password(PASSWORD)
+            db.session.add(private)
+            book = Book.query.filter_by(user_id=sharer).one()
+            book.start_date, book.finish_date = date(2024, 4, 1), date(2024, 4, 9)
+            db.session.commit()
+
+            book.user_id = private.id
+            db.session.commit()
+            assert sorted((e.user_id, e.kind, e.visible) for e in ActivityEvent.query.populate_existing()) == [
+                (private.id, 'finished', False), (private.id, 'started', True)]
+            incremental = snapshot()
+            rebuild_activity_feed()
+            assert snapshot() == incremental
+
+    def test_community_pages_read_the_feed(self, app, client, sharer):
+        with app.app_context():
+            today = datetime.now().date()
+            book = Book.query.filter_by(user_id=sharer).one()
+            book.start_date = book.finish_date = today
+            db.session.add(ReadingLog(book_id=book.id, user_id=sharer, date=today))
+            db.session.add(Book(title='In Progress', author='A', isbn='9780000000004', user_id=sharer, start_date=today))
+            db.session.commit()
+        client.post('/auth/login', data={'username': 'sharer', 'password': PASSWORD})
+        assert client.get('/community_activity').status_code == 200
+        assert b'Shared Book' in client.get('/community_activity/books_this_month').data
+        reading = client.get('/community_activity/currently_reading').data
+        assert b'In Progress' in reading and b'Shared Book' not in reading
+        assert b'read "Shared Book"' in client.get('/community_activity/recent_activity').data
@@ -0,0 +1,88 @@
+import gzip
+import os
+import sqlite3
+import pytest
+from app.models import db, User, Book
+from app.backups import create_backup, list_backups, online_backup, rotate_backups
+
+PASSWORD = 'B4ckup#Password'
+
+@pytest.fixture
+def live_db(tmp_path):
+    """A small SQLite database with an open writer connection."""
+    path = str(tmp_path / 'books.db')
+    conn = sqlite3.connect(path)
+    conn.execute('CREATE TABLE book (id INTEGER PRIMARY KEY, title TEXT)')
+    conn.executemany('INSERT INTO book (title) VALUES (?)', [(f'Book {n}',) for n in range(2000)])
+    conn.commit()
+    yield path, conn
+    conn.close()
+
+@pytest.fixture
+def readers(app):
+    """Two users with a book each."""
+    with app.app_context():
+        ids = []
+        for name in ('owner', 'other'):
+            user = User(username=name, email=f'{name}@test.com', is_active=True)
+            user.set_password(PASSWORD)
+            db.session.add(user)
+            db.session.flush()
+            db.session.add(Book(title=f'{name} book', author='A', isbn='9780000000001', user_id=user.id))
+            ids.append(user.id)
+        db.session.commit()
+        return ids
+
+def titles(path):
+    with sqlite3.connect(path) as conn:
+        return [title for (title,) in conn.execute('SELECT title FROM book ORDER BY id')]
+
+class TestBackups:
+    """Test online backups, rotation and per-user downloads."""
+
+    def test_online_backup_is_consistent_with_a_pending_write(self, live_db, tmp_path):
+        path, writer = live_db
+        writer.execute("INSERT INTO book (title) VALUES ('Uncommitted')")
+        copy = online_backup(path, str(tmp_path / 'copy.db'), pages=1)
+        writer.rollback()
+        assert titles(copy) == titles(path)
+        assert len(titles(copy)) == 2000
+
+    def test_compressed_backup_and_rotation(self, live_db, tmp_path):
+        path, _ = live_db
+        backup_dir = str(tmp_path / 'backups')
+        os.makedirs(backup_dir)
+        for stamp in ('20240101_000000', '20240102_000000', '20240103_000000'):
+            open(os.path.join(backup_dir, f'books.db.backup_{stamp}'), 'w').close()
+        backup_path = create_backup(path, backup_dir, compression='gzip', keep=2)
+        assert backup_path.endswith('.gz')
+        assert [os.path.basename(p) for p in list_backups(backup_dir, 'books.db')] == [
+            os.path.basename(backup_path), 'books.db.backup_20240103_000000']
+        restored = str(tmp_path / 'restored.db')
+        with gzip.open(backup_path) as source, open(restored, 'wb') as target:
+            target.write(source.read())
+        assert titles(restored) == titles(path)
+        assert not [name for name in os.listdir(backup_dir) if name.endswith('.partial')]
+        assert rotate_backups(backup_dir, 'books.db', keep=0) == []
+
+    def test_unknown_compression_is_rejected(self, live_db):
+        with pytest.raises(ValueError):
+            create_backup(live_db[0], compression='rar')
+
+    def test_download_holds_only_the_users_data(self, app, client, readers, tmp_path):
+        client.post('/auth/login', data={'username': 'owner', 'password': PASSWORD})
+        response = client.get('/download_db?compress=gzip')
+        assert response.status_code == 200
+        assert 'my_books.db.gz' in response.headers['Content-Disposition']
+        export = str(tmp_path / 'export.db')
+        with open(export, 'wb') as handle:
+            handle.write(gzip.decompress(response.data))
+        assert titles(export) == ['owner book']
+        with sqlite3.connect(export) as conn:
+            assert conn.execute('SELECT username, password_hash FROM user').fetchall() == [('owner', '!')]
+        assert not [name for name in os.listdir(os.path.dirname(db_file(app))) if name.startswith('download_')]
+        assert client.get('/download_db?compress=rar').status_code == 400
+
+def db_file(app):
+    with app.app_context():
+        return db.engine.url.database
@@ -0,0 +1,77 @@
+import pytest
+from datetime import datetime, timedelta
+from app.models import db, User, Book
+
+PASSWORD = 'C0mmunity#Pass'
+
+def add_reader(username, finished_this_month=0, finished_earlier=0, reading=0, share=True):
+    user = User(username=username, email=f'{username}@test.com', is_active=True,
+                share_reading_activity=share)
+    user.set_password(PASSWORD)
+    db.session.add(user)
+    db.session.flush()
+    today = datetime.now().date()
+    earlier = today.replace(day=1) - timedelta(days=40)
+    books = ([dict(start_date=today, finish_date=today)] * finished_this_month
+             + [dict(start_date=earlier, finish_date=earlier)] * finished_earlier
+             + [dict(start_date=today, finish_date=None)] * reading
+             + [dict(start_date=None, finish_date=None)])  # want-to-read counts nowhere
+    for n, dates in enumerate(books):
+        db.session.add(Book(title=f'{username} {n}', author='A', isbn=f'978{n:010d}', user_id=user.id, **dates))
+    db.session.commit()
+    return user.id
+
+@pytest.fixture
+def logged_in(app, client):
+    with app.app_context():
+        add_reader('viewer')
+    client.post('/auth/login', data={'username': 'viewer', 'password': PASSWORD})
+    return client
+
+class TestActiveReaders:
+    """Test the community active readers list."""
+
+    def test_query_count_is_constant(self, app, logged_in, statement_recorder):
+        with app.app_context():
+            add_reader('few1', 1, 1, 1)
+        with statement_recorder() as few:
+            assert logged_in.get('/community_activity/active_readers').status_code == 200
+        with app.app_context():
+            for n in range(12):
+                add_reader(f'many{n}', n % 3, 1, n % 2)
+        with statement_recorder() as many:
+            response = logged_in.get('/community_activity/active_readers')
+        assert response.status_code == 200
+        assert len(many) == len(few)
+        assert b'many11' in response.data
+
+    def test_counts_and_sorting(self, app, logged_in):
+        with app.app_context():
+            add_reader('busy', finished_this_month=3, finished_earlier=1, reading=1)
+            add_reader('steady', finished_this_month=1, finished_earlier=5, reading=0)
+            add_reader('hidden', finished_this_month=9, share=False)
+            from app.routes import active_reader_stats
+            query, sort, direction = active_reader_stats()
+            assert (sort, direction) == ('activity', 'desc')
+            rows = {row.User.username: row for row in query}
+            assert 'hidden' not in rows
+            assert (rows['busy'].books_this_month, rows['busy'].total_books, rows['busy'].currently_reading) == (3, 4, 1)
+            assert (rows['viewer'].books_this_month, rows['viewer'].total_books, rows['viewer'].currently_reading) == (0, 0, 0)
+            assert [row.User.username for row in query] == ['busy', 'steady', 'viewer']
+
+            query, _, _ = active_reader_stats('total_books')
+            assert [row.User.username for row in query] == ['steady', 'busy', 'viewer']
+            query, _, direction = active_reader_stats('username', 'sideways')
+            assert direction == 'asc'
+            assert [row.User.username for row in query] == ['busy', 'steady', 'viewer']
+
+    def test_pagination(self, app, logged_in):
+        app.config['ACTIVE_READERS_PER_PAGE'] = 2
+        with app.app_context():
+            for n in range(4):
+                add_reader(f'reader{n}', finished_this_month=n)
+        first = logged_in.get('/community_activity/active_readers?sort=username').data.decode()
+        second = logged_in.get('/community_activity/active_readers?sort=username&page=2').data.decode()
+        assert 'reader0' in first and 'reader1' in first and 'reader2' not in first
+        assert 'reader2' in second and 'reader3' in second
+        assert 'page=3' in second
@@ -0,0 +1,215 @@
+import os
+import threading
+import pytest
+from collections import Counter
+from datetime import date
+from io import BytesIO
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from PIL import Image
+from app import covers
+from app.models import db, User, Book, CoverImage
+from app.covers import COVER_SIZES, fetch_cover, cover_src, source_key, thumbnail_path, check_cover_url
+from app.utils import generate_month_review_image
+
+def png_bytes(size=(300, 450), color=(200, 30, 30, 255)):
+    buf = BytesIO()
+    Image.new('RGBA', size, color).save(buf, format='PNG')
+    return buf.getvalue()
+
+@pytest.fixture
+def cover_server(app, tmp_path):
+    """Local image host counting requests per path; /missing answers 404."""
+    state = {'hits': Counter(), 'image': png_bytes()}
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            state['hits'][self.path] += 1
+            if self.path.startswith('/redirect'):
+                self.send_response(302)
+                self.send_header('Location', 'http://169.254.169.254/latest/meta-data/')
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            if self.path.startswith('/missing'):
+                self.send_response(404)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            body = state['image']
+            self.send_response(200)
+            self.send_header('Content-Type', 'image/png')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    app.config.update({'COVER_STORE': str(tmp_path / 'covers'), 'HTTP_MAX_RETRIES': 0,
+                       'COVER_ALLOW_PRIVATE_HOSTS': True})
+    state['url'] = f'http://127.0.0.1:{server.server_port}'
+    yield state
+    server.shutdown()
+    server.server_close()
+
+@pytest.fixture
+def shelf(app, cover_server):
+    """A user with one covered book and one without."""
+    with app.app_context():
+        user = User(username='coverer', email='coverer@test.com', is_active=True)
+        user.set_password('C0verer#Password')
+        db.session.add(user)
+        db.session.commit()
+        covered = Book(title='Covered', author='A', isbn='9780000000001', user_id=user.id,
+                       cover_url=f"{cover_server['url']}/covers/1.png")
+        bare = Book(title='Bare', author='A', isbn='9780000000002', user_id=user.id)
+        db.session.add_all([covered, bare])
+        db.session.commit()
+        return {'user_id': user.id, 'covered': covered.uid, 'bare': bare.uid}
+
+class TestCoverStore:
+    """Test the local cover store and the cover route."""
+
+    def test_route_serves_cached_thumbnail(self, app, client, cover_server, shelf):
+        response = client.get(f"/book/{shelf['covered']}/cover/medium.jpg")
+        assert response.status_code == 200
+        assert response.mimetype == 'image/jpeg'
+        assert 'immutable' in response.headers['Cache-Control']
+        assert 'public' in response.headers['Cache-Control']
+        assert 'max-age=31536000' in response.headers['Cache-Control']
+        etag = response.headers['ETag']
+        image = Image.open(BytesIO(response.data))
+        assert image.size == (200, 300) and image.mode == 'RGB'
+
+        again = client.get(f"/book/{shelf['covered']}/cover/small.jpg")
+        assert Image.open(BytesIO(again.data)).size == (100, 150)
+        assert cover_server['hits']['/covers/1.png'] == 1
+
+        revalidated = client.get(f"/book/{shelf['covered']}/cover/medium.jpg", headers={'If-None-Match': etag})
+        assert revalidated.status_code == 304
+
+    def test_unknown_size_and_missing_cover(self, client, shelf):
+        assert client.get(f"/book/{shelf['covered']}/cover/huge.jpg").status_code == 404
+        response = client.get(f"/book/{shelf['bare']}/cover/medium.jpg")
+        assert response.status_code == 302
+        assert 'bookshelf.png' in response.headers['Location']
+
+    def test_identical_images_share_storage(self, app, cover_server):
+        with app.app_context():
+            first = fetch_cover(f"{cover_server['url']}/a.png")
+            second = fetch_cover(f"{cover_server['url']}/b.png")
+            assert first.digest == second.digest
+            assert first.source_key != second.source_key
+            stored = os.listdir(os.path.join(app.config['COVER_STORE'], first.digest[:2]))
+            assert sorted(stored) == sorted([f'{first.digest}.png'] + [f'{first.digest}-{size}.jpg' for size in COVER_SIZES])
+
+    def test_failed_download_is_remembered(self, app, client, cover_server, shelf):
+        with app.app_context():
+            book = Book.query.filter_by(uid=shelf['covered']).first()
+            book.cover_url = f"{cover_server['url']}/missing.png"
+            db.session.commit()
+        for _ in range(2):
+            response = client.get(f"/book/{shelf['covered']}/cover/medium.jpg")
+            assert response.status_code == 302
+            assert response.headers['Location'].endswith('/bookshelf.png')
+        assert cover_server['hits']['/missing.png'] == 1
+        with app.app_context():
+            assert CoverImage.query.one().digest is None
+
+    def test_missing_thumbnail_is_regenerated(self, app, cover_server):
+        with app.app_context():
+            record = fetch_cover(f"{cover_server['url']}/a.png")
+            os.unlink(thumbnail_path(record.digest, 'large'))
+        with app.test_request_context():
+            from app.covers import ensure_thumbnail
+            path = ensure_thumbnail(record.digest, 'large')
+            # Thumbnails never upscale a smaller original
+            assert Image.open(path).size == (300, 450)
+
+    def test_cover_src_is_versioned_by_source(self, app, shelf):
+        with app.test_request_context():
+            book = Book.query.filter_by(uid=shelf['covered']).first()
+            url = cover_src(book, 'large')
+            assert url.startswith(f"/book/{book.uid}/cover/large.jpg?v=")
+            assert source_key(book.cover_url)[:12] in url
+            assert cover_src(Book.query.filter_by(uid=shelf['bare']).first()) is None
+
+    def test_library_loads_covers_locally(self, client, cover_server, shelf):
+        client.post('/auth/login', data={'username': 'coverer', 'password': 'C0verer#Password'})
+        page = client.get('/').data.decode()
+        assert f"/book/{shelf['covered']}/cover/medium.jpg" in page
+        assert cover_server['url'] not in page
+
+    def test_month_review_downloads_each_cover_once(self, app, cover_server, shelf):
+        with app.test_request_context():
+            books = Book.query.filter_by(uid=shelf['covered']).all()
+            for _ in range(2):
+                generate_month_review_image(books, 1, 2024)
+            assert cover_server['hits']['/covers/1.png'] == 1
+
+    def test_private_and_non_http_sources_are_refused(self, app, client, cover_server, shelf):
+        app.config['COVER_ALLOW_PRIVATE_HOSTS'] = False
+        with app.app_context():
+            for url in (f"{cover_server['url']}/covers/1.png", 'http://localhost/a.png', 'http://10.0.0.8/a.png',
+                        'http://[::ffff:169.254.169.254]/a.png', 'file:///etc/passwd', 'ftp://example.com/a.png'):
+                with pytest.raises(ValueError):
+                    check_cover_url(url)
+        response = client.get(f"/book/{shelf['covered']}/cover/medium.jpg")
+        assert response.headers['Location'].endswith('/bookshelf.png')
+        assert not cover_server['hits']
+        with app.app_context():
+            assert CoverImage.query.one().digest is None
+
+    def test_redirects_are_checked_too(self, app, cover_server, monkeypatch):
+        app.config['COVER_ALLOW_PRIVATE_HOSTS'] = False
+        # The local image host itself is let through; its link-local redirect target must not be
+        real_check = covers.check_cover_url
+        monkeypatch.setattr(covers, 'check_cover_url',
+                            lambda url: None if url.startswith(cover_server['url']) else real_check(url))
+        with app.app_context():
+            record = fetch_cover(f"{cover_server['url']}/redirect.png")
+            assert record.digest is None
+        assert cover_server['hits']['/redirect.png'] == 1
+
+    def test_route_queues_missing_covers_for_the_background(self, app, client, cover_server, shelf):
+        app.config['TESTING'] = False
+        try:
+            response = client.get(f"/book/{shelf['covered']}/cover/medium.jpg")
+            assert response.status_code == 302
+            assert response.headers['Location'].endswith('/bookshelf.png')
+            app.extensions['cover_fetcher'].executor.shutdown(wait=True)
+        finally:
+            app.config['TESTING'] = True
+        assert cover_server['hits']['/covers/1.png'] == 1
+        response = client.get(f"/book/{shelf['covered']}/cover/medium.jpg")
+        assert response.status_code == 200 and response.mimetype == 'image/jpeg'
+
+    def test_private_library_covers_are_not_served(self, app, client, cover_server, shelf):
+        with app.app_context():
+            db.session.get(User, shelf['user_id']).share_library = False
+            reader = User(username='browser', email='browser@test.com', is_active=True)
+            reader.set_password('Br0wser#Password')
+            db.session.add(reader)
+            db.session.commit()
+        url = f"/book/{shelf['covered']}/cover/medium.jpg"
+        assert client.get(url).status_code == 404
+        client.post('/auth/login', data={'username': 'browser', 'password': 'Br0wser#Password'})
+        assert client.get(url).status_code == 404
+        # Refused before the download is ever queued
+        assert not cover_server['hits']
+        with app.app_context():
+            assert CoverImage.query.count() == 0
+
+        # Once the book shows up in the community feed, signed-in readers see its cover
+        with app.app_context():
+            Book.query.filter_by(uid=shelf['covered']).one().start_date = date(2024, 1, 1)
+            db.session.commit()
+        response = client.get(url)
+        assert response.status_code == 200
+        assert 'private' in response.headers['Cache-Control']
+        assert 'public' not in response.headers['Cache-Control']
+
+        client.post('/auth/login', data={'username': 'coverer', 'password': 'C0verer#Password'})
+        assert client.get(url).status_code == 200
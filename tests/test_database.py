@@ -0,0 +1,56 @@
+import logging
+from sqlalchemy import create_engine, text
+from app.models import db
+from app.database import checkpoint, configure_engine, sqlite_pragmas, start_checkpointer
+
+SETTINGS = {'SQLITE_WAL': True, 'SQLITE_BUSY_TIMEOUT': 2500, 'SQLITE_SYNCHRONOUS': 'NORMAL',
+            'SQLITE_MMAP_SIZE': 1048576, 'SQLITE_CACHE_SIZE_KB': 4096}
+
+def pragma(conn, name):
+    return conn.execute(text(f'PRAGMA {name}')).scalar()
+
+class TestDatabaseConfiguration:
+    """Test the SQLite connection pragmas and WAL checkpoints."""
+
+    def test_app_connections_are_tuned(self, app):
+        with app.app_context():
+            with db.engine.connect() as conn:
+                assert pragma(conn, 'journal_mode') == 'wal'
+                assert pragma(conn, 'busy_timeout') == app.config['SQLITE_BUSY_TIMEOUT']
+                assert pragma(conn, 'cache_size') == -app.config['SQLITE_CACHE_SIZE_KB']
+
+    def test_every_new_connection_gets_the_pragmas(self, tmp_path):
+        engine = create_engine(f'sqlite:///{tmp_path / "tuned.db"}')
+        assert configure_engine(engine, SETTINGS)
+        for _ in range(2):
+            with engine.connect() as conn:
+                assert pragma(conn, 'journal_mode') == 'wal'
+                assert pragma(conn, 'busy_timeout') == 2500
+                assert pragma(conn, 'synchronous') == 1  # NORMAL
+                assert pragma(conn, 'mmap_size') == 1048576
+                assert pragma(conn, 'cache_size') == -4096
+            engine.dispose()
+        assert ('journal_mode', 'WAL') not in sqlite_pragmas(dict(SETTINGS, SQLITE_WAL=False))
+
+    def test_readers_see_a_snapshot_while_a_write_is_pending(self, tmp_path):
+        engine = create_engine(f'sqlite:///{tmp_path / "wal.db"}')
+        configure_engine(engine, SETTINGS)
+        with engine.begin() as conn:
+            conn.execute(text('CREATE TABLE item (id INTEGER PRIMARY KEY)'))
+            conn.execute(text('INSERT INTO item DEFAULT VALUES'))
+        with engine.connect() as writer, engine.connect() as reader:
+            writer.execute(text('BEGIN IMMEDIATE'))
+            writer.execute(text('INSERT INTO item DEFAULT VALUES'))
+            assert reader.execute(text('SELECT count(*) FROM item')).scalar() == 1
+            writer.execute(text('COMMIT'))
+        engine.dispose()
+
+        busy, wal_pages, checkpointed = checkpoint(str(tmp_path / 'wal.db'))
+        assert busy == 0 and checkpointed == wal_pages
+
+    def test_one_checkpointer_per_file(self, tmp_path):
+        path = str(tmp_path / 'once.db')
+        logger = logging.getLogger(__name__)
+        assert start_checkpointer(path, 3600, logger)
+        assert not start_checkpointer(path, 3600, logger)
+        assert not start_checkpointer(str(tmp_path / 'never.db'), 0, logger)
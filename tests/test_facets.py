@@ -0,0 +1,97 @@
+import pytest
+from sqlalchemy import event
+from app.models import db, User, Book, BookFacet
+from app.facets import get_facets, rebuild_facets
+
+@pytest.fixture
+def owner(app):
+    with app.app_context():
+        user = User(username='facets', email='facets@test.com', is_active=True)
+        user.set_password('Fac3ts#Password', validate=False)
+        db.session.add(user)
+        db.session.commit()
+        return user.id
+
+def add_book(user_id, isbn, categories=None, publisher=None, language=None):
+    book = Book(title=f'Book {isbn}', author='Author', isbn=isbn, user_id=user_id,
+                categories=categories, publisher=publisher, language=language)
+    db.session.add(book)
+    db.session.commit()
+    return book
+
+def stored_counts(user_id):
+    return sorted((f.facet, f.value, f.count) for f in BookFacet.query.filter_by(user_id=user_id))
+
+class TestFacetIndex:
+    """Test the incrementally maintained category/publisher/language counts."""
+
+    def test_insert_counts_each_value(self, app, owner):
+        with app.app_context():
+            add_book(owner, '1', categories='Fiction, Fantasy', publisher='Tor', language='en')
+            add_book(owner, '2', categories='Fiction', publisher='Tor', language='de')
+
+            assert get_facets(owner) == {
+                'category': [('Fantasy', 1), ('Fiction', 2)],
+                'publisher': [('Tor', 2)],
+                'language': [('de', 1), ('en', 1)],
+            }
+
+    def test_update_moves_counts(self, app, owner):
+        with app.app_context():
+            book = add_book(owner, '1', categories='Fiction, Fantasy', publisher='Tor')
+            add_book(owner, '2', categories='Fiction')
+            book_id = book.id
+            db.session.expire_all()
+
+            # Assign without reading first: the old value must still be decremented
+            book = db.session.get(Book, book_id)
+            db.session.expire(book, ['categories', 'publisher'])
+            book.categories = 'History'
+            book.publisher = ''
+            db.session.commit()
+
+            assert get_facets(owner)['category'] == [('Fiction', 1), ('History', 1)]
+            assert get_facets(owner)['publisher'] == []
+
+    def test_delete_and_rollback(self, app, owner):
+        with app.app_context():
+            book = add_book(owner, '1', categories='Fiction', language='en')
+            add_book(owner, '2', categories='Fiction')
+
+            db.session.delete(book)
+            db.session.flush()
+            db.session.rollback()
+            assert get_facets(owner)['category'] == [('Fiction', 2)]
+
+            db.session.delete(db.session.get(Book, book.id))
+            db.session.commit()
+            assert get_facets(owner)['category'] == [('Fiction', 1)]
+            assert get_facets(owner)['language'] == []
+
+    def test_rebuild_matches_incremental_counts(self, app, owner):
+        with app.app_context():
+            add_book(owner, '1', categories='Fiction, Fantasy', publisher='Tor', language='en')
+            add_book(owner, '2', categories='Fiction', publisher='Orbit')
+            incremental = stored_counts(owner)
+
+            BookFacet.query.delete()
+            db.session.commit()
+            rebuild_facets()
+            assert stored_counts(owner) == incremental
+
+    def test_facets_are_one_query(self, app, owner):
+        with app.app_context():
+            for n in range(30):
+                add_book(owner, str(n), categories=f'Cat {n % 3}, Shared', publisher=f'P{n % 2}')
+
+            statements = []
+            listener = lambda *args: statements.append(args[2])
+            event.listen(db.engine, 'before_cursor_execute', listener)
+            try:
+                facets = get_facets(owner)
+            finally:
+                event.remove(db.engine, 'before_cursor_execute', listener)
+
+            assert len(statements) == 1
+            assert 'book_facet' in statements[0]
+            assert ('Shared', 30) in facets['category']
@@ -0,0 +1,94 @@
+import threading
+import pytest
+import requests
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from app.http_client import http_get, get_session, get_http_stats
+from app.models import db, User
+
+@pytest.fixture
+def http_stub(app):
+    """Keep-alive HTTP/1.1 server that records client ports and fails on request."""
+    state = {'ports': set(), 'fail_next': 0, 'requests': 0}
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            state['requests'] += 1
+            state['ports'].add(self.client_address[1])
+            if self.path.startswith('/missing'):
+                status = 404
+            elif state['fail_next']:
+                state['fail_next'] -= 1
+                status = 503
+            else:
+                status = 200
+            body = b'ok'
+            self.send_response(status)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    app.config['HTTP_RETRY_BACKOFF'] = 0
+    state['url'] = f'http://127.0.0.1:{server.server_port}'
+    state['host'] = f'127.0.0.1:{server.server_port}'
+    yield state
+    server.shutdown()
+    server.server_close()
+
+class TestHttpClient:
+    """Test the pooled outbound HTTP client."""
+
+    def test_connections_are_reused(self, app, http_stub):
+        """Sequential calls share one keep-alive connection."""
+        with app.app_context():
+            for _ in range(5):
+                assert http_get(f"{http_stub['url']}/book").status_code == 200
+
+            assert http_stub['requests'] == 5
+            assert len(http_stub['ports']) == 1
+            assert get_session() is get_session()
+
+    def test_transient_errors_are_retried(self, app, http_stub):
+        """A 503 is retried transparently and counted in the host metrics."""
+        with app.app_context():
+            http_stub['fail_next'] = 1
+            response = http_get(f"{http_stub['url']}/book")
+
+            assert response.status_code == 200
+            assert http_stub['requests'] == 2
+            stats = get_http_stats()[http_stub['host']]
+            assert stats['retries'] >= 1
+            assert stats['errors'] == 0
+
+    def test_errors_are_counted_per_host(self, app, http_stub):
+        with app.app_context():
+            before = get_http_stats().get(http_stub['host'], {}).get('errors', 0)
+            assert http_get(f"{http_stub['url']}/missing").status_code == 404
+            with pytest.raises(requests.exceptions.ConnectionError):
+                http_get('http://127.0.0.1:9/unreachable')
+
+            stats = get_http_stats()
+            assert stats[http_stub['host']]['errors'] == before + 1
+            assert stats['127.0.0.1:9']['errors'] >= 1
+            assert stats[http_stub['host']]['avg_ms'] is not None
+
+    def test_admin_endpoint_reports_hosts(self, app, client, http_stub):
+        with app.app_context():
+            admin = User(username='httpadmin', email='httpadmin@test.com', is_admin=True, is_active=True)
+            admin.set_password('Adm1n#Password')
+            db.session.add(admin)
+            db.session.commit()
+            http_get(f"{http_stub['url']}/book")
+
+        client.post('/auth/login', data={'username': 'httpadmin', 'password': 'Adm1n#Password'})
+        data = client.get('/admin/api/http_stats').get_json()
+
+        assert http_stub['host'] in data['hosts']
+        assert 'providers' in data
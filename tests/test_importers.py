@@ -0,0 +1,78 @@
+import codecs
+import json
+from itertools import count
+from app import metadata_cache
+from app.importers import batched, read_bulk_import_isbns, read_goodreads_rows
+from app.models import db, User, Book, Task
+from app.tasks import claim_task, execute_task
+
+GOODREADS_HEADER = 'Book Id,Title,Author,ISBN,ISBN13,Date Read,Bookshelves\n'
+
+def goodreads_row(n, title='Title', shelf='read'):
+    return f'{n},{title} {n},Author {n},"=""000000000{n}""","=""978000000{n:04d}""",2024/01/0{n % 9 + 1},{shelf}\n'
+
+class TestCsvIngestion:
+    """Test incremental decoding and lazy parsing of uploaded CSVs."""
+
+    def test_utf8_bom_is_stripped(self, tmp_path):
+        path = tmp_path / 'export.csv'
+        path.write_bytes(codecs.BOM_UTF8 + (GOODREADS_HEADER.replace('Book Id,', '') + 'Dune,Frank Herbert,,9780441013593,,\n').encode())
+        assert list(read_goodreads_rows(str(path))) == [('Dune', 'Frank Herbert', '9780441013593', None, False)]
+
+    def test_utf16_export_is_decoded(self, tmp_path):
+        path = tmp_path / 'export.csv'
+        path.write_bytes((GOODREADS_HEADER + goodreads_row(1, title='Café')).encode('utf-16'))
+        [(title, author, isbn, finish_date, want_to_read)] = read_goodreads_rows(str(path))
+        assert (title, isbn, finish_date.isoformat()) == ('Café 1', '9780000000001', '2024-01-02')
+
+    def test_stray_legacy_bytes_do_not_abort_the_import(self, tmp_path):
+        path = tmp_path / 'export.csv'
+        utf8 = goodreads_row(1, title='Señor').encode()
+        cp1252 = goodreads_row(2, title='Cr\xe8me – Br\xfbl\xe9e').encode('cp1252')
+        path.write_bytes(GOODREADS_HEADER.encode() + utf8 + cp1252 + b'3,Odd \x81,A,,9780000000003,,\n')
+        titles = [row[0] for row in read_goodreads_rows(str(path))]
+        assert titles == ['Señor 1', 'Crème – Brûlée 2', 'Odd \x81']
+
+    def test_rows_are_parsed_lazily(self, tmp_path):
+        path = tmp_path / 'isbns.csv'
+        path.write_text('9780000000001\n\n  \n9780000000002\n', encoding='utf-8')
+        isbns = read_bulk_import_isbns(str(path))
+        assert next(isbns) == '9780000000001'
+        assert list(isbns) == ['9780000000002']
+
+    def test_batches_have_a_fixed_size(self):
+        numbers = count()
+        assert next(batched(numbers, 3)) == [0, 1, 2]
+        assert next(numbers) == 3  # Nothing was read past the first batch
+        assert list(batched(range(7), 3)) == [[0, 1, 2], [3, 4, 5], [6]]
+        assert list(batched([], 3)) == []
+
+    def test_goodreads_import_resumes_from_the_stream(self, app, tmp_path):
+        path = tmp_path / 'export.csv'
+        path.write_bytes(codecs.BOM_UTF8 + (GOODREADS_HEADER + ''.join(goodreads_row(n, shelf='to-read') for n in range(1, 6))).encode())
+        with app.app_context():
+            app.config['OPENLIBRARY_BATCH_SIZE'] = 2
+            user = User(username='streamer', email='streamer@test.com', is_active=True)
+            user.set_password('Str3amer#Pass')
+            db.session.add(user)
+            db.session.commit()
+            # Seed the metadata cache so the import never reaches the network
+            metadata_cache.store_many('openlibrary', {f'978000000{n:04d}': {'title': f'Title {n}', 'author': 'Author',
+                                                                            'cover': f'https://covers.example/{n}.jpg'}
+                                                      for n in range(1, 6)})
+            metadata_cache.store_many('google_books', {f'978000000{n:04d}': {'description': f'About {n}', 'average_rating': 3.5,
+                                                                             'rating_count': n, 'categories': 'Fiction'}
+                                                       for n in range(1, 6)})
+            task = Task(task_type='goodreads_import', user_id=user.id, name='Goodreads Import',
+                        processed_items=2, success_count=2, payload=json.dumps({'path': str(path)}))
+            db.session.add(task)
+            db.session.commit()
+            assert claim_task(task.id, 'test-worker')
+            execute_task(task.id)
+
+            task = db.session.get(Task, task.id)
+            assert (task.status, task.total_items, task.processed_items) == ('completed', 5, 5)
+            books = Book.query.filter_by(user_id=user.id).order_by(Book.isbn).all()
+            assert [book.title for book in books] == ['Title 3', 'Title 4', 'Title 5']
+            assert all(book.want_to_read for book in books)
+            assert [(book.description, book.rating_count) for book in books] == [('About 3', 3), ('About 4', 4), ('About 5', 5)]
@@ -0,0 +1,107 @@
+import pytest
+from datetime import date
+from app.models import db, User, Book
+from app.library import paginate_books, library_stats, filter_options, encode_cursor
+
+def sort_key(book):
+    """The ordering index() used to apply in Python."""
+    if not book.finish_date and not book.want_to_read and not book.library_only:
+        priority = 1
+    elif book.want_to_read:
+        priority = 2
+    elif book.finish_date:
+        priority = 3
+    else:
+        priority = 4
+    return (priority, book.title.lower(), book.id)
+
+@pytest.fixture
+def reader(app):
+    """A user with 25 books spread over every reading status."""
+    with app.app_context():
+        user = User(username='pager', email='pager@test.com', is_active=True)
+        user.set_password('Pag3r#Password')
+        db.session.add(user)
+        db.session.commit()
+        for n in range(25):
+            db.session.add(Book(
+                title=f"{'abc'[n % 3]}Book {n:02d}" if n % 2 else f"{'ABC'[n % 3]}book {n:02d}",
+                author='Author',
+                isbn=f'97800000{n:05d}',
+                user_id=user.id,
+                finish_date=date(2024, 1, 1) if n % 4 == 2 else None,
+                want_to_read=n % 4 == 1,
+                library_only=n % 4 == 3,
+                categories='Fiction, Fantasy' if n % 2 else 'History',
+                publisher='Press A' if n % 3 else 'Press B',
+                language='en'
+            ))
+        db.session.commit()
+        return user.id
+
+def walk(criteria, page_size):
+    pages, cursor = [], None
+    while True:
+        page = paginate_books(criteria, page_size, after=cursor)
+        pages.append(page)
+        if not page.has_next:
+            return pages
+        cursor = page.next_cursor
+
+class TestLibraryPagination:
+    """Test keyset pagination of the library shelf."""
+
+    def test_pages_follow_shelf_order(self, app, reader):
+        with app.app_context():
+            criteria = [Book.user_id == reader]
+            pages = walk(criteria, 10)
+
+            expected = sorted(Book.query.filter_by(user_id=reader).all(), key=sort_key)
+            assert [len(page.books) for page in pages] == [10, 10, 5]
+            assert [book.id for page in pages for book in page.books] == [book.id for book in expected]
+            assert not pages[0].has_prev and pages[1].has_prev
+
+    def test_previous_cursor_returns_previous_page(self, app, reader):
+        with app.app_context():
+            criteria = [Book.user_id == reader]
+            first, second, third = walk(criteria, 10)
+
+            back = paginate_books(criteria, 10, before=third.prev_cursor)
+            assert [book.id for book in back.books] == [book.id for book in second.books]
+            back = paginate_books(criteria, 10, before=second.prev_cursor)
+            assert [book.id for book in back.books] == [book.id for book in first.books]
+            assert not back.has_prev
+
+    def test_bad_cursor_starts_from_the_beginning(self, app, reader):
+        with app.app_context():
+            criteria = [Book.user_id == reader]
+            assert paginate_books(criteria, 5, after='not-a-cursor').books == paginate_books(criteria, 5).books
+            assert paginate_books(criteria, 5, after=encode_cursor([99, 'zzz', 0])).books == []
+
+    def test_stats_and_filters_come_from_sql(self, app, reader):
+        with app.app_context():
+            stats = library_stats([Book.user_id == reader])
+            assert stats == {'total': 25, 'finished': 6, 'reading': 7, 'want_to_read': 6}
+
+            categories, publishers, languages = filter_options(reader)
+            assert categories == [('Fantasy', 12), ('Fiction', 12), ('History', 13)]
+            assert publishers == [('Press A', 16), ('Press B', 9)]
+            assert languages == [('en', 25)]
+
+    def test_index_renders_one_page_with_links(self, app, client, reader):
+        app.config['LIBRARY_PAGE_SIZE'] = 10
+        client.post('/auth/login', data={'username': 'pager', 'password': 'Pag3r#Password'})
+
+        response = client.get('/?category=Fiction')
+        html = response.get_data(as_text=True)
+        assert response.status_code == 200
+        assert html.count('class="book-card"') == 10
+        assert 'Showing 10 of 12 book(s)' in html
+
+        with app.app_context():
+            next_cursor = paginate_books([Book.user_id == reader, Book.categories.ilike('%Fiction%')], 10).next_cursor
+        assert f'after={next_cursor}' in html
+        assert 'category=Fiction' in html
+
+        response = client.get(f'/?category=Fiction&after={next_cursor}')
+        assert response.get_data(as_text=True).count('class="book-card"') == 2
@@ -0,0 +1,85 @@
+import pytest
+from datetime import timedelta
+from app import metadata_cache
+from app.models import db, MetadataCache
+
+class CountingFetch:
+    """Fake provider that records how often it is called."""
+
+    def __init__(self, result):
+        self.result = result
+        self.calls = 0
+
+    def __call__(self, isbn):
+        self.calls += 1
+        return self.result
+
+class TestMetadataCache:
+    """Test the shared provider metadata cache."""
+
+    def test_second_lookup_is_served_from_cache(self, app):
+        """A cached ISBN must not hit the provider again."""
+        with app.app_context():
+            fetch = CountingFetch({'title': 'Dune', 'author': 'Frank Herbert'})
+            first = metadata_cache.cached_lookup('openlibrary', '9780441013593', fetch)
+            second = metadata_cache.cached_lookup('openlibrary', '9780441013593', fetch)
+
+            assert fetch.calls == 1
+            assert first == second == {'title': 'Dune', 'author': 'Frank Herbert'}
+
+    def test_cached_payload_is_a_copy(self, app):
+        """Callers may mutate returned data without corrupting the cache."""
+        with app.app_context():
+            fetch = CountingFetch({'title': 'Dune'})
+            metadata_cache.cached_lookup('openlibrary', '111', fetch)
+            data = metadata_cache.cached_lookup('openlibrary', '111', fetch)
+            data['title'] = 'Changed'
+
+            assert metadata_cache.cached_lookup('openlibrary', '111', fetch) == {'title': 'Dune'}
+
+    def test_not_found_is_cached_negatively(self, app):
+        """Unknown ISBNs are remembered so the provider is asked only once."""
+        with app.app_context():
+            fetch = CountingFetch(None)
+            assert metadata_cache.cached_lookup('google_books', '000', fetch) is None
+            assert metadata_cache.cached_lookup('google_books', '000', fetch) is None
+
+            assert fetch.calls == 1
+            assert MetadataCache.query.filter_by(isbn='000', found=False).count() == 1
+
+    def test_provider_errors_are_not_cached(self, app):
+        """Network failures propagate and leave no cache entry behind."""
+        with app.app_context():
+            def failing_fetch(isbn):
+                raise IOError('provider unreachable')
+
+            with pytest.raises(IOError):
+                metadata_cache.cached_lookup('openlibrary', '222', failing_fetch)
+            assert metadata_cache.get_entry('openlibrary', '222') is None
+
+    def test_stale_entry_is_served_and_revalidated(self, app):
+        """Expired entries inside the stale window are returned, then refreshed."""
+        with app.app_context():
+            metadata_cache.cached_lookup('openlibrary', '333', CountingFetch({'title': 'Old'}))
+            entry = metadata_cache.get_entry('openlibrary', '333')
+            entry.expires_at = entry.expires_at - timedelta(seconds=app.config['METADATA_CACHE_TTL'] + 60)
+            db.session.commit()
+
+            refresh = CountingFetch({'title': 'New'})
+            assert metadata_cache.cached_lookup('openlibrary', '333', refresh) == {'title': 'Old'}
+            assert refresh.calls == 1
+            assert metadata_cache.cached_lookup('openlibrary', '333', refresh) == {'title': 'New'}
+            assert refresh.calls == 1
+
+    def test_stats_count_hits_and_misses(self, app):
+        """Hit and miss counters are exposed for the admin dashboard."""
+        with app.app_context():
+            before = metadata_cache.get_cache_stats()
+            fetch = CountingFetch({'title': 'Emma'})
+            metadata_cache.cached_lookup('openlibrary', '444', fetch)
+            metadata_cache.cached_lookup('openlibrary', '444', fetch)
+            after = metadata_cache.get_cache_stats()
+
+            assert after['misses'] == before['misses'] + 1
+            assert after['hits'] == before['hits'] + 1
+            assert after['entries'] >= 1
@@ -0,0 +1,125 @@
+import json
+import threading
+from collections import Counter
+import pytest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+from app.models import db, User, Book
+from app.metadata_resolver import resolve, resolve_many, OPENLIBRARY_FIRST
+
+OPENLIBRARY_BOOKS = {
+    '9780000000021': {'title': 'Open Title', 'authors': [{'name': 'Open Author'}],
+                      'cover': {'large': 'https://covers.example/ol-21.jpg'}, 'publishers': [{'name': 'OL Press'}]},
+    '9780000000022': {'title': 'No Cover Title', 'authors': [{'name': 'Open Author'}]},
+}
+GOOGLE_BOOKS = {
+    '9780000000021': {'title': 'Google Title', 'authors': ['Google Author'], 'description': 'From Google',
+                      'imageLinks': {'thumbnail': 'https://covers.example/gb-21.jpg'}, 'averageRating': 4.5},
+    '9780000000022': {'title': 'Google Title 22', 'authors': ['Google Author'],
+                      'imageLinks': {'thumbnail': 'https://covers.example/gb-22.jpg'}},
+}
+
+@pytest.fixture
+def providers(app):
+    """One local server answering for both providers, counting requests per provider and ISBN."""
+    calls = Counter()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            url = urlparse(self.path)
+            query = parse_qs(url.query)
+            if url.path == '/api/books':
+                keys = query['bibkeys'][0].split(',')
+                calls.update(('openlibrary', key.split(':', 1)[1]) for key in keys)
+                body = {key: OPENLIBRARY_BOOKS[key.split(':', 1)[1]]
+                        for key in keys if key.split(':', 1)[1] in OPENLIBRARY_BOOKS}
+            else:
+                isbn = query['q'][0].split(':', 1)[1]
+                calls[('google_books', isbn)] += 1
+                body = {'items': [{'volumeInfo': GOOGLE_BOOKS[isbn]}]} if isbn in GOOGLE_BOOKS else {}
+            payload = json.dumps(body).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    base_url = f'http://127.0.0.1:{server.server_port}'
+    app.config.update({
+        'OPENLIBRARY_API_URL': f'{base_url}/api/books',
+        'GOOGLE_BOOKS_API_URL': f'{base_url}/books/v1/volumes',
+        'OPENLIBRARY_RATE_LIMIT': 0,
+        'GOOGLE_BOOKS_RATE_LIMIT': 0,
+        # Count every upstream call, not just cache misses
+        'METADATA_CACHE_ENABLED': False,
+    })
+    yield calls
+    server.shutdown()
+    server.server_close()
+
+class TestMetadataResolver:
+    """Test merging provider records with precedence and provenance."""
+
+    def test_each_provider_is_asked_once(self, app, providers):
+        with app.app_context():
+            metadata = resolve('9780000000021')
+
+            assert providers == Counter({('openlibrary', '9780000000021'): 1, ('google_books', '9780000000021'): 1})
+            assert metadata.title == 'Open Title'
+            assert metadata.cover == 'https://covers.example/gb-21.jpg'
+            assert metadata.description == 'From Google'
+            assert metadata.publisher == 'OL Press'
+            assert metadata.average_rating == 4.5
+            assert metadata.sources['title'] == 'openlibrary'
+            assert metadata.sources['cover'] == 'google_books'
+
+    def test_precedence_is_configurable(self, app, providers):
+        with app.app_context():
+            app.config['METADATA_PRECEDENCE'] = 'default=google_books,openlibrary'
+            metadata = resolve('9780000000021')
+
+            assert metadata.title == 'Google Title'
+            assert metadata.sources['title'] == 'google_books'
+            assert metadata.publisher == 'OL Press'  # Google has none, OpenLibrary fills it
+
+    def test_fallback_provider_only_for_gaps(self, app, providers):
+        """With OpenLibrary first, Google Books is asked only for the ISBN missing a cover."""
+        with app.app_context():
+            results = resolve_many(['9780000000021', '9780000000022'],
+                                   fields=('title', 'author', 'cover'), precedence=OPENLIBRARY_FIRST)
+
+            assert providers[('google_books', '9780000000021')] == 0
+            assert providers[('google_books', '9780000000022')] == 1
+            assert results['9780000000021'].cover == 'https://covers.example/ol-21.jpg'
+            assert results['9780000000022'].cover == 'https://covers.example/gb-22.jpg'
+            assert results['9780000000022'].sources['title'] == 'openlibrary'
+
+    def test_unknown_isbn_is_not_found(self, app, providers):
+        with app.app_context():
+            metadata = resolve('9789999999999')
+
+            assert not metadata.found
+            assert metadata.to_dict()['title'] is None
+
+    def test_add_book_makes_one_call_per_provider(self, app, client, providers):
+        """Adding a book used to ask Google Books twice; now each provider is asked once."""
+        with app.app_context():
+            user = User(username='resolver', email='resolver@test.com', is_active=True)
+            user.set_password('Res0lver#Pass')
+            db.session.add(user)
+            db.session.commit()
+
+        client.post('/auth/login', data={'username': 'resolver', 'password': 'Res0lver#Pass'})
+        client.post('/add', data={'add': '1', 'title': 'Open Title', 'author': 'Open Author', 'isbn': '9780000000021'})
+
+        assert sum(providers.values()) == 2
+        with app.app_context():
+            book = Book.query.filter_by(isbn='9780000000021').one()
+            assert book.cover_url == 'https://covers.example/gb-21.jpg'
+            assert book.description == 'From Google'
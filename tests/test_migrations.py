@@ -0,0 +1,137 @@
+import sqlite3
+import threading
+import pytest
+from flask import Flask
+from sqlalchemy import inspect
+from sqlalchemy.exc import OperationalError
+from app import migrations
+from app.models import db
+from app.migrations import SCHEMA_VERSION, migration_lock, read_schema_version, run_migrations
+
+LEGACY_SCHEMA = """
+CREATE TABLE user (id INTEGER PRIMARY KEY, username VARCHAR(80) NOT NULL, email VARCHAR(120) NOT NULL,
+                   password_hash VARCHAR(128) NOT NULL, is_admin BOOLEAN, created_at DATETIME, is_active BOOLEAN);
+INSERT INTO user (username, email, password_hash, is_admin, is_active) VALUES ('admin', 'admin@example.com', '-', 1, 1);
+CREATE TABLE book (id INTEGER PRIMARY KEY, uid VARCHAR(12) NOT NULL, title VARCHAR(255) NOT NULL,
+                   author VARCHAR(255) NOT NULL, isbn VARCHAR(13) NOT NULL, start_date DATE, finish_date DATE,
+                   cover_url VARCHAR(512), want_to_read BOOLEAN, library_only BOOLEAN);
+CREATE TABLE reading_log (id INTEGER PRIMARY KEY, book_id INTEGER NOT NULL, date DATE NOT NULL);
+INSERT INTO book (uid, title, author, isbn, start_date) VALUES ('legacy1', 'Old Book', 'Author', '9780000000001', '2020-01-01');
+INSERT INTO reading_log (book_id, date) VALUES (1, '2020-01-02');
+"""
+
+@pytest.fixture
+def database(tmp_path):
+    """A bare app bound to its own database file, without create_app()'s startup work."""
+    path = tmp_path / 'books.db'
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{path}'
+    db.init_app(app)
+    with app.app_context():
+        yield app, path
+        db.session.remove()
+        db.engine.dispose()
+
+class TestMigrations:
+    """Test the versioned startup migrations."""
+
+    def test_fresh_database_is_stamped_and_then_skipped(self, database, statement_recorder):
+        app, path = database
+        assert run_migrations() == SCHEMA_VERSION
+        assert 'user' in inspect(db.engine).get_table_names()
+        assert read_schema_version(db.engine) == SCHEMA_VERSION
+        with statement_recorder() as statements:
+            run_migrations()
+        assert len(statements) == 1 and 'schema_version' in statements[0]
+        assert not (path.parent / 'backups').exists()
+
+    def test_leftover_search_tables_count_as_empty(self, database):
+        app, path = database
+        with sqlite3.connect(path) as conn:
+            conn.execute("CREATE VIRTUAL TABLE book_fts USING fts5(title, content='book', content_rowid='id')")
+        assert run_migrations() == SCHEMA_VERSION
+        assert 'user' in inspect(db.engine).get_table_names()
+        assert not (path.parent / 'backups').exists()
+
+    def test_legacy_database_is_upgraded_once(self, database):
+        app, path = database
+        with sqlite3.connect(path) as conn:
+            conn.executescript(LEGACY_SCHEMA)
+        assert run_migrations() == SCHEMA_VERSION
+        columns = {column['name'] for column in inspect(db.engine).get_columns('book')}
+        assert {'user_id', 'description', 'created_at'} <= columns
+        assert {'share_library', 'password_must_change'} <= {column['name'] for column in inspect(db.engine).get_columns('user')}
+        assert {'user_id', 'created_at'} <= {column['name'] for column in inspect(db.engine).get_columns('reading_log')}
+        assert len(list((path.parent / 'backups').iterdir())) == 1
+        # Orphaned data went to the admin, then the feed was backfilled from it
+        with sqlite3.connect(path) as conn:
+            assert conn.execute('SELECT user_id FROM book').fetchone() == (1,)
+            assert conn.execute('SELECT count(*) FROM activity_event').fetchone()[0] == 2
+        assert run_migrations() == SCHEMA_VERSION
+        assert len(list((path.parent / 'backups').iterdir())) == 1
+
+    def test_failed_legacy_step_is_retried(self, database, monkeypatch):
+        app, path = database
+        with sqlite3.connect(path) as conn:
+            conn.executescript(LEGACY_SCHEMA)
+        real_text = migrations.text
+
+        def failing_text(sql):
+            if sql.startswith('ALTER TABLE book'):
+                raise OperationalError(sql, {}, Exception('disk I/O error'))
+            return real_text(sql)
+
+        monkeypatch.setattr(migrations, 'text', failing_text)
+        assert run_migrations() is None
+        assert read_schema_version(db.engine) is None
+        monkeypatch.undo()
+        assert run_migrations() == SCHEMA_VERSION
+        assert 'user_id' in {column['name'] for column in inspect(db.engine).get_columns('book')}
+
+    def test_partially_migrated_database_resumes(self, database):
+        app, path = database
+        run_migrations()
+        with db.engine.begin() as conn:
+            conn.exec_driver_sql('UPDATE schema_version SET version = 1')
+            conn.exec_driver_sql('DROP INDEX ix_book_finish_date_id')
+        assert run_migrations() == SCHEMA_VERSION
+        assert 'ix_book_finish_date_id' in {index['name'] for index in inspect(db.engine).get_indexes('book')}
+
+    def test_version_3_database_gets_query_indexes(self, database):
+        app, path = database
+        run_migrations()
+        with db.engine.begin() as conn:
+            conn.exec_driver_sql('UPDATE schema_version SET version = 3')
+            conn.exec_driver_sql('DROP INDEX ix_reading_log_book_date')
+            conn.exec_driver_sql('DROP INDEX ix_book_user_finish_date')
+        assert run_migrations() == SCHEMA_VERSION
+        assert 'ix_reading_log_book_date' in {index['name'] for index in inspect(db.engine).get_indexes('reading_log')}
+        assert 'ix_book_user_finish_date' in {index['name'] for index in inspect(db.engine).get_indexes('book')}
+
+    def test_each_version_builds_only_its_own_indexes(self, database):
+        app, path = database
+        run_migrations()
+        with db.engine.begin() as conn:
+            conn.exec_driver_sql('UPDATE schema_version SET version = 4')
+            conn.exec_driver_sql('DROP INDEX ix_metadata_cache_found')
+            conn.exec_driver_sql('DROP INDEX ix_book_created_at')
+        assert run_migrations() == SCHEMA_VERSION
+        assert 'ix_metadata_cache_found' in {index['name'] for index in inspect(db.engine).get_indexes('metadata_cache')}
+        # Version 4 was already applied, so its index is not rebuilt
+        assert 'ix_book_created_at' not in {index['name'] for index in inspect(db.engine).get_indexes('book')}
+
+    def test_workers_wait_for_the_migrating_one(self, database):
+        app, path = database
+        results = []
+
+        def worker():
+            with app.app_context():
+                results.append(run_migrations())
+
+        with migration_lock(f'{path}.migrate.lock'):
+            thread = threading.Thread(target=worker)
+            thread.start()
+            thread.join(0.3)
+            assert thread.is_alive() and not results
+        thread.join(10)
+        assert results == [SCHEMA_VERSION]
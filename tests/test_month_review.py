@@ -0,0 +1,114 @@
+import threading
+import time
+import pytest
+from collections import Counter
+from datetime import date
+from io import BytesIO
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from PIL import Image
+from app.models import db, User, Book
+from app.utils import render_month_review, clear_month_review_cache, generate_month_review_image
+
+def png_bytes(color):
+    buf = BytesIO()
+    Image.new('RGB', (200, 300), color).save(buf, format='PNG')
+    return buf.getvalue()
+
+@pytest.fixture
+def slow_covers(app, tmp_path):
+    """Local image host that takes DELAY seconds per request and records peak concurrency."""
+    state = {'hits': Counter(), 'active': 0, 'peak': 0, 'delay': 0.2, 'lock': threading.Lock()}
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            with state['lock']:
+                state['hits'][self.path] += 1
+                state['active'] += 1
+                state['peak'] = max(state['peak'], state['active'])
+            time.sleep(state['delay'])
+            body = png_bytes((len(self.path) * 7 % 255, 40, 90))
+            self.send_response(200)
+            self.send_header('Content-Type', 'image/png')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            with state['lock']:
+                state['active'] -= 1
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    app.config.update({'COVER_STORE': str(tmp_path / 'covers'), 'HTTP_MAX_RETRIES': 0,
+                       'COVER_FETCH_CONCURRENCY': 8, 'COVER_ALLOW_PRIVATE_HOSTS': True})
+    state['url'] = f'http://127.0.0.1:{server.server_port}'
+    clear_month_review_cache()
+    yield state
+    clear_month_review_cache()
+    server.shutdown()
+    server.server_close()
+
+@pytest.fixture
+def finished_month(app, slow_covers):
+    """A user who finished 16 books (each with its own cover) in March 2024."""
+    with app.app_context():
+        user = User(username='reviewer', email='reviewer@test.com', is_active=True)
+        user.set_password('R3viewer#Password')
+        db.session.add(user)
+        db.session.commit()
+        for n in range(16):
+            db.session.add(Book(title=f'Book {n}', author='A', isbn=f'97800000000{n:02d}', user_id=user.id,
+                                finish_date=date(2024, 3, n + 1),
+                                cover_url=f"{slow_covers['url']}/covers/{n}.png"))
+        db.session.commit()
+        return user.id
+
+def month_books(user_id):
+    return Book.query.filter(Book.user_id == user_id, Book.finish_date >= date(2024, 3, 1),
+                             Book.finish_date < date(2024, 4, 1)).all()
+
+class TestMonthReview:
+    """Test month review rendering and memoization."""
+
+    def test_covers_download_concurrently_once(self, app, slow_covers, finished_month):
+        with app.test_request_context():
+            start = time.perf_counter()
+            image = generate_month_review_image(month_books(finished_month), 3, 2024)
+            elapsed = time.perf_counter() - start
+            assert image.size == (1080, 1080)
+            # Sequential downloads would take 16 * 0.2s
+            assert elapsed < 16 * slow_covers['delay'] / 2
+            assert slow_covers['peak'] > 1
+            assert set(slow_covers['hits'].values()) == {1}
+
+            start = time.perf_counter()
+            generate_month_review_image(month_books(finished_month), 3, 2024)
+            assert time.perf_counter() - start < 1
+            assert sum(slow_covers['hits'].values()) == 16
+
+    def test_render_is_memoized_until_finish_date_changes(self, app, slow_covers, finished_month):
+        with app.test_request_context():
+            books = month_books(finished_month)
+            first = render_month_review(finished_month, books, 3, 2024)
+            assert Image.open(BytesIO(first)).format == 'JPEG'
+            # Same books in any order: the cached bytes come back without rendering
+            assert render_month_review(finished_month, list(reversed(books)), 3, 2024) is first
+
+            books[0].finish_date = date(2024, 3, 20)
+            db.session.commit()
+            assert render_month_review(finished_month, month_books(finished_month), 3, 2024) is not first
+
+            books[1].finish_date = date(2024, 4, 2)
+            db.session.commit()
+            fifteen = render_month_review(finished_month, month_books(finished_month), 3, 2024)
+            assert fifteen != first
+            assert render_month_review(finished_month, month_books(finished_month), 3, 2024) is fifteen
+
+    def test_route_serves_jpeg(self, app, client, finished_month):
+        client.post('/auth/login', data={'username': 'reviewer', 'password': 'R3viewer#Password'})
+        response = client.get('/month_review/2024/3.jpg')
+        assert response.status_code == 200
+        assert response.mimetype == 'image/jpeg'
+        assert client.get('/month_review/2024/3.jpg').data == response.data
+        assert client.get('/month_review/2024/5.jpg').status_code == 404
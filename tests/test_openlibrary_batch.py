@@ -0,0 +1,99 @@
+import json
+import threading
+import pytest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+from app.utils import fetch_books_data, fetch_book_data
+from app.metadata_cache import get_entry
+
+KNOWN_BOOKS = {
+    '9780000000001': {'title': 'First Book', 'authors': [{'name': 'Ann Author'}]},
+    '9780000000002': {'title': 'Second Book', 'authors': [{'name': 'Bob Writer'}],
+                      'publishers': [{'name': 'Stub Press'}]},
+    '9780000000003': {'title': 'Third Book', 'authors': [{'name': 'Cy Scribe'}],
+                      'cover': {'medium': 'https://covers.example/3-M.jpg'}},
+}
+
+@pytest.fixture
+def openlibrary_stub(app):
+    """Local stand-in for the OpenLibrary books API that records every request."""
+    requests_seen = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            query = parse_qs(urlparse(self.path).query)
+            bibkeys = query['bibkeys'][0].split(',')
+            requests_seen.append(bibkeys)
+            body = {
+                key: KNOWN_BOOKS[key.split(':', 1)[1]]
+                for key in bibkeys if key.split(':', 1)[1] in KNOWN_BOOKS
+            }
+            payload = json.dumps(body).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    app.config['OPENLIBRARY_API_URL'] = f'http://127.0.0.1:{server.server_port}/api/books'
+    app.config['OPENLIBRARY_RATE_LIMIT'] = 0
+    yield requests_seen
+    server.shutdown()
+    server.server_close()
+
+class TestBatchedOpenLibrary:
+    """Test multi-bibkey OpenLibrary lookups."""
+
+    def test_isbns_are_grouped_into_chunks(self, app, openlibrary_stub):
+        """Five ISBNs with a batch size of two need three upstream calls."""
+        with app.app_context():
+            app.config['OPENLIBRARY_BATCH_SIZE'] = 2
+            isbns = ['9780000000001', '9780000000002', '9780000000003', '9780000000004', '9780000000005']
+            results = fetch_books_data(isbns)
+
+            assert len(openlibrary_stub) == 3
+            # Chunks are fetched concurrently, so they may arrive in any order
+            assert sorted(len(keys) for keys in openlibrary_stub) == [1, 2, 2]
+            assert list(results) == isbns
+
+    def test_response_is_split_per_isbn(self, app, openlibrary_stub):
+        """Each ISBN gets its own parsed record, unknown ISBNs map to None."""
+        with app.app_context():
+            results = fetch_books_data(['9780000000002', '9780000000003', '9789999999999'])
+
+            assert len(openlibrary_stub) == 1
+            assert results['9780000000002']['title'] == 'Second Book'
+            assert results['9780000000002']['publisher'] == 'Stub Press'
+            assert results['9780000000003']['cover'] == 'https://covers.example/3-M.jpg'
+            assert results['9789999999999'] is None
+
+    def test_duplicates_are_requested_once(self, app, openlibrary_stub):
+        """Repeated ISBNs in an import are only sent upstream once."""
+        with app.app_context():
+            fetch_books_data(['9780000000001', '9780000000001', '9780000000001'])
+
+            assert openlibrary_stub == [['ISBN:9780000000001']]
+
+    def test_batch_results_feed_the_shared_cache(self, app, openlibrary_stub):
+        """Batched results are cached for later single and batch lookups."""
+        with app.app_context():
+            fetch_books_data(['9780000000001', '9789999999999'])
+            assert len(openlibrary_stub) == 1
+
+            assert fetch_book_data('9780000000001')['title'] == 'First Book'
+            assert fetch_books_data(['9780000000001', '9789999999999'])['9789999999999'] is None
+            assert len(openlibrary_stub) == 1
+
+    def test_failed_chunk_is_not_cached(self, app, openlibrary_stub):
+        """An unreachable provider yields None without poisoning the cache."""
+        with app.app_context():
+            app.config['OPENLIBRARY_API_URL'] = 'http://127.0.0.1:9/api/books'
+            assert fetch_books_data(['9780000000001']) == {'9780000000001': None}
+
+            assert get_entry('openlibrary', '9780000000001') is None
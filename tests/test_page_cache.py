@@ -0,0 +1,84 @@
+import time
+import pytest
+from datetime import datetime
+from app.models import db, User, Book
+from app.page_cache import PageCache, SharedStore, get_page_cache_stats
+
+PASSWORD = 'P4geCache#Password'
+
+@pytest.fixture
+def reader(app):
+    """A sharing user currently reading one book."""
+    with app.app_context():
+        user = User(username='cached', email='cached@test.com', is_active=True)
+        user.set_password(PASSWORD)
+        db.session.add(user)
+        db.session.commit()
+        db.session.add(Book(title='Cached Book', author='Author', isbn='9780000000001', user_id=user.id,
+                            start_date=datetime.now().date()))
+        db.session.commit()
+        return user.id
+
+class TestPageCache:
+    """Test the shared page cache for community and public library pages."""
+
+    def test_burst_of_viewers_queries_once(self, app, client, reader, statement_recorder):
+        client.post('/auth/login', data={'username': 'cached', 'password': PASSWORD})
+        with statement_recorder() as statements:
+            for _ in range(20):
+                response = client.get('/community_activity/currently_reading')
+                assert b'Cached Book' in response.data
+                client.get('/community_activity')
+        assert sum('activity_event' in sql for sql in statements) == 2
+        with app.test_request_context():
+            stats = get_page_cache_stats()
+            assert stats['misses'] == 2 and stats['hits'] == 38
+            assert stats['hit_rate'] == 0.95
+
+    def test_changes_invalidate(self, app, client, reader):
+        client.post('/auth/login', data={'username': 'cached', 'password': PASSWORD})
+        assert b'Cached Book' in client.get('/community_activity/currently_reading').data
+        assert b'Cached Book' in client.get('/public-library').data
+
+        with app.app_context():
+            book = Book.query.filter_by(user_id=reader).one()
+            book.title = 'Renamed Book'
+            db.session.commit()
+        assert b'Renamed Book' in client.get('/community_activity/currently_reading').data
+        assert b'Renamed Book' in client.get('/public-library').data
+
+        with app.app_context():
+            db.session.get(User, reader).share_current_reading = False
+            db.session.commit()
+        assert b'Renamed Book' not in client.get('/community_activity/currently_reading').data
+
+        # Unrelated user fields leave the cache alone
+        with app.app_context():
+            before = get_page_cache_stats()['invalidations']
+            db.session.get(User, reader).last_login = datetime.now()
+            db.session.commit()
+            assert get_page_cache_stats()['invalidations'] == before
+
+    def test_ttl_expiry(self, app):
+        with app.app_context():
+            cache = PageCache(ttl=0.05)
+            calls = []
+            produce = lambda: calls.append(1) or len(calls)
+            assert cache.get_or_set('community', 'k', produce) == 1
+            assert cache.get_or_set('community', 'k', produce) == 1
+            time.sleep(0.06)
+            assert cache.get_or_set('community', 'k', produce) == 2
+
+    def test_shared_store_spans_workers(self, app, tmp_path):
+        path = str(tmp_path / 'page_cache.db')
+        with app.app_context():
+            first, second = PageCache(shared=SharedStore(path)), PageCache(shared=SharedStore(path))
+            assert first.get_or_set('community', 'overview', lambda: [1, 2]) == [1, 2]
+            assert second.get_or_set('community', 'overview', lambda: [9, 9]) == [1, 2]
+            assert second.get_stats()['shared_hits'] == 1
+
+            # An invalidation in one worker reaches the other
+            first.invalidate('community')
+            assert second.get_or_set('community', 'overview', lambda: [3, 4]) == [3, 4]
+            assert first.get_or_set('public_library', 'shelf', lambda: 'a') == 'a'
+            assert second.get_or_set('public_library', 'shelf', lambda: 'b') == 'a'
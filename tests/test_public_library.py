@@ -0,0 +1,78 @@
+import pytest
+from datetime import date, timedelta
+from app.models import db, User, Book
+
+def add_owner(username, **settings):
+    user = User(username=username, email=f'{username}@test.com', is_active=settings.pop('is_active', True), **settings)
+    user.set_password('Publ1c#Password')
+    db.session.add(user)
+    db.session.flush()
+    return user
+
+@pytest.fixture
+def catalogue(app):
+    """Books from a sharing owner (finished, reading and wanted) plus two owners who must stay hidden."""
+    with app.app_context():
+        owner = add_owner('sharing')
+        private = add_owner('private', share_library=False)
+        inactive = add_owner('inactive', is_active=False)
+        for n in range(7):
+            # Two books share each finish date so the id tie-breaker matters
+            db.session.add(Book(title=f'Finished {n}', author='A', isbn=f'97810000000{n:02d}', user_id=owner.id,
+                                finish_date=date(2024, 1, 1) + timedelta(days=n // 2)))
+        for n in range(4):
+            db.session.add(Book(title=f'Reading {n}', author='A', isbn=f'97820000000{n:02d}', user_id=owner.id))
+        for n in range(2):
+            db.session.add(Book(title=f'Wanted {n}', author='A', isbn=f'97830000000{n:02d}', user_id=owner.id,
+                                want_to_read=True))
+        for user in (private, inactive):
+            db.session.add(Book(title=f'Hidden {user.username}', author='A', isbn='9789000000000', user_id=user.id))
+        db.session.commit()
+        expected = ([b.title for b in Book.query.filter(Book.user_id == owner.id, Book.finish_date.isnot(None))
+                     .order_by(Book.finish_date.desc(), Book.id.desc())]
+                    + [b.title for b in Book.query.filter(Book.user_id == owner.id, Book.finish_date.is_(None))
+                       .order_by(Book.id.desc())])
+        return expected
+
+def walk(client, url):
+    titles, pages = [], 0
+    while url:
+        page = client.get(url).get_json()
+        titles.extend(book['title'] for book in page['books'])
+        url = page['next_url']
+        pages += 1
+    return titles, pages
+
+class TestPublicLibrary:
+    """Test the paginated public library."""
+
+    def test_json_pages_cover_the_catalogue_in_order(self, app, client, catalogue):
+        app.config['PUBLIC_LIBRARY_PAGE_SIZE'] = 3
+        titles, pages = walk(client, '/public-library.json')
+        assert titles == catalogue
+        assert pages == 5
+        assert not any(title.startswith('Hidden') for title in titles)
+
+    def test_filters(self, app, client, catalogue):
+        app.config['PUBLIC_LIBRARY_PAGE_SIZE'] = 3
+        reading, _ = walk(client, '/public-library.json?filter=currently_reading')
+        assert reading == [f'Reading {n}' for n in (3, 2, 1, 0)]
+        wanted, pages = walk(client, '/public-library.json?filter=want_to_read')
+        assert wanted == ['Wanted 1', 'Wanted 0'] and pages == 1
+        page = client.get('/public-library.json?filter=want_to_read').get_json()
+        assert page['books'][0]['want_to_read'] and not page['books'][0]['currently_reading']
+
+    def test_html_pages_link_to_the_next(self, app, client, catalogue):
+        app.config['PUBLIC_LIBRARY_PAGE_SIZE'] = 10
+        first = client.get('/public-library').data.decode()
+        assert 'id="public-library-more"' in first
+        assert 'Hidden' not in first
+        next_url = first.split('id="public-library-more"')[1].split('href="')[1].split('"')[0].replace('&amp;', '&')
+        second = client.get(next_url).data.decode()
+        assert 'Reading 0' in second and 'Finished 6' not in second
+        assert 'id="public-library-more"' not in second
+
+    def test_malformed_cursor_starts_over(self, app, client, catalogue):
+        app.config['PUBLIC_LIBRARY_PAGE_SIZE'] = 3
+        page = client.get('/public-library.json?after=garbage').get_json()
+        assert [book['title'] for book in page['books']] == catalogue[:3]
@@ -0,0 +1,111 @@
+import re
+import pytest
+from datetime import date, datetime, timedelta
+from sqlalchemy import event
+from app.models import db, User, Book, ReadingLog
+from app.system_stats import take_snapshot
+
+PASSWORD = 'Qu3ryPlan#Password'
+
+# Tables small enough by design (one row per user, per job, per snapshot) that a scan is fine
+SCANNABLE = {'user', 'task', 'stats_snapshot', 'schema_version', 'reading_streak'}
+
+@pytest.fixture
+def library(app):
+    """An admin and a sharing reader with finished, current and wanted books plus reading logs."""
+    with app.app_context():
+        today = datetime.now().date()
+        users = []
+        for name, is_admin in (('planadmin', True), ('planreader', False)):
+            user = User(username=name, email=f'{name}@test.com', is_admin=is_admin, is_active=True)
+            user.set_password(PASSWORD)
+            db.session.add(user)
+            db.session.flush()
+            users.append(user)
+            for n in range(6):
+                book = Book(title=f'{name} {n}', author='Author', isbn=f'97800000{users.index(user)}{n:04d}', user_id=user.id,
+                            categories='Fiction', publisher='Press', language='en',
+                            start_date=today - timedelta(days=20 - n) if n < 4 else None,
+                            finish_date=today - timedelta(days=n) if n < 2 else None,
+                            want_to_read=n == 5,
+                            # Refused without a request (loopback), so the cover route records a failure
+                            cover_url='http://127.0.0.1:9/cover.png' if n == 0 else None)
+                db.session.add(book)
+                db.session.flush()
+                for day in range(3):
+                    db.session.add(ReadingLog(book_id=book.id, user_id=user.id, date=today - timedelta(days=day)))
+        db.session.commit()
+        book = Book.query.filter_by(user_id=users[0].id).order_by(Book.id).first()
+        return {'admin': users[0].id, 'reader': users[1].id, 'uid': book.uid}
+
+def route_urls(ids):
+    today = date.today()
+    return [
+        ('GET', '/'),
+        ('GET', '/?search=planadmin'),
+        ('GET', '/?category=Fiction&sort=title'),
+        ('GET', f"/book/{ids['uid']}"),
+        ('GET', f"/book/{ids['uid']}/cover/medium.jpg"),
+        ('POST', f"/book/{ids['uid']}/log"),
+        ('POST', f"/book/{ids['uid']}/start_reading"),
+        ('GET', f"/month_review/{today.year}/{today.month}.jpg"),
+        ('GET', '/month_wrapup'),
+        ('GET', '/public-library'),
+        ('GET', '/public-library.json?filter=currently_reading'),
+        ('GET', '/community_activity'),
+        ('GET', '/community_activity/active_readers'),
+        ('GET', '/community_activity/books_this_month'),
+        ('GET', '/community_activity/currently_reading'),
+        ('GET', '/community_activity/recent_activity'),
+        ('GET', f"/user/{ids['reader']}/profile"),
+        ('GET', '/auth/my_activity'),
+        ('GET', '/admin/dashboard'),
+        ('GET', f"/admin/users/{ids['reader']}"),
+    ]
+
+# A whole table read, directly or by walking every entry of one of its indexes
+SCAN = re.compile(r'SCAN (\w+)(?: USING (?:COVERING )?INDEX \w+)?$')
+
+def full_scans(connection, statement, parameters):
+    """Tables the statement reads without an index, per EXPLAIN QUERY PLAN"""
+    plan = connection.exec_driver_sql(f'EXPLAIN QUERY PLAN {statement}', parameters).fetchall()
+    scans = set()
+    for row in plan:
+        match = SCAN.match(row[-1])
+        if not match:
+            continue
+        table = match.group(1)
+        if table not in db.metadata.tables:
+            table = re.sub(r'_\d+$', '', table)  # Aliases from joinedload and self-joins: book_1, user_2
+        if table in db.metadata.tables and table not in SCANNABLE:
+            scans.add(table)
+    return scans
+
+class TestQueryPlans:
+    """Every query behind the main routes must use an index on the big tables."""
+
+    def test_routes_do_not_scan_large_tables(self, app, client, library):
+        client.post('/auth/login', data={'username': 'planadmin', 'password': PASSWORD})
+        with app.app_context():
+            app.extensions.pop('page_cache', None)  # every request must reach the database
+            # The dashboard's whole-table counters are collected once per STATS_SNAPSHOT_INTERVAL, not per request
+            take_snapshot()
+            engine = db.engine
+        statements = []
+        listener = lambda conn, cursor, statement, parameters, context, executemany: (
+            statements.append((statement, parameters)) if statement.lstrip().upper().startswith('SELECT') else None)
+        event.listen(engine, 'before_cursor_execute', listener)
+        try:
+            for method, url in route_urls(library):
+                response = client.open(url, method=method)
+                assert response.status_code < 400, url
+        finally:
+            event.remove(engine, 'before_cursor_execute', listener)
+
+        offenders = {}
+        with engine.connect() as connection:
+            for statement, parameters in statements:
+                scans = full_scans(connection, statement, parameters)
+                if scans:
+                    offenders[' '.join(statement.split())] = scans
+        assert not offenders, '\n'.join(f'{sorted(tables)}: {sql}' for sql, tables in offenders.items())
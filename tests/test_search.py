@@ -0,0 +1,110 @@
+import pytest
+from sqlalchemy import text
+from app.models import db, User, Book
+from app.library import paginate_books, library_stats
+from app.search import BookSearch, book_search, to_match_query, highlight
+
+@pytest.fixture
+def searcher(app):
+    """A user with a handful of books to search."""
+    with app.app_context():
+        user = User(username='searcher', email='searcher@test.com', is_active=True)
+        user.set_password('S3archer#Pass')
+        db.session.add(user)
+        db.session.commit()
+        books = [
+            Book(title='Dune', author='Frank Herbert', isbn='9780441013593', user_id=user.id,
+                 description='A desert planet and its spice.', categories='Science Fiction'),
+            Book(title='Dune Messiah', author='Frank Herbert', isbn='9780593098233', user_id=user.id,
+                 description='Paul rules the empire.', categories='Science Fiction'),
+            Book(title='The Desert Garden', author='Ana Lopez', isbn='9780000000011', user_id=user.id,
+                 description='Gardening notes. Mentions dune grasses once.', categories='Gardening'),
+            Book(title='Crème Brûlée', author='Chef <b>Bold</b>', isbn='9780000000028', user_id=user.id,
+                 description='Desserts & <script>sweets</script>', categories='Cooking'),
+        ]
+        db.session.add_all(books)
+        db.session.commit()
+        return user.id
+
+def search_titles(user_id, term, page_size=10, **kwargs):
+    page = paginate_books([Book.user_id == user_id], page_size, search=book_search(term), **kwargs)
+    return [book.title for book in page.books], page
+
+class TestBookSearch:
+    """Test the FTS5-backed library search."""
+
+    def test_index_is_enabled_on_sqlite(self, app):
+        assert app.extensions['fts_enabled'] is True
+
+    def test_match_query_is_sanitised(self):
+        assert to_match_query('dune "messiah" OR x*') == '"dune"* "messiah"* "OR"* "x"*'
+        assert to_match_query('  ---  ') is None
+
+    def test_ranked_by_relevance(self, app, searcher):
+        with app.app_context():
+            titles, _ = search_titles(searcher, 'dune')
+            # Title matches outrank a passing mention in a description
+            assert set(titles[:2]) == {'Dune', 'Dune Messiah'}
+            assert titles[2] == 'The Desert Garden'
+
+    def test_prefix_and_diacritics(self, app, searcher):
+        with app.app_context():
+            assert search_titles(searcher, 'mess')[0] == ['Dune Messiah']
+            assert search_titles(searcher, 'creme brulee')[0] == ['Crème Brûlée']
+            assert search_titles(searcher, 'herbert spice')[0] == ['Dune']
+
+    def test_index_follows_inserts_updates_and_deletes(self, app, searcher):
+        with app.app_context():
+            book = Book(title='Neuromancer', author='William Gibson', isbn='9780441569595', user_id=searcher)
+            db.session.add(book)
+            db.session.commit()
+            assert search_titles(searcher, 'neuromancer')[0] == ['Neuromancer']
+
+            book.title = 'Count Zero'
+            db.session.commit()
+            assert search_titles(searcher, 'neuromancer')[0] == []
+            assert search_titles(searcher, 'count zero')[0] == ['Count Zero']
+
+            db.session.delete(book)
+            db.session.commit()
+            assert search_titles(searcher, 'count')[0] == []
+            # Raises if the index has drifted from the book table
+            db.session.execute(text("INSERT INTO book_fts(book_fts, rank) VALUES ('integrity-check', 1)"))
+
+    def test_snippets_are_highlighted_and_escaped(self, app, searcher):
+        with app.app_context():
+            _, page = search_titles(searcher, 'sweets')
+            snippet = str(page.snippets[page.books[0].id])
+            assert '<mark>sweets</mark>' in snippet
+            assert '<script>' not in snippet and '&lt;script&gt;' in snippet
+            assert highlight(None) is None
+
+    def test_ranked_pages_are_disjoint(self, app, searcher):
+        with app.app_context():
+            first, page = search_titles(searcher, 'dune', page_size=2)
+            assert page.has_next
+            second, page = search_titles(searcher, 'dune', page_size=2, after=page.next_cursor)
+            assert first + second == search_titles(searcher, 'dune')[0]
+            back, _ = search_titles(searcher, 'dune', page_size=2, before=page.prev_cursor)
+            assert back == first
+
+    def test_stats_count_matches(self, app, searcher):
+        with app.app_context():
+            search = book_search('frank')
+            stats = library_stats([Book.user_id == searcher, search.criterion()])
+            assert stats['total'] == 2
+
+    def test_fallback_without_fts(self, app, searcher):
+        with app.app_context():
+            search = BookSearch('desert', fts_enabled=False)
+            assert not search.ranked
+            page = paginate_books([Book.user_id == searcher], 10, search=search)
+            assert sorted(book.title for book in page.books) == ['Dune', 'The Desert Garden']
+            assert page.snippets == {}
+
+    def test_library_route_shows_snippet(self, client, searcher):
+        client.post('/auth/login', data={'username': 'searcher', 'password': 'S3archer#Pass'})
+        response = client.get('/?search=spice')
+        assert response.status_code == 200
+        assert b'<mark>spice</mark>' in response.data
+        assert b'Dune Messiah' not in response.data
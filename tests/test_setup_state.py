@@ -0,0 +1,68 @@
+import pytest
+from app.models import db, User
+from app.setup_state import is_setup_complete, reset_setup_state
+
+@pytest.fixture
+def member(app):
+    with app.app_context():
+        user = User(username='member', email='member@test.com', is_active=True)
+        user.set_password('M3mber#Password')
+        db.session.add(user)
+        db.session.commit()
+        reset_setup_state()
+        return user.id
+
+class TestSetupState:
+    """Test the cached first-run setup check."""
+
+    def test_redirects_to_setup_until_a_user_exists(self, app, client):
+        with app.app_context():
+            reset_setup_state()
+            for _ in range(2):
+                response = client.get('/auth/login')
+                assert response.status_code == 302
+                assert '/auth/setup' in response.headers['Location']
+            # A negative answer is never cached: another worker may finish setup
+            assert 'setup_complete' not in app.extensions
+
+            user = User(username='first', email='first@test.com', is_active=True, is_admin=True)
+            user.set_password('F1rst#AdminPass')
+            db.session.add(user)
+            db.session.commit()
+            assert client.get('/auth/login').status_code == 200
+
+    def test_static_requests_run_no_queries(self, app, client, member, statement_recorder):
+        with app.app_context():
+            with statement_recorder() as statements:
+                response = client.get('/static/bookshelf.png')
+            assert response.status_code == 200
+            assert statements == []
+
+    def test_anonymous_requests_query_once_then_use_cache(self, app, client, member, statement_recorder):
+        with app.app_context():
+            with statement_recorder() as statements:
+                assert client.get('/auth/login').status_code == 200
+            assert len(statements) == 1
+            with statement_recorder() as statements:
+                for _ in range(3):
+                    assert client.get('/auth/login').status_code == 200
+            assert statements == []
+
+    def test_authenticated_requests_add_no_queries(self, app, client, member, statement_recorder):
+        with app.app_context():
+            client.post('/auth/login', data={'username': 'member', 'password': 'M3mber#Password'})
+            reset_setup_state()
+            with statement_recorder() as statements:
+                assert client.get('/api/task/999999').status_code == 404
+            # Only the task lookup itself, plus at most the session user lookup
+            assert len([s for s in statements if 'FROM task' in s]) == 1
+            assert all('FROM task' in s or 'WHERE user.id = ?' in s for s in statements)
+            assert app.extensions['setup_complete'] is True
+
+    def test_deleting_users_resets_cache(self, app, member):
+        with app.app_context():
+            assert is_setup_complete()
+            db.session.delete(db.session.get(User, member))
+            db.session.commit()
+            assert 'setup_complete' not in app.extensions
+            assert not is_setup_complete()
@@ -0,0 +1,191 @@
+import random
+import pytest
+from datetime import date, datetime, timedelta
+from sqlalchemy import event
+from app.models import db, User, Book, ReadingLog, ReadingStreak
+from app.streaks import (compute_streak, compute_streaks, current_streak, longest_streak,
+                         rebuild_streaks, Streak, NO_STREAK)
+
+@pytest.fixture
+def reader(app):
+    """A user with two books to log reading against."""
+    with app.app_context():
+        user = User(username='streaker', email='streaker@test.com', is_active=True)
+        user.set_password('Str3aker#Password')
+        db.session.add(user)
+        db.session.commit()
+        for n in range(2):
+            db.session.add(Book(title=f'Book {n}', author='Author', isbn=f'978000000000{n}', user_id=user.id))
+        db.session.commit()
+        return user.id
+
+def log(user_id, day, book_index=0):
+    book = Book.query.filter_by(user_id=user_id).order_by(Book.id).all()[book_index]
+    db.session.add(ReadingLog(book_id=book.id, user_id=user_id, date=day))
+    db.session.commit()
+
+def stored(user_id):
+    streak = ReadingStreak.query.filter_by(user_id=user_id).populate_existing().one()
+    return streak.current_length, streak.last_log_date, streak.longest_length
+
+def expected(user_id):
+    dates = [d for (d,) in db.session.query(ReadingLog.date).filter_by(user_id=user_id).distinct().order_by(ReadingLog.date)]
+    return compute_streak(dates)
+
+def today():
+    import pytz
+    from flask import current_app
+    return datetime.now(pytz.timezone(current_app.config.get('TIMEZONE', 'UTC'))).date()
+
+class TestReadingStreaks:
+    """Test the materialized reading streak."""
+
+    def test_compute_streak(self):
+        days = [date(2024, 1, d) for d in (1, 2, 3, 5, 6, 9)]
+        assert compute_streak(days) == (1, date(2024, 1, 9), 3)
+        assert compute_streak([]) == (0, None, 0)
+
+    def test_consecutive_logs_extend_streak(self, app, reader):
+        with app.app_context():
+            start = today() - timedelta(days=4)
+            for offset in range(5):
+                log(reader, start + timedelta(days=offset))
+            # A second book on the same day does not count twice
+            log(reader, today(), book_index=1)
+            assert stored(reader) == (5, today(), 5)
+            assert current_streak(reader) == 5
+            assert db.session.get(User, reader).get_reading_streak() == 5
+
+    def test_stale_streak_reads_as_zero(self, app, reader):
+        with app.app_context():
+            log(reader, today() - timedelta(days=3))
+            log(reader, today() - timedelta(days=2))
+            assert stored(reader)[0] == 2
+            assert current_streak(reader) == 0
+            assert longest_streak(reader) == 2
+
+    def test_incremental_matches_full_recompute(self, app, reader):
+        with app.app_context():
+            rng = random.Random(7)
+            books = Book.query.filter_by(user_id=reader).order_by(Book.id).all()
+            base = date(2024, 1, 1)
+            for _ in range(150):
+                day = base + timedelta(days=rng.randint(0, 40))
+                book = rng.choice(books)
+                existing = ReadingLog.query.filter_by(book_id=book.id, date=day).first()
+                if existing:
+                    db.session.delete(existing)
+                else:
+                    db.session.add(ReadingLog(book_id=book.id, user_id=reader, date=day))
+                db.session.commit()
+                assert stored(reader) == expected(reader)
+
+    def test_lookup_is_one_query(self, app, reader):
+        with app.app_context():
+            for offset in range(30):
+                log(reader, date(2020, 1, 1) + timedelta(days=offset))
+            statements = []
+            record = lambda *args: statements.append(args[2])
+            event.listen(db.engine, 'before_cursor_execute', record)
+            try:
+                current_streak(reader)
+            finally:
+                event.remove(db.engine, 'before_cursor_execute', record)
+            assert len(statements) == 1
+            assert 'reading_streak' in statements[0]
+
+    def test_delete_book_updates_streak(self, app, client, reader):
+        with app.app_context():
+            for offset in range(3):
+                log(reader, today() - timedelta(days=offset), book_index=offset % 2)
+            assert current_streak(reader) == 3
+            yesterday = today() - timedelta(days=1)
+            uid = Book.query.filter_by(user_id=reader).order_by(Book.id).first().uid
+        client.post('/auth/login', data={'username': 'streaker', 'password': 'Str3aker#Password'})
+        client.post(f'/book/{uid}/delete')
+        with app.app_context():
+            # Only yesterday's log (on the other book) is left
+            assert stored(reader) == (1, yesterday, 1)
+
+    def test_rebuild_streaks(self, app, reader):
+        with app.app_context():
+            log(reader, date(2024, 3, 1))
+            ReadingStreak.query.delete()
+            db.session.commit()
+            assert rebuild_streaks() == 1
+            assert stored(reader) == (1, date(2024, 3, 1), 1)
+
+class TestStreakEngine:
+    """Test the set-based streak query."""
+
+    def test_matches_per_user_walk(self, app, reader):
+        with app.app_context():
+            rng = random.Random(3)
+            users = [reader]
+            for n in range(4):
+                user = User(username=f'batch{n}', email=f'batch{n}@test.com', is_active=True)
+                user.set_password('Str3aker#Password')
+                db.session.add(user)
+                db.session.flush()
+                db.session.add(Book(title='B', author='A', isbn='9780000000001', user_id=user.id))
+                users.append(user.id)
+            db.session.commit()
+            for user_id in users:
+                books = Book.query.filter_by(user_id=user_id).all()
+                days = {date(2024, 1, 1) + timedelta(days=rng.randint(0, 60)) for _ in range(40)}
+                for day in days:
+                    db.session.add(ReadingLog(book_id=rng.choice(books).id, user_id=user_id, date=day))
+            db.session.commit()
+
+            statements = []
+            record = lambda *args: statements.append(args[2])
+            event.listen(db.engine, 'before_cursor_execute', record)
+            try:
+                streaks = compute_streaks()
+            finally:
+                event.remove(db.engine, 'before_cursor_execute', record)
+            assert len(statements) == 1
+            for user_id in users:
+                run_length, last, longest = expected(user_id)
+                assert streaks[user_id] == Streak(0, run_length, longest, last)
+
+            subset = compute_streaks(users[:2])
+            assert set(subset) == set(users[:2])
+            assert compute_streaks([]) == {}
+
+    def test_current_streak_counts_today(self, app, reader):
+        with app.app_context():
+            for offset in range(3):
+                log(reader, today() - timedelta(days=offset))
+            log(reader, today() - timedelta(days=10))
+            streak = compute_streaks([reader])[reader]
+            assert (streak.current, streak.longest) == (3, 3)
+            assert compute_streaks([reader + 1000]).get(reader + 1000, NO_STREAK) == NO_STREAK
+
+    def test_admin_and_community_pages_show_streaks(self, app, client, reader):
+        with app.app_context():
+            user = db.session.get(User, reader)
+            user.is_admin = True
+            db.session.commit()
+            for offset in range(2):
+                log(reader, today() - timedelta(days=offset))
+        client.post('/auth/login', data={'username': 'streaker', 'password': 'Str3aker#Password'})
+        response = client.get('/admin/users')
+        assert response.status_code == 200
+        assert b'best 2' in response.data
+        assert client.get('/community_activity/active_readers').status_code == 200
+        response = client.get(f'/user/{reader}/profile')
+        assert b'Streak: 2 (longest 2)' in response.data
+
+    def test_every_page_adds_the_streak_offset(self, app, client, reader):
+        with app.app_context():
+            user = db.session.get(User, reader)
+            user.is_admin = True
+            user.reading_streak_offset = 5
+            db.session.commit()
+            for offset in range(2):
+                log(reader, today() - timedelta(days=offset))
+        client.post('/auth/login', data={'username': 'streaker', 'password': 'Str3aker#Password'})
+        assert b'<span class="badge bg-warning text-dark">7</span>' in client.get('/admin/users').data
+        assert b'Streak: 7 days (longest 2)' in client.get(f'/admin/users/{reader}').data
+        assert b'Streak: 7 (longest 2)' in client.get(f'/user/{reader}/profile').data
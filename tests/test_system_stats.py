@@ -0,0 +1,70 @@
+import pytest
+from datetime import timedelta
+from app.models import db, User, Book, StatsSnapshot
+from app.system_stats import latest_snapshot, snapshot_history, take_snapshot, _utcnow
+
+PASSWORD = 'Sn4pshot#Password'
+
+@pytest.fixture
+def admin(app):
+    """An admin with two books."""
+    with app.app_context():
+        user = User(username='statsadmin', email='statsadmin@test.com', is_admin=True, is_active=True)
+        user.set_password(PASSWORD)
+        db.session.add(user)
+        db.session.commit()
+        for n in range(2):
+            db.session.add(Book(title=f'Book {n}', author='A', isbn=f'978000000000{n}', user_id=user.id))
+        db.session.commit()
+        return user.id
+
+class TestSystemStats:
+    """Test the admin statistics snapshots."""
+
+    def test_latest_snapshot_is_read_from_memory(self, app, admin, statement_recorder):
+        with app.app_context():
+            snapshot = latest_snapshot()
+            assert snapshot['total_users'] == 1 and snapshot['total_books'] == 2
+            assert snapshot['top_users'] == [{'username': 'statsadmin', 'book_count': 2}]
+            with statement_recorder() as statements:
+                assert latest_snapshot() == snapshot
+            assert statements == []
+            assert StatsSnapshot.query.count() == 1
+
+    def test_stale_snapshot_is_refreshed(self, app, admin):
+        app.config['STATS_SNAPSHOT_INTERVAL'] = 60
+        with app.app_context():
+            latest_snapshot()
+            db.session.add(Book(title='Later', author='A', isbn='9780000000009', user_id=admin))
+            db.session.commit()
+            assert latest_snapshot()['total_books'] == 2
+
+            stored = StatsSnapshot.query.one()
+            stored.taken_at = _utcnow() - timedelta(seconds=61)
+            db.session.commit()
+            app.extensions['system_stats'].latest = None
+            assert latest_snapshot()['total_books'] == 3
+            assert StatsSnapshot.query.count() == 2
+
+    def test_history_and_pruning(self, app, admin):
+        app.config['STATS_HISTORY_DAYS'] = 1
+        with app.app_context():
+            take_snapshot()
+            StatsSnapshot.query.update({'taken_at': _utcnow() - timedelta(days=2)})
+            db.session.commit()
+            take_snapshot()
+            db.session.add(Book(title='Later', author='A', isbn='9780000000009', user_id=admin))
+            db.session.commit()
+            take_snapshot()
+            assert StatsSnapshot.query.count() == 2
+            history = snapshot_history(hours=1, series=('total_books',))
+            assert history['total_books'] == [2, 3] and len(history['taken_at']) == 2
+
+    def test_admin_api(self, app, client, admin):
+        client.post('/auth/login', data={'username': 'statsadmin', 'password': PASSWORD})
+        stats = client.get('/admin/api/stats').get_json()
+        assert stats['total_books'] == 2 and 'snapshot_taken_at' in stats
+        history = client.get('/admin/api/stats/history?series=total_books,total_users').get_json()
+        assert history['total_books'] == [2] and history['total_users'] == [1]
+        assert client.get('/admin/api/stats/history?series=bogus').status_code == 400
+        assert client.get('/admin/dashboard').status_code == 200
@@ -0,0 +1,218 @@
+import io
+import json
+import time
+import pytest
+from datetime import datetime, timedelta
+from app import metadata_cache
+from app.models import db, User, Book, Task
+from app.tasks import enqueue_task, execute_task, claim_task, request_cancel, requeue_stale_tasks, task_handler
+
+CACHED_BOOKS = {
+    '9780000000011': {'title': 'Cached One', 'author': 'Ann Author', 'cover': 'https://covers.example/11.jpg'},
+    '9780000000012': {'title': 'Cached Two', 'author': 'Bob Writer', 'cover': 'https://covers.example/12.jpg'},
+    '9780000000013': {'title': 'Cached Three', 'author': 'Cy Scribe', 'cover': 'https://covers.example/13.jpg'},
+}
+
+@pytest.fixture
+def importer(app):
+    """A user whose password satisfies the strength policy, so the login form works."""
+    with app.app_context():
+        user = User(username='importer', email='importer@test.com', is_active=True)
+        user.set_password('Import3r#Pass')
+        db.session.add(user)
+        db.session.commit()
+        db.session.refresh(user)
+        return user
+
+# What only Google Books knows about them
+CACHED_GOOGLE_BOOKS = {
+    isbn: {'description': f"About {book['title']}", 'average_rating': 4.0, 'rating_count': 12,
+           'categories': 'Fiction', 'publisher': 'Cached Press'}
+    for isbn, book in CACHED_BOOKS.items()
+}
+
+@pytest.fixture
+def cached_metadata(app):
+    """Seed the metadata cache so imports never reach the network."""
+    with app.app_context():
+        metadata_cache.store_many('openlibrary', CACHED_BOOKS)
+        metadata_cache.store_many('google_books', CACHED_GOOGLE_BOOKS)
+    return CACHED_BOOKS
+
+def write_csv(tmp_path, isbns):
+    path = tmp_path / 'upload.csv'
+    path.write_text('\n'.join(isbns) + '\n', encoding='utf-8')
+    return str(path)
+
+@task_handler('test_stolen')
+def run_stolen(task, progress):
+    """Counts one item, then loses its claim the way a stale requeue would."""
+    progress.item_done()
+    Task.query.filter_by(id=task.id).update({'worker_id': 'other-worker:1'}, synchronize_session=False)
+    db.session.commit()
+    progress.item_done()
+    return {'message': 'should not finish'}
+
+@task_handler('test_slow_batch')
+def run_slow_batch(task, progress):
+    """A provider batch slower than TASK_STALE_AFTER, then another worker's stale check."""
+    with progress.keepalive():
+        time.sleep(0.7)
+    requeue_stale_tasks()
+    progress.item_done()
+    return {'message': 'done'}
+
+def login(client):
+    client.post('/auth/login', data={'username': 'importer', 'password': 'Import3r#Pass'})
+
+class TestTaskEngine:
+    """Test background task execution, progress and cancellation."""
+
+    def test_bulk_import_task_records_progress(self, app, importer, cached_metadata, tmp_path):
+        """A bulk import runs to completion and counts every item."""
+        with app.app_context():
+            path = write_csv(tmp_path, list(cached_metadata))
+            task_id = enqueue_task('bulk_import', importer.id, name='Bulk Import',
+                                   payload={'path': path, 'default_status': 'library_only'})
+
+            task = db.session.get(Task, task_id)
+            assert task.status == 'completed'
+            assert task.total_items == task.processed_items == task.success_count == 3
+            assert task.progress == 100
+            books = Book.query.filter_by(user_id=importer.id).all()
+            assert len(books) == 3
+            # OpenLibrary's batch supplies title and author, Google Books the rest
+            assert all(book.description and book.average_rating == 4.0 and book.rating_count == 12
+                       and book.publisher == 'Cached Press' for book in books)
+
+    def test_upload_is_removed_when_finished(self, app, importer, cached_metadata, tmp_path):
+        """The stored CSV is deleted once the task no longer needs it."""
+        with app.app_context():
+            path = write_csv(tmp_path, ['9780000000011'])
+            enqueue_task('bulk_import', importer.id, name='Bulk Import', payload={'path': path})
+
+            assert not (tmp_path / 'upload.csv').exists()
+
+    def test_duplicates_are_reported_as_errors(self, app, importer, cached_metadata, tmp_path):
+        """Books already in the user's library are counted as failures with a reason."""
+        with app.app_context():
+            db.session.add(Book(title='Existing', author='Someone', isbn='9780000000011', user_id=importer.id))
+            db.session.commit()
+            path = write_csv(tmp_path, ['9780000000011', '9780000000012'])
+            task_id = enqueue_task('bulk_import', importer.id, name='Bulk Import', payload={'path': path})
+
+            task = db.session.get(Task, task_id)
+            assert task.success_count == 1
+            assert task.error_count == 1
+            assert task.result['errors'] == ['9780000000011 (already exists)']
+
+    def test_resume_skips_processed_items(self, app, importer, cached_metadata, tmp_path):
+        """A requeued task continues after its last checkpoint."""
+        with app.app_context():
+            path = write_csv(tmp_path, list(cached_metadata))
+            task = Task(task_type='bulk_import', user_id=importer.id, name='Bulk Import',
+                        status='running', total_items=3, processed_items=1, success_count=1,
+                        payload=json.dumps({'path': path}))
+            db.session.add(task)
+            db.session.commit()
+
+            assert requeue_stale_tasks() == 1
+            assert claim_task(task.id, 'test-worker')
+            execute_task(task.id)
+
+            task = db.session.get(Task, task.id)
+            assert task.status == 'completed'
+            assert task.processed_items == 3
+            isbns = {book.isbn for book in Book.query.filter_by(user_id=importer.id)}
+            assert isbns == {'9780000000012', '9780000000013'}
+
+    def test_cancel_pending_task(self, app, importer, tmp_path):
+        """A task that has not started yet is cancelled immediately."""
+        with app.app_context():
+            task = Task(task_type='bulk_import', user_id=importer.id, name='Bulk Import',
+                        payload=json.dumps({'path': write_csv(tmp_path, ['9780000000011'])}))
+            db.session.add(task)
+            db.session.commit()
+
+            assert request_cancel(task)
+            assert task.status == 'cancelled'
+            assert not claim_task(task.id, 'test-worker')
+            assert not request_cancel(task)
+
+    def test_run_stops_when_its_claim_is_lost(self, app, importer):
+        """A requeued task claimed elsewhere is not counted or finished twice."""
+        with app.app_context():
+            task = Task(task_type='test_stolen', user_id=importer.id, name='Stolen')
+            db.session.add(task)
+            db.session.commit()
+            assert claim_task(task.id, 'test-worker')
+            execute_task(task.id)
+
+            task = db.session.get(Task, task.id)
+            assert (task.status, task.worker_id) == ('running', 'other-worker:1')
+            assert task.processed_items == task.success_count == 1
+
+    def test_claims_are_unique_per_run(self, app, importer):
+        with app.app_context():
+            task = Task(task_type='test_slow_batch', user_id=importer.id, name='Slow')
+            db.session.add(task)
+            db.session.commit()
+            assert claim_task(task.id, 'test-worker')
+            first = task.worker_id
+            Task.query.filter_by(id=task.id).update({'status': 'pending'}, synchronize_session=False)
+            assert claim_task(task.id, 'test-worker')
+            db.session.refresh(task)
+            assert task.worker_id.startswith('test-worker:') and task.worker_id != first
+
+    def test_keepalive_refreshes_heartbeat_during_slow_batch(self, app, importer):
+        with app.app_context():
+            app.config['TASK_STALE_AFTER'] = 0.6
+            task = Task(task_type='test_slow_batch', user_id=importer.id, name='Slow')
+            db.session.add(task)
+            db.session.commit()
+            assert claim_task(task.id, 'test-worker')
+            # Back-date the claim so only the keepalive can make it look alive
+            Task.query.filter_by(id=task.id).update({'heartbeat_at': datetime.now() - timedelta(hours=1)},
+                                                    synchronize_session=False)
+            db.session.commit()
+            execute_task(task.id)
+
+            task = db.session.get(Task, task.id)
+            assert task.status == 'completed' and task.processed_items == 1
+
+class TestTaskRoutes:
+    """Test the import routes and task status endpoints."""
+
+    def test_bulk_import_redirects_to_task_status(self, client, app, importer, cached_metadata, tmp_path):
+        """Uploading a CSV starts a task and shows its progress page."""
+        app.config['UPLOAD_FOLDER'] = str(tmp_path)
+        login(client)
+        response = client.post('/bulk_import', data={
+            'csv_file': (io.BytesIO(b'9780000000011\n9780000000012\n'), 'isbns.csv'),
+            'default_status': 'want_to_read'
+        }, content_type='multipart/form-data')
+
+        assert response.status_code == 302
+        assert '/task/' in response.location
+        task_id = response.location.rsplit('/', 1)[1]
+
+        data = client.get(f'/api/task/{task_id}').get_json()
+        assert data['status'] == 'completed'
+        assert data['processed_items'] == 2
+        assert client.get(f'/task/{task_id}').status_code == 200
+
+    def test_tasks_are_private(self, client, app, importer):
+        """Users cannot see each other's tasks."""
+        with app.app_context():
+            other = User(username='other', email='other@test.com')
+            other.set_password('0ther#Password', validate=False)
+            db.session.add(other)
+            db.session.commit()
+            task = Task(task_type='bulk_import', user_id=other.id, name='Bulk Import')
+            db.session.add(task)
+            db.session.commit()
+            task_id = task.id
+
+        login(client)
+        assert client.get(f'/api/task/{task_id}').status_code == 404
+        assert client.post(f'/task/{task_id}/cancel').status_code == 404
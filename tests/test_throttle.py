@@ -0,0 +1,119 @@
+import json
+import threading
+import time
+import pytest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+from flask import current_app
+from app.throttle import TokenBucket, ProviderLimiter, map_concurrently, get_limiter
+from app.utils import fetch_google_books_data
+from app.metadata_cache import get_entry
+
+@pytest.fixture
+def google_stub(app):
+    """Slow local Google Books stand-in that records peak concurrent requests."""
+    state = {'in_flight': 0, 'peak': 0, 'requests': 0}
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            isbn = parse_qs(urlparse(self.path).query)['q'][0].split(':', 1)[1]
+            with lock:
+                state['requests'] += 1
+                state['in_flight'] += 1
+                state['peak'] = max(state['peak'], state['in_flight'])
+            time.sleep(0.05)
+            with lock:
+                state['in_flight'] -= 1
+            if isbn.endswith('0'):
+                self.send_response(503)
+                self.end_headers()
+                return
+            payload = json.dumps({'items': [{'volumeInfo': {'title': f'Book {isbn}', 'authors': ['Stub']}}]}).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    app.config['GOOGLE_BOOKS_API_URL'] = f'http://127.0.0.1:{server.server_port}/books/v1/volumes'
+    app.config['GOOGLE_BOOKS_RATE_LIMIT'] = 0
+    app.config['HTTP_RETRY_BACKOFF'] = 0
+    yield state
+    server.shutdown()
+    server.server_close()
+
+class TestTokenBucket:
+    """Test the token-bucket rate limiter."""
+
+    def test_requests_are_spaced_once_burst_is_spent(self):
+        """With one token banked, five acquisitions at 20/s take about 0.2s."""
+        bucket = TokenBucket(rate=20, capacity=1)
+        start = time.monotonic()
+        for _ in range(5):
+            bucket.acquire()
+        assert time.monotonic() - start >= 0.18
+
+    def test_zero_rate_never_waits(self):
+        bucket = TokenBucket(rate=0)
+        assert all(bucket.acquire() == 0.0 for _ in range(100))
+
+class TestProviderLimiter:
+    """Test per-provider concurrency caps."""
+
+    def test_in_flight_requests_are_capped(self):
+        limiter = ProviderLimiter('test', max_concurrency=3, rate=0)
+
+        def request():
+            with limiter.slot():
+                time.sleep(0.02)
+
+        threads = [threading.Thread(target=request) for _ in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        stats = limiter.stats()
+        assert stats['requests'] == 10
+        assert stats['peak_in_flight'] == 3
+        assert stats['in_flight'] == 0
+
+    def test_limiter_is_configured_per_provider(self, app):
+        with app.app_context():
+            app.config['GOOGLE_BOOKS_MAX_CONCURRENCY'] = 7
+            assert get_limiter('google_books').max_concurrency == 7
+            assert get_limiter('google_books') is get_limiter('google_books')
+
+class TestConcurrentFetching:
+    """Test the concurrent metadata pipeline."""
+
+    def test_map_preserves_order_and_app_context(self, app):
+        with app.app_context():
+            results = map_concurrently(lambda n: (n, current_app.name), range(20), max_workers=4)
+            assert results == [(n, app.name) for n in range(20)]
+
+    def test_google_lookups_run_concurrently_within_the_cap(self, app, google_stub):
+        """Eight slow lookups with a cap of four overlap but never exceed it."""
+        with app.app_context():
+            app.config['GOOGLE_BOOKS_MAX_CONCURRENCY'] = 4
+            isbns = [f'978000000010{n}' for n in range(1, 9)]
+            results = fetch_google_books_data(isbns)
+
+            assert google_stub['requests'] == 8
+            assert 1 < google_stub['peak'] <= 4
+            assert results[isbns[0]]['title'] == f'Book {isbns[0]}'
+
+    def test_failed_lookups_are_not_cached(self, app, google_stub):
+        with app.app_context():
+            results = fetch_google_books_data(['9780000000100', '9780000000101'])
+
+            assert results['9780000000100'] is None
+            assert get_entry('google_books', '9780000000100') is None
+            assert get_entry('google_books', '9780000000101').found
@@ -0,0 +1,73 @@
+import pytest
+from datetime import date, datetime, timedelta
+from app.models import db, User, Book, ReadingLog
+from app.user_stats import compute_user_stats, get_user_stats, profile_books
+
+PASSWORD = 'Us3rStats#Password'
+
+@pytest.fixture
+def reader(app):
+    """A user with finished, in-progress and unstarted books and a few logs."""
+    with app.app_context():
+        today = datetime.now().date()
+        user = User(username='statreader', email='statreader@test.com', is_active=True)
+        user.set_password(PASSWORD)
+        db.session.add(user)
+        db.session.commit()
+        for n in range(12):
+            db.session.add(Book(title=f'Finished {n}', author='A', isbn=f'97810000000{n:02d}', user_id=user.id,
+                                start_date=date(2023, 1, 1), finish_date=date(2023, 1, 1) + timedelta(days=n)))
+        db.session.add(Book(title='This Month', author='A', isbn='9782000000000', user_id=user.id, finish_date=today))
+        db.session.add(Book(title='Reading', author='A', isbn='9782000000001', user_id=user.id, start_date=today))
+        db.session.add(Book(title='Unstarted', author='A', isbn='9782000000002', user_id=user.id))
+        db.session.commit()
+        reading = Book.query.filter_by(title='Reading').one()
+        for offset in range(3):
+            db.session.add(ReadingLog(book_id=reading.id, user_id=user.id, date=today - timedelta(days=offset)))
+        db.session.commit()
+        return user.id
+
+class TestUserStats:
+    """Test the per-user aggregate stats service."""
+
+    def test_counters_in_one_portable_query(self, app, reader, statement_recorder):
+        with statement_recorder() as statements:
+            with app.app_context():
+                stats = compute_user_stats(reader)
+        assert len(statements) == 1
+        assert 'strftime' not in statements[0].lower()
+        assert stats == {'total_books': 15, 'finished_books': 13, 'finished_this_year': 1, 'finished_this_month': 1,
+                         'currently_reading': 1, 'added_this_year': 15, 'reading_logs': 3}
+
+    def test_profile_lists_in_one_query(self, app, reader):
+        with app.app_context():
+            reading, finished = profile_books(reader)
+            assert [book.title for book in reading] == ['Reading']
+            assert [book.title for book in finished] == ['This Month'] + [f'Finished {n}' for n in range(11, 2, -1)]
+            assert profile_books(reader, include_reading=False)[0] == []
+
+    def test_cached_until_the_user_writes(self, app, reader, statement_recorder):
+        with app.app_context():
+            assert get_user_stats(reader)['reading_logs'] == 3
+            assert get_user_stats(reader)['current_streak'] == 3
+            with statement_recorder() as statements:
+                get_user_stats(reader)
+            assert statements == []
+
+            book = Book.query.filter_by(title='Reading').one()
+            db.session.add(ReadingLog(book_id=book.id, user_id=reader, date=datetime.now().date() - timedelta(days=3)))
+            db.session.commit()
+            assert get_user_stats(reader)['current_streak'] == 4
+
+            book.finish_date = datetime.now().date()
+            db.session.commit()
+            assert get_user_stats(reader)['finished_this_month'] == 2
+
+    def test_profile_and_activity_pages(self, app, client, reader, statement_recorder):
+        client.post('/auth/login', data={'username': 'statreader', 'password': PASSWORD})
+        with statement_recorder() as statements:
+            profile = client.get(f'/user/{reader}/profile')
+        assert profile.status_code == 200
+        assert b'Reading' in profile.data and b'Finished 11' in profile.data
+        assert sum('FROM book' in sql for sql in statements) <= 2
+        assert client.get('/auth/my_activity').status_code == 200
@@ -11,21 +11,21 @@ import ast
 import sys
 
 def validate_migration_functions():
-    """Validate that migration functions are present in app/__init__.py"""
-    init_file = os.path.join(os.path.dirname(__file__), 'app', '__init__.py')
+    """Validate that the versioned migrations are present in app/migrations.py"""
+    migrations_file = os.path.join(os.path.dirname(__file__), 'app', 'migrations.py')
     
-    if not os.path.exists(init_file):
-        print("❌ app/__init__.py not found")
+    if not os.path.exists(migrations_file):
+        print("❌ app/migrations.py not found")
         return False
     
-    with open(init_file, 'r') as f:
+    with open(migrations_file, 'r') as f:
         content = f.read()
     
     # Check for required functions
     required_functions = [
         'backup_database',
         'run_security_privacy_migration', 
-        'create_default_admin_if_needed'
+        'run_migrations'
     ]
     
     for func in required_functions:
@@ -35,11 +35,11 @@ def validate_migration_functions():
             print(f"❌ Function {func} missing")
             return False
     
-    # Check for migration logic in create_app
-    if "backup_database(db_path)" in content:
-        print("✅ Backup logic found in create_app")
+    # Check for backup and version tracking in the migration runner
+    if "backup_database(db_path)" in content and "SCHEMA_VERSION" in content:
+        print("✅ Backup and schema version logic found in run_migrations")
     else:
-        print("❌ Backup logic missing from create_app")
+        print("❌ Backup or schema version logic missing from run_migrations")
         return False
     
     if "run_security_privacy_migration" in content: